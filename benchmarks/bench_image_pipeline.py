@@ -0,0 +1,228 @@
+"""
+قياس مسار الصور كاملاً (extract_rich_from_image_google) محليًا، بدون مفاتيح أو شبكة:
+- OCR النص: FixtureOCRBackend (نتائج مسجلة لصور مولدة) مع تأخير مصطنع يحاكي Google Vision
+- pix2tex: موديل بديل بزمن ثابت (أو الموديل الحقيقي مع --real-pix2tex)
+- يقيس: الإنتاجية (صورة/ثانية)، زمن الطلب (p50 / p95 / max)، ومراحل vision / pix2tex
+- نسبة إصابة التخمين (pix2tex بدأ مبكرًا ووُجدت معادلة فعلاً)، ويفشل إن قلت عن --min-hit-rate
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_image_pipeline
+    python -m benchmarks.bench_image_pipeline --concurrency 16 --vision-ms 300 --speculative never
+    python -m benchmarks.bench_image_pipeline --route-hint none
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+TEXT_LINES = [
+    "The answer is forty two",
+    "Photosynthesis needs light and water",
+    "Write the main idea of the paragraph",
+]
+MATH_LINES = [
+    "2x + 3 = 7",
+    "x = 2",
+    "3y - 4 = 11",
+    "y = 5",
+]
+
+
+def _render(lines: List[str], scale: int = 3) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    صورة PNG للأسطر + نتيجة OCR المطابقة (النص + مربع كل كلمة) كما يرجعها Vision
+    """
+    font = ImageFont.load_default()
+    line_height = 24
+    width = 20 + 8 * max(len(line) for line in lines)
+    img = Image.new("L", (width, 20 + line_height * len(lines)), 255)
+    draw = ImageDraw.Draw(img)
+
+    words = []
+    for row, line in enumerate(lines):
+        x, y = 10, 10 + row * line_height
+        for token in line.split():
+            draw.text((x, y), token, fill=0, font=font)
+            x0, y0, x1, y1 = draw.textbbox((x, y), token, font=font)
+            words.append({"text": token, "box": [x0 * scale, y0 * scale, x1 * scale, y1 * scale]})
+            x = x1 + 6
+
+    img = img.resize((img.width * scale, img.height * scale), Image.NEAREST)
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue(), {"text": "\n".join(lines), "words": words}
+
+
+def build_images(count: int) -> List[Tuple[str, bytes, Dict[str, Any]]]:
+    """
+    ثلث نص فقط، ثلث معادلات فقط، ثلث مختلط (سطر نص + معادلتان)
+    """
+    images = []
+    for i in range(count):
+        kind = ("text", "math", "mixed")[i % 3]
+        if kind == "text":
+            lines = [TEXT_LINES[i % len(TEXT_LINES)], TEXT_LINES[(i + 1) % len(TEXT_LINES)]]
+        elif kind == "math":
+            lines = [MATH_LINES[i % len(MATH_LINES)], MATH_LINES[(i + 1) % len(MATH_LINES)]]
+        else:
+            lines = [TEXT_LINES[i % len(TEXT_LINES)], MATH_LINES[i % len(MATH_LINES)], MATH_LINES[(i + 2) % len(MATH_LINES)]]
+        # رقم الصورة في سطر أخير يجعل كل صورة فريدة (لا تطابق بين الطلبات)
+        lines.append(f"sheet {i}")
+        png, result = _render(lines)
+        images.append((kind, png, result))
+    return images
+
+
+class StandInLatexModel:
+    """
+    بديل pix2tex للقياس: زمن استدلال ثابت لكل منطقة بدون torch
+    """
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def __call__(self, img) -> str:
+        time.sleep(self.latency_ms / 1000.0)
+        return "x=2"
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _fmt_ms(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    return (
+        f"p50 {_percentile(values, 0.5):8.1f} ms"
+        f" | p95 {_percentile(values, 0.95):8.1f} ms"
+        f" | max {max(values):8.1f} ms"
+    )
+
+
+def run(
+    images: int = 30,
+    repeat: int = 2,
+    concurrency: int = 8,
+    vision_ms: float = 150.0,
+    jitter_ms: float = 30.0,
+    pix2tex_ms: float = 80.0,
+    real_pix2tex: bool = False,
+    route_hint: str = "kind",
+    min_hit_rate: float = 0.8,
+):
+    # الاستيراد هنا: الإعدادات (الكاش، وضع التخمين) تُقرأ من البيئة عند الاستيراد
+    from rag.file_processor import extract_rich_from_image_google
+    from rag.latex_inference import latex_service
+    from rag.ocr_backends import FixtureOCRBackend, LatencyInjectingBackend, set_ocr_backend
+
+    corpus = build_images(images)
+    fixtures = FixtureOCRBackend(directory=None, strict=True)
+    for _, png, result in corpus:
+        fixtures.add(png, result["text"], result["words"])
+    set_ocr_backend(LatencyInjectingBackend(fixtures, vision_ms, jitter_ms))
+
+    if not real_pix2tex:
+        latex_service.model_factory = lambda: StandInLatexModel(pix2tex_ms)
+    latex_service.start()
+
+    def _one(item):
+        kind, png, _ = item
+        # "kind": المسار يعرف أن الصورة رياضية (مثل /ask_file بمادة math)؛ "none": بدون تلميح
+        math_hint = (kind != "text") if route_hint == "kind" else None
+        start = time.perf_counter()
+        rich = extract_rich_from_image_google(png, math_hint)
+        return kind, (time.perf_counter() - start) * 1000, rich
+
+    # تسخين (تحميل الموديل وفتح الخيوط) خارج القياس
+    _one(corpus[0])
+
+    work = [item for _ in range(repeat) for item in corpus]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(_one, work))
+    elapsed = time.perf_counter() - started
+    latex_service.stop()
+
+    latencies = [ms for _, ms, _ in results]
+    vision = [rich["timings"]["vision_ms"] for _, _, rich in results]
+    pix2tex = [rich["timings"]["pix2tex_wait_ms"] for _, _, rich in results if "pix2tex_wait_ms" in rich["timings"]]
+    detected = Counter((kind, rich["detected_type"]) for kind, _, rich in results)
+    speculative = sum(1 for _, _, rich in results if rich["timings"]["speculative"])
+    wasted = sum(1 for _, _, rich in results if rich["timings"]["speculation_wasted"])
+
+    print(
+        f"images: {len(corpus)} × {repeat}, concurrency {concurrency}, "
+        f"vision {vision_ms:.0f}±{jitter_ms:.0f} ms, "
+        f"pix2tex {'real' if real_pix2tex else f'{pix2tex_ms:.0f} ms stand-in'}, "
+        f"speculative={os.environ.get('OCR_SPECULATIVE_PIX2TEX', 'auto')}, route hint {route_hint}"
+    )
+    print(f"throughput: {len(results) / elapsed:.2f} images/s ({elapsed:.2f} s)")
+    print(f"   request: {_fmt_ms(latencies)}")
+    print(f"    vision: {_fmt_ms(vision)}")
+    print(f"   pix2tex: {_fmt_ms(pix2tex)}")
+    hit_rate = (speculative - wasted) / speculative if speculative else None
+    print(
+        f"speculative: {speculative}/{len(results)} (wasted {wasted}, "
+        f"hit rate {'n/a' if hit_rate is None else f'{hit_rate:.0%}'})"
+    )
+    for (kind, found), n in sorted(detected.items()):
+        print(f"  {kind:>5} → {found:<5} {n}")
+    print(f"pix2tex service: {latex_service.snapshot()}")
+
+    assert hit_rate is None or hit_rate >= min_hit_rate, (
+        f"speculation hit rate {hit_rate:.0%} below {min_hit_rate:.0%}"
+    )
+
+    return {
+        "throughput": len(results) / elapsed,
+        "request_p50_ms": statistics.median(latencies),
+        "request_p95_ms": _percentile(latencies, 0.95),
+        "speculation_hit_rate": hit_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image OCR pipeline benchmark (offline)")
+    parser.add_argument("--images", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--vision-ms", type=float, default=150.0, help="injected OCR latency")
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--pix2tex-ms", type=float, default=80.0, help="stand-in pix2tex latency per region")
+    parser.add_argument("--real-pix2tex", action="store_true", help="use the installed pix2tex model")
+    parser.add_argument("--speculative", choices=["auto", "always", "never"], default="auto")
+    parser.add_argument("--route-hint", choices=["kind", "none"], default="kind",
+                        help="pass the image kind as the route math hint, or no hint")
+    parser.add_argument("--min-hit-rate", type=float, default=0.8, help="minimum speculation hit rate")
+    parser.add_argument("--cache", action="store_true", help="keep the OCR cache enabled")
+    args = parser.parse_args()
+
+    os.environ["OCR_SPECULATIVE_PIX2TEX"] = args.speculative
+    if not args.cache:
+        os.environ["OCR_CACHE_ENABLED"] = "0"
+
+    run(
+        images=args.images,
+        repeat=args.repeat,
+        concurrency=args.concurrency,
+        vision_ms=args.vision_ms,
+        jitter_ms=args.jitter_ms,
+        pix2tex_ms=args.pix2tex_ms,
+        real_pix2tex=args.real_pix2tex,
+        route_hint=args.route_hint,
+        min_hit_rate=args.min_hit_rate,
+    )
+
+
+if __name__ == "__main__":
+    main()
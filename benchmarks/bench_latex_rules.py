@@ -0,0 +1,147 @@
+"""
+قياس قواعد تنظيف LaTeX (rag/latex_rules) مقابل السلسلة القديمة (re.sub / str.replace لكل قاعدة):
+- تطابق المخرجات حالةً حالة (أي اختلاف يُطبع)
+- الزمن لكل حالة والإنتاجية (حالة/ثانية) للطريقتين
+- عدد مرات تطبيق كل قاعدة
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_latex_rules
+    python -m benchmarks.bench_latex_rules --generated 5000 --repeat 5
+    python -m benchmarks.bench_latex_rules --from-db --limit 100000
+"""
+import argparse
+import re
+import time
+from typing import Callable, Dict, List
+
+from rag.latex_rules import STAGES, correct_latex, extract_main_equation, rule_stats
+
+from .pix2tex_corpus import build_corpus, load_from_db
+
+
+# ============ السلسلة القديمة (كما كانت قبل latex_rules، للمقارنة فقط) ============
+
+LEGACY_SEMANTIC_FIXES = [
+    (r"\\Delta", "a"),
+    (r"\bDelta\b", "a"),
+    (r"\bO\b", "0"),
+    (r"\bl\b", "1"),
+    (r"\b×\b", "x"),
+    (r"\^2", "²"),
+    (r"sqrt", "√"),
+]
+
+LEGACY_SYMBOL_MAP = {"r": "F", "×": "x", "Δ": "a", "l": "1", "O": "0", "ν": "v", "+": "t"}
+
+
+def legacy_normalize(expr: str) -> str:
+    if not expr:
+        return expr
+    expr = expr.strip()
+    expr = expr.replace("×", "*").replace("·", "*")
+    expr = re.sub(r"\\mathbf\{([^}]*)\}", r"\1", expr)
+    expr = expr.replace("\\scriptstyle", "")
+    expr = re.sub(r"\s+", " ", expr)
+    expr = expr.replace("{", "").replace("}", "")
+    return expr.strip()
+
+
+def legacy_semantic(latex: str, vision_text: str) -> str:
+    if not latex:
+        return latex
+    fixed = latex
+    for pattern, replacement in LEGACY_SEMANTIC_FIXES:
+        fixed = re.sub(pattern, replacement, fixed)
+    vt = vision_text.replace(" ", "")
+    fx = fixed.replace(" ", "")
+    if len(vt) > 3 and len(fx) > 3 and vt in fx:
+        return vt
+    return fixed
+
+
+def legacy_vision(latex: str, vision_text: str) -> str:
+    if not latex or not vision_text:
+        return latex
+    matches = re.findall(r"[A-Za-z0-9+\-*/^(). ]+=+[A-Za-z0-9+\-*/^(). ]+", vision_text)
+    vision_eq = matches[0].replace(" ", "") if matches else ""
+    if len(vision_eq) >= 4 and "=" in vision_eq:
+        return vision_eq.replace("*", " ")
+    corrected = latex
+    for wrong, right in LEGACY_SYMBOL_MAP.items():
+        corrected = corrected.replace(wrong, right)
+    return corrected
+
+
+def legacy_chain(raw_latex: str, vision_text: str) -> str:
+    return legacy_vision(legacy_semantic(legacy_normalize(raw_latex), vision_text), vision_text)
+
+
+# ============ القياس ============
+
+def _time(fn: Callable[[str, str], str], cases: List[Dict[str, str]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            fn(case["latex"], case["vision"])
+    return time.perf_counter() - start
+
+
+def run(seed: int = 0, generated: int = 500, repeat: int = 3, from_db: bool = False, limit: int = 0):
+    cases = load_from_db(limit or None) if from_db else build_corpus(seed=seed, generated=generated)
+    if not cases:
+        print("no cases")
+        return {}
+
+    mismatches = []
+    for case in cases:
+        expected = legacy_chain(case["latex"], case["vision"])
+        found = correct_latex(case["latex"], case["vision"])
+        if expected != found:
+            mismatches.append((case, expected, found))
+
+    for stage in STAGES:
+        stage.reset()
+    extract_main_equation.cache_clear()
+
+    legacy_seconds = _time(legacy_chain, cases, repeat)
+    compiled_seconds = _time(correct_latex, cases, repeat)
+    total = len(cases) * repeat
+
+    print(f"corpus: {len(cases)} cases × {repeat} ({'ocr_logs' if from_db else 'static + generated'})")
+    print(f"  legacy: {legacy_seconds / total * 1e6:7.2f} µs/case | {total / legacy_seconds:10.0f} cases/s")
+    print(f"compiled: {compiled_seconds / total * 1e6:7.2f} µs/case | {total / compiled_seconds:10.0f} cases/s")
+    print(f"speedup: ×{legacy_seconds / compiled_seconds:.2f}")
+    by_source: Dict[str, List[int]] = {}
+    for case in cases:
+        by_source.setdefault(case["source"], [0, 0])[1] += 1
+    for case, _, _ in mismatches:
+        by_source[case["source"]][0] += 1
+    for source, (wrong, count) in sorted(by_source.items()):
+        print(f"parity ({source}): {count - wrong}/{count}")
+    for case, expected, found in mismatches[:20]:
+        print(f"  ✗ {case['latex']!r} | vision {case['vision']!r}: legacy {expected!r}, compiled {found!r}")
+
+    print("rule hits:")
+    for stage, hits in rule_stats().items():
+        for name, count in hits.items():
+            print(f"  {stage:>9}.{name:<16} {count}")
+
+    return {
+        "speedup": legacy_seconds / compiled_seconds,
+        "mismatches": len(mismatches),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LaTeX post-processing rules benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generated", type=int, default=500, help="random fuzz cases")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--from-db", action="store_true", help="use pix2tex outputs stored in ocr_logs")
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+    run(seed=args.seed, generated=args.generated, repeat=args.repeat, from_db=args.from_db, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
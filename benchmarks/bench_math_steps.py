@@ -0,0 +1,145 @@
+"""
+قياس MathStepGrader على مجموعة math_step_corpus (CPU فقط، بدون إنترنت):
+- زمن كل خطوة (p50 / p90 / p99 / max) وزمن تجهيز الحل المرجعي
+- نسبة الخطوات التي فشل تحليلها
+- دقة تحديد أول خطوة خاطئة (مقارنة بـ expected_first_wrong)
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_math_steps
+    python -m benchmarks.bench_math_steps --warm --repeat 3
+"""
+import argparse
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from rag.math_step_grader import (
+    _cached_solutions,
+    _lambdified,
+    _parse_equation,
+    _parse_normalized,
+    assemble_result,
+    evaluate_step,
+    prepare_reference,
+)
+
+from .math_step_corpus import build_corpus
+
+
+def _clear_caches():
+    _parse_normalized.cache_clear()
+    _cached_solutions.cache_clear()
+    _lambdified.cache_clear()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _fmt_ms(values: List[float]) -> str:
+    return (
+        f"p50 {_percentile(values, 0.5) * 1e3:7.2f} ms"
+        f" | p90 {_percentile(values, 0.9) * 1e3:7.2f} ms"
+        f" | p99 {_percentile(values, 0.99) * 1e3:7.2f} ms"
+        f" | max {max(values) * 1e3:7.2f} ms"
+    )
+
+
+def grade_case(case: Dict, timings: Dict[str, List[float]]) -> Dict:
+    """
+    نفس مراحل MathStepGrader.grade_steps (بدون pool) مع قياس زمن كل مرحلة
+    """
+    start = time.perf_counter()
+    reference = prepare_reference(case["correct_answer"])
+    timings["prepare"].append(time.perf_counter() - start)
+    if "error" in reference:
+        return {"success": False, "error": reference["error"]}
+
+    last = len(case["steps"]) - 1
+    step_results = []
+    for idx, step in enumerate(case["steps"]):
+        start = time.perf_counter()
+        step_results.append(
+            evaluate_step(idx, step, reference["variable"], reference["solutions"], idx == last)
+        )
+        timings["step"].append(time.perf_counter() - start)
+
+    return assemble_result("", case["correct_answer"], reference["variable"], step_results)
+
+
+def run(repeat: int = 1, warm: bool = False, seed: int = 0, generated: int = 20):
+    corpus = build_corpus(seed=seed, generated=generated)
+    timings: Dict[str, List[float]] = defaultdict(list)
+    request_times: List[float] = []
+    by_category = defaultdict(lambda: {"cases": 0, "correct": 0})
+    mismatches = []
+
+    for r in range(repeat):
+        if not warm or r == 0:
+            _clear_caches()
+        for case in corpus:
+            start = time.perf_counter()
+            result = grade_case(case, timings)
+            request_times.append(time.perf_counter() - start)
+
+            if r > 0:
+                continue
+            stats = by_category[case["category"]]
+            stats["cases"] += 1
+            found = result.get("first_wrong_step_index") if result.get("success") else "error"
+            if found == case["expected_first_wrong"]:
+                stats["correct"] += 1
+            else:
+                mismatches.append((case["name"], case["expected_first_wrong"], found))
+
+    total_steps = sum(len(case["steps"]) for case in corpus)
+    parse_failures = defaultdict(int)
+    for case in corpus:
+        for step in case["steps"]:
+            if _parse_equation(step) is None:
+                parse_failures[case["category"]] += 1
+
+    mode = "warm" if warm else "cold"
+    print(f"corpus: {len(corpus)} cases, {total_steps} steps × {repeat} ({mode} caches)")
+    print(f"   step: {_fmt_ms(timings['step'])}")
+    print(f"prepare: {_fmt_ms(timings['prepare'])}")
+    print(f"request: {_fmt_ms(request_times)}")
+
+    unexpected = sum(v for k, v in parse_failures.items() if k != "unparsed")
+    print(
+        f"parse failures: {sum(parse_failures.values())}/{total_steps}"
+        f" ({sum(parse_failures.values()) / total_steps:.1%}),"
+        f" outside 'unparsed' cases: {unexpected}"
+    )
+
+    correct = sum(s["correct"] for s in by_category.values())
+    print(f"first-wrong-step accuracy: {correct}/{len(corpus)} ({correct / len(corpus):.1%})")
+    for category, stats in sorted(by_category.items()):
+        print(f"  {category:>10}: {stats['correct']}/{stats['cases']}")
+    for name, expected, found in mismatches:
+        print(f"  ✗ {name}: expected {expected}, got {found}")
+
+    return {
+        "step_p50": statistics.median(timings["step"]),
+        "accuracy": correct / len(corpus),
+        "parse_failures": dict(parse_failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MathStepGrader benchmark")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="keep parse/solve caches between repeats")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generated", type=int, default=20, help="generated cases per family")
+    args = parser.parse_args()
+    run(repeat=args.repeat, warm=args.warm, seed=args.seed, generated=args.generated)
+
+
+if __name__ == "__main__":
+    main()
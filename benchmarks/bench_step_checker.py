@@ -0,0 +1,78 @@
+"""
+مقارنة زمن فحص صحة الخطوات:
+- الطريقة القديمة: sp.simplify(lhs - rhs) == 0
+- الطريقة المتدرجة: _sides_equal (عددي ← expand/cancel ← simplify)
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bench_step_checker
+"""
+import statistics
+import time
+
+import sympy as sp
+
+from rag.math_step_grader import (
+    _cached_solutions,
+    _detect_main_symbol,
+    _normalize_step_str,
+    _parse_equation,
+    _sides_equal,
+)
+
+from .math_step_corpus import build_corpus
+
+
+def _old_check(lhs, rhs) -> bool:
+    return sp.simplify(lhs - rhs) == 0
+
+
+def _checks():
+    """
+    كل (lhs, rhs) بعد تعويض الحل الصحيح، كما يفعل grade_steps
+    """
+    checks = []
+    for case in build_corpus():
+        correct_answer, steps = case["correct_answer"], case["steps"]
+        var = _detect_main_symbol(steps + [correct_answer])
+        solutions = _cached_solutions(_normalize_step_str(correct_answer), var)
+        for step in steps:
+            eq = _parse_equation(step)
+            if eq is None:
+                continue
+            for sol in solutions:
+                checks.append((eq.lhs.subs(var, sol), eq.rhs.subs(var, sol)))
+    return checks
+
+
+def _time(fn, checks, repeat):
+    timings = []
+    results = []
+    for _ in range(repeat):
+        for lhs, rhs in checks:
+            start = time.perf_counter()
+            results.append(fn(lhs, rhs))
+            timings.append(time.perf_counter() - start)
+    return timings, results[: len(checks)]
+
+
+def main(repeat: int = 5):
+    checks = _checks()
+
+    old_times, old_results = _time(_old_check, checks, repeat)
+    new_times, new_results = _time(_sides_equal, checks, repeat)
+
+    agree = sum(1 for a, b in zip(old_results, new_results) if a == b)
+
+    print(f"checks: {len(checks)} × {repeat}")
+    for name, times in (("simplify", old_times), ("tiered", new_times)):
+        print(
+            f"{name:>9}: mean {statistics.mean(times) * 1e6:9.1f} µs"
+            f" | p50 {statistics.median(times) * 1e6:9.1f} µs"
+            f" | total {sum(times) * 1e3:8.1f} ms"
+        )
+    print(f"speedup: {sum(old_times) / sum(new_times):.1f}x")
+    print(f"agreement: {agree}/{len(checks)}")
+
+
+if __name__ == "__main__":
+    main()
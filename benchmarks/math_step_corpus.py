@@ -0,0 +1,118 @@
+"""
+مجموعة حلول رياضية خطوة بخطوة للقياس والانحدار (regression):
+معادلات خطية، تربيعية، وقوانين فيزيائية، مع أخطاء مقصودة.
+
+كل عنصر:
+{
+  "name": "...",
+  "category": "linear" | "quadratic" | "physics" | "unparsed",
+  "correct_answer": "x = 2",
+  "steps": [...],
+  "expected_first_wrong": رقم الخطوة الخاطئة الأولى أو None
+}
+"""
+import random
+from typing import Any, Dict, List, Optional
+
+
+def _case(
+    name: str,
+    category: str,
+    correct_answer: str,
+    steps: List[str],
+    expected_first_wrong: Optional[int] = None,
+) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "category": category,
+        "correct_answer": correct_answer,
+        "steps": steps,
+        "expected_first_wrong": expected_first_wrong,
+    }
+
+
+# ✅ حالات مكتوبة يدويًا
+STATIC_CASES = [
+    # خطية
+    _case("linear_ok", "linear", "x = 2", ["2x + 3 = 7", "2x = 4", "x = 2"]),
+    _case("linear_arith_slip", "linear", "x = 2", ["2x + 3 = 7", "2x = 10", "x = 5"], 1),
+    _case("linear_brackets", "linear", "x = -1", ["3(x + 2) = 3", "3x + 6 = 3", "3x = -3", "x = -1"]),
+    _case("linear_brackets_sign", "linear", "x = -1", ["3(x + 2) = 3", "3x + 2 = 3", "3x = 1", "x = 1/3"], 1),
+    _case("linear_fraction", "linear", "x = 4", ["x/2 + 1 = 3", "x/2 = 2", "x = 4"]),
+    _case("linear_fraction_slip", "linear", "x = 4", ["x/2 + 1 = 3", "x/2 = 2", "x = 1"], 2),
+    _case("linear_both_sides", "linear", "x = 3", ["5x - 4 = 2x + 5", "3x - 4 = 5", "3x = 9", "x = 3"]),
+    _case("linear_both_sides_slip", "linear", "x = 3", ["5x - 4 = 2x + 5", "7x - 4 = 5", "7x = 9", "x = 9/7"], 1),
+    _case("linear_decimal", "linear", "x = 2.5", ["0.4x + 1 = 2", "0.4x = 1", "x = 2.5"]),
+    # تربيعية
+    _case("quadratic_square", "quadratic", "x = 2", ["x^2 - 4x + 4 = 0", "(x - 2)^2 = 0", "x - 2 = 0", "x = 2"]),
+    _case("quadratic_square_slip", "quadratic", "x = 2", ["x^2 - 4x + 4 = 0", "(x + 2)^2 = 0", "x = -2"], 1),
+    _case("quadratic_root", "quadratic", "x = 3", ["x^2 = 9", "x = 3"]),
+    _case("quadratic_shift", "quadratic", "x = 1", ["(x + 1)^2 = 4", "x + 1 = 2", "x = 1"]),
+    _case("quadratic_shift_slip", "quadratic", "x = 1", ["(x + 1)^2 = 4", "x + 1 = 4", "x = 3"], 1),
+    _case("quadratic_expand", "quadratic", "x = 5", ["x(x - 5) = 0", "x^2 - 5x = 0", "x - 5 = 0", "x = 5"]),
+    _case("radical", "quadratic", "x = 5", ["sqrt(x + 4) = 3", "x + 4 = 9", "x = 5"]),
+    _case("radical_slip", "quadratic", "x = 5", ["sqrt(x + 4) = 3", "x + 4 = 3", "x = -1"], 1),
+    # فيزياء
+    _case("velocity_ok", "physics", "v = u + a*t", ["v - u = a*t", "v = u + a*t"]),
+    _case("velocity_sign", "physics", "v = u + a*t", ["v - u = a*t", "v = u - a*t"], 1),
+    _case("velocity_divide", "physics", "v = u + a*t", ["(v - u)/t = a", "v - u = a*t", "v = u + a*t"]),
+    _case("newton_ok", "physics", "F = m*a", ["F/m = a", "F = m*a"]),
+    _case("newton_inverted", "physics", "F = m*a", ["F/m = a", "F = m/a"], 1),
+    _case("newton_first", "physics", "F = m*a", ["F = a/m", "F = m*a"], 0),
+    _case("displacement_ok", "physics", "s = u*t + a*t^2/2", ["2s = 2u*t + a*t^2", "s = u*t + a*t^2/2"]),
+    _case("displacement_half", "physics", "s = u*t + a*t^2/2", ["2s = 2u*t + a*t^2", "s = u*t + a*t^2"], 1),
+    _case("power_ok", "physics", "P = V*I", ["P/I = V", "P = V*I"]),
+    _case("ohm_ok", "physics", "V = I*R", ["V/R = I", "V = I*R"]),
+    _case("ohm_slip", "physics", "V = I*R", ["V/R = I", "V = R/I"], 1),
+    _case("energy_ok", "physics", "E = m*g*s", ["E/(m*g) = s", "E = m*g*s"]),
+    # خطوات لا تُفهم كمعادلات
+    _case("unparsed_text", "unparsed", "x = 2", ["2x + 3 = 7", "نطرح 3 من الطرفين", "x = 2"], 1),
+    _case("unparsed_syntax", "unparsed", "x = 2", ["2x + 3 = 7", "2x + = 4", "x = 2"], 1),
+    _case("unparsed_no_equals", "unparsed", "x = 3", ["5x - 4 = 11", "5x", "x = 3"], 1),
+]
+
+
+def _generated_linear(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    """
+    ax + b = c بحلول صحيحة، نصفها بخطأ حسابي في خطوة النقل (c + b بدل c - b)
+    """
+    cases = []
+    for i in range(count):
+        x = rng.randint(-9, 9)
+        a = rng.choice([2, 3, 4, 5, 6, 7])
+        b = rng.randint(1, 20)
+        c = a * x + b
+        if i % 2 == 0:
+            steps = [f"{a}x + {b} = {c}", f"{a}x = {c - b}", f"x = {x}"]
+            cases.append(_case(f"gen_linear_{i}", "linear", f"x = {x}", steps))
+        else:
+            steps = [f"{a}x + {b} = {c}", f"{a}x = {c + b}", f"x = {c + b}/{a}"]
+            cases.append(_case(f"gen_linear_{i}", "linear", f"x = {x}", steps, 1))
+    return cases
+
+
+def _generated_quadratic(rng: random.Random, count: int) -> List[Dict[str, Any]]:
+    """
+    (x - r)^2 = k^2 بجذر موجب، نصفها بخطأ في أخذ الجذر (k^2 بدل k)
+    """
+    cases = []
+    for i in range(count):
+        r = rng.randint(1, 6)
+        k = rng.randint(2, 5)
+        root = r + k
+        expanded = f"x^2 - {2 * r}x + {r * r - k * k} = 0"
+        if i % 2 == 0:
+            steps = [expanded, f"(x - {r})^2 = {k * k}", f"x - {r} = {k}", f"x = {root}"]
+            cases.append(_case(f"gen_quadratic_{i}", "quadratic", f"x = {root}", steps))
+        else:
+            steps = [expanded, f"(x - {r})^2 = {k * k}", f"x - {r} = {k * k}", f"x = {r + k * k}"]
+            cases.append(_case(f"gen_quadratic_{i}", "quadratic", f"x = {root}", steps, 2))
+    return cases
+
+
+def build_corpus(seed: int = 0, generated: int = 20) -> List[Dict[str, Any]]:
+    """
+    الحالات اليدوية + حالات مولّدة (حتمية لنفس seed)
+    """
+    rng = random.Random(seed)
+    return STATIC_CASES + _generated_linear(rng, generated) + _generated_quadratic(rng, generated)
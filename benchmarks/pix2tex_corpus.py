@@ -0,0 +1,95 @@
+"""
+مجموعة مخرجات pix2tex لقياس قواعد التنظيف (rag/latex_rules):
+- STATIC_CASES: مخرجات pix2tex نموذجية لصور طلاب (مع نص Vision المرافق)
+- build_corpus(): الحالات الثابتة + حالات مولدة عشوائيًا من نفس الرموز (لاختبار التطابق مع السلسلة القديمة)
+- load_from_db(): مخرجات حقيقية من جدول ocr_logs (pix2tex_latex + نص Vision لكل منطقة)
+"""
+import random
+from typing import Dict, List, Optional
+
+VISION_TEXTS = [
+    "",
+    "أوجد قيمة x",
+    "حل المعادلة التالية",
+    "F = ma",
+    "2x + 3 = 7",
+    "x = 2",
+    "Newton second law",
+    "x",
+]
+
+STATIC_LATEX = [
+    r"\mathbf{F}=m a",
+    r"2x+3=7",
+    r"x^{2}-5x+6=0",
+    r"\frac{1}{2}m v^{2}",
+    r"{\scriptstyle x=\frac{-b\pm\sqrt{b^{2}-4a c}}{2a}}",
+    r"\Delta x=v_{0}t+\frac{1}{2}a t^{2}",
+    r"y=\operatorname{sin}(x)",
+    r"\sqrt{1 6}=4",
+    r"O=l",
+    r"3\times4=12",
+    r"a\cdot b=b\cdot a",
+    r"E=m c^{2}",
+    r"\mathbf{v}=\frac{\Delta\mathbf{x}}{\Delta t}",
+    r"l=2\pi r",
+    r"x=\frac{7-3}{2}",
+    r"2\,x+3\,=\,7",
+    r"\scriptstyle 4 x - 8 = 0",
+    r"\mathbf{a}=\frac{\mathbf{F}}{m}",
+    r"x^{2}=9 \quad x=\pm3",
+    r"5 × 3 = 15",
+    r"6 · 2 = 12",
+    r"O + l = 1",
+    r"\left(x+1\right)^{2}=0",
+    r"{ { x } } = { 2 }",
+    r"\nu=\lambda f",
+]
+
+# رموز للحالات المولدة: تغطي حدود القواعد (مسافات، أقواس، أوامر LaTeX، حروف مفردة)
+FUZZ_TOKENS = [
+    "x", "y", "2", "3", "=", "+", "-", "^2", "^{2}", "{", "}", " ", "  ", "\t",
+    r"\mathbf{", r"\mathbf", r"\scriptstyle", r"\scriptstyle ", r"\Delta", "Delta",
+    "O", "l", "r", "×", "·", "Δ", "ν", "sqrt", r"\sqrt{", r"\frac{", "(", ")", "a", "m",
+]
+
+
+def build_corpus(seed: int = 0, generated: int = 500) -> List[Dict[str, str]]:
+    cases = []
+    for latex in STATIC_LATEX:
+        for vision in VISION_TEXTS:
+            cases.append({"latex": latex, "vision": vision, "source": "static"})
+
+    rng = random.Random(seed)
+    for _ in range(generated):
+        latex = "".join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 14)))
+        cases.append({"latex": latex, "vision": rng.choice(VISION_TEXTS), "source": "generated"})
+    return cases
+
+
+def load_from_db(limit: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    كل سطر pix2tex في ocr_logs حالة مستقلة مع نص منطقته (يحتاج DATABASE_URL).
+    صفوف "image" فقط؛ الصفوف القديمة متعددة الأسطر بدون region_texts تُتجاهل.
+    """
+    from db.database import SessionLocal
+    from db.models.ocr_logs import OCRLog
+
+    session = SessionLocal()
+    try:
+        query = session.query(OCRLog.pix2tex_latex, OCRLog.raw_text, OCRLog.region_texts).filter(
+            OCRLog.source_type == "image", OCRLog.pix2tex_latex.isnot(None)
+        )
+        if limit:
+            query = query.limit(limit)
+        cases = []
+        for pix2tex_latex, raw_text, region_texts in query.yield_per(1000):
+            lines = pix2tex_latex.split("\n")
+            regions = region_texts if region_texts is not None else [None] * len(lines)
+            if len(regions) != len(lines) or (region_texts is None and len(lines) > 1):
+                continue
+            for line, region in zip(lines, regions):
+                cases.append({"latex": line, "vision": region or raw_text or "", "source": "ocr_logs"})
+        return cases
+    finally:
+        session.close()
@@ -10,7 +10,9 @@ from db.models.student_attempts import StudentAttempt
 from db.models.math_steps import MathStep
 from db.models.ocr_logs import OCRLog
 from db.models.refresh_tokens import RefreshToken
+from db.schema import add_missing_columns
 
 print("Creating tables...")
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine)
 print("Done ✅")
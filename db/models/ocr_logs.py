@@ -1,13 +1,23 @@
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON
 from db.database import Base
 
 class OCRLog(Base):
     __tablename__ = "ocr_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    raw_text = Column(String)
-    latex = Column(String)
-    source_type = Column(String)
+    raw_text = Column(String)  # نص Google Vision الخام
+    latex = Column(String)  # LaTeX بعد التصحيحات
+    source_type = Column(String)  # image / pdf
+
+    # ✅ تُكتب دفعات من rag/ocr_logger.py (بعد انتهاء الطلب)
+    pix2tex_latex = Column(String)  # مخرج pix2tex الخام قبل التصحيحات
+    image_hash = Column(String(64), index=True)  # sha256 لمحتوى الملف
+    timings = Column(JSON)
+    # نص Vision لكل سطر من pix2tex_latex بنفس الترتيب (None = نص Vision الكامل)
+    region_texts = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 # from sqlalchemy import Column, Integer, String, DateTime
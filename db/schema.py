@@ -0,0 +1,39 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from db.database import Base, engine
+
+
+def add_missing_columns(bind=engine, tables=None):
+    """
+    create_all() لا يعدّل الجداول الموجودة: الأعمدة الجديدة في النماذج (كلها nullable)
+    تُضاف هنا بـ ALTER TABLE مع فهارسها. أي فشل يوقف التشغيل برسالة واضحة
+    بدل أن تفشل الكتابة لاحقًا بصمت (مثل سجلات OCR).
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in tables or Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        missing = [col for col in table.columns if col.name not in existing]
+        if not missing:
+            continue
+
+        existing_indexes = {idx["name"] for idx in inspector.get_indexes(table.name)}
+        try:
+            with bind.begin() as conn:
+                for col in missing:
+                    col_type = col.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+                    print(f"✅ {table.name}: أضيف العمود {col.name} ({col_type})")
+                names = {col.name for col in missing}
+                for index in table.indexes:
+                    if index.name not in existing_indexes and names & {c.name for c in index.columns}:
+                        conn.execute(CreateIndex(index))
+        except Exception as e:
+            raise RuntimeError(
+                f"Schema of table '{table.name}' is out of date (missing: {', '.join(c.name for c in missing)}) "
+                f"and could not be migrated: {e}"
+            ) from e
@@ -2,16 +2,36 @@ from typing import List, Optional, Literal, Dict, Any
 from datetime import timedelta
 from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import os
+import time
+import uuid
 # import requests
 # from sqlalchemy.orm import Session
 from jose import jwt, JWTError
 
 from rag.rag_pipeline import RAGPipeline
-from rag.config import SUBJECTS, GRADES
+from rag.config import (
+    SUBJECTS,
+    GRADES,
+    EXAM_POOL_ENABLED,
+    EXAM_POOL_PREWARM,
+    EXAM_MAX_QUESTIONS,
+    SUBMIT_GRADING_CONCURRENCY,
+    SUBMIT_GRADING_DEADLINE_SECONDS,
+    BULK_GRADE_MAX_ITEMS,
+    MATH_CLASS_MAX_SUBMISSIONS,
+    MATH_CLASS_MAX_STEPS,
+    FASTPATH_ENABLED,
+    MATH_WORKERS_ENABLED,
+    ASK_FILE_MAX_CHARS,
+    UPLOAD_MAX_MATH_IMAGE_BYTES,
+)
 from rag.grading_engine import GradingEngine
+from rag.answer_fastpath import AnswerFastPath
 from rag.exam_engine import ExamEngine
+from rag.exam_pool import ExamPool
 from rag.student_record import StudentRecordManager
 from rag.token_blacklist import TokenBlacklist
 from rag.auth import user_manager, create_access_token, decode_token
@@ -28,6 +48,19 @@ from rag.file_processor import (
 from rag.math_ocr import image_to_latex
 from rag.groq_client import GroqClient
 from rag.math_step_grader import MathStepGrader
+from rag.math_worker_pool import MathWorkerPool
+from rag.math_step_sessions import MathStepSessionStore
+from rag.math_step_grader import math_cache_stats
+from rag.executors import io_executor, cpu_executor, ExecutorOverloaded
+from rag.upload_index import document_key
+from rag.ocr_cache import ocr_cache
+from rag.ocr_backends import get_ocr_backend
+from rag.ocr_logger import OCRLogWriter
+from rag.latex_rules import rule_stats
+from rag.json_salvage import salvage_snapshot
+from rag.uploads import receive_upload, max_upload_bytes, UploadBodyLimit, UploadRejected, IMAGE_TYPES
+from rag.latex_inference import latex_service
+from rag.math_answer_verifier import verify_math_answer
 from rag.auth import refresh_token_manager
 
 from auth.security import ( 
@@ -46,6 +79,7 @@ from auth.dependencies import get_current_user
 from fastapi.responses import RedirectResponse
 
 from db.database import Base, engine
+from db.schema import add_missing_columns
 from db.models.users import User
 from db.models.students import Student
 from db.models.exams import Exam
@@ -67,9 +101,93 @@ app = FastAPI(
     ),
 )
 
+# ✅ حد حجم الطلب لمسارات رفع الملفات قبل أن يقرأ FastAPI النموذج (لا يُكتب ملف ضخم على القرص ثم يُرفض)
+app.add_middleware(
+    UploadBodyLimit,
+    limits={
+        "/ask_file": max_upload_bytes(),
+        "/submit_answer_file": max_upload_bytes(),
+        "/math_ocr": UPLOAD_MAX_MATH_IMAGE_BYTES,
+        "/ask_math_file": UPLOAD_MAX_MATH_IMAGE_BYTES,
+        "/submit_math_answer_file": UPLOAD_MAX_MATH_IMAGE_BYTES,
+    },
+)
+
 @app.on_event("startup")
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    # ✅ أعمدة جديدة في جداول موجودة (مثل ocr_logs) → ALTER TABLE، أو فشل واضح عند التشغيل
+    add_missing_columns(engine)
+
+
+@app.on_event("startup")
+def start_exam_pool():
+    if not EXAM_POOL_ENABLED:
+        return
+    if EXAM_POOL_PREWARM:
+        exam_pool.register_from_spec(EXAM_POOL_PREWARM)
+    exam_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_exam_pool():
+    exam_pool.stop()
+
+
+@app.on_event("startup")
+def start_math_workers():
+    if math_worker_pool is not None:
+        math_worker_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_math_workers():
+    if math_worker_pool is not None:
+        math_worker_pool.stop()
+
+
+@app.on_event("startup")
+def start_latex_service():
+    # ✅ تحميل نسخ pix2tex مسبقًا حتى لا يدفع أول طلب ثمن التحميل
+    latex_service.start()
+
+
+@app.on_event("shutdown")
+def stop_latex_service():
+    latex_service.stop()
+
+
+@app.on_event("startup")
+def start_ocr_logger():
+    ocr_logger.start()
+
+
+@app.on_event("shutdown")
+def stop_ocr_logger():
+    # يكتب ما تبقى في الطابور قبل الإغلاق
+    ocr_logger.stop()
+
+
+@app.on_event("shutdown")
+def stop_executors():
+    io_executor.shutdown()
+    cpu_executor.shutdown()
+
+
+@app.exception_handler(ExecutorOverloaded)
+def executor_overloaded_handler(request: Request, exc: ExecutorOverloaded):
+    # ✅ الطابور ممتلئ: نرفض فورًا بدل أن ينتظر الطلب بلا حد
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "الخادم مشغول حاليًا، حاول مرة أخرى بعد قليل.", "executor": exc.name},
+        headers={"Retry-After": "2"},
+    )
+
+
+@app.exception_handler(UploadRejected)
+def upload_rejected_handler(request: Request, exc: UploadRejected):
+    # ✅ ملف أكبر من الحد / نوع غير مدعوم: يُرفض قبل أي معالجة
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.message})
 
 def get_db():
     db: Session = SessionLocal()
@@ -131,12 +249,20 @@ def get_current_teacher(user: Dict[str, Any] = Depends(get_current_user)) -> Dic
 # ============ الكيانات الأساسية ============
 
 rag = RAGPipeline()
-grading_engine = GradingEngine()
+# ✅ نفس EmbeddingModel المحمّل في Chroma (لا نحمّل الموديل مرتين)
+answer_fast_path = AnswerFastPath(rag.db.embedding_model) if FASTPATH_ENABLED else None
+grading_engine = GradingEngine(fast_path=answer_fast_path)
 exam_engine = ExamEngine()
+exam_pool = ExamPool(exam_engine)
 student_records = StudentRecordManager()
 token_blacklist = TokenBlacklist()
 math_llm = GroqClient()
-math_step_grader = MathStepGrader()
+# ✅ sympy في عمليات منفصلة بمهلة لكل خطوة (لا يعلق خيط الخادم بمدخلات مرضية)
+math_worker_pool = MathWorkerPool() if MATH_WORKERS_ENABLED else None
+math_step_grader = MathStepGrader(pool=math_worker_pool)
+math_step_sessions = MathStepSessionStore(math_step_grader)
+# ✅ سجلات OCR تُكتب في الخلفية على دفعات (لا تضيف زمن قاعدة البيانات للطلب)
+ocr_logger = OCRLogWriter(SessionLocal, OCRLog)
 
 
 # ============ موديلات عامة ============
@@ -162,6 +288,7 @@ class GeneratedExam(BaseModel):
     subject: str
     grade: str
     questions: List[GeneratedQuestion]
+    generation_stats: Optional[Dict[str, int]] = None
 
 
 class GenerateExamRequest(BaseModel):
@@ -181,6 +308,17 @@ class ExamSubmission(BaseModel):
     answers: List[StudentAnswer]
 
 
+class BulkGradeItem(BaseModel):
+    id: str
+    question: str
+    student_answer: str
+    model_answer: str
+
+
+class BulkGradeRequest(BaseModel):
+    items: List[BulkGradeItem]
+
+
 # موديلات الحسابات
 
 class RegisterRequest(BaseModel):
@@ -206,6 +344,27 @@ class MathStepsRequest(BaseModel):
     student_steps: List[str]
 
 
+class MathStepSessionRequest(BaseModel):
+    question: str
+    correct_answer: str
+    student_steps: List[str] = []
+
+
+class MathStepAppendRequest(BaseModel):
+    step: str
+
+
+class MathStepsSubmission(BaseModel):
+    student_id: str
+    student_steps: List[str]
+
+
+class MathStepsClassRequest(BaseModel):
+    question: str
+    correct_answer: str
+    submissions: List[MathStepsSubmission]
+
+
 # ============ Endpoints الحسابات ============
 
 # @app.post("/register", response_model=UserPublic)
@@ -608,36 +767,66 @@ async def ask_from_file(
     subject: str,
     grade: str,
     file: UploadFile = File(...),
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    question: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
-    file_bytes = await file.read()
-    filename = file.filename.lower()
-
-    if filename.endswith((".png", ".jpg", ".jpeg", ".webp")):
-        rich = extract_rich_from_image_google(file_bytes)
-        extracted_text = rich["merged"]
-
-    elif filename.endswith(".pdf"):
-        extracted_text = extract_text_from_pdf_google(file_bytes)
-        rich = {
-            "detected_type": "text",
-            "used_pix2tex": False,
-            "latex": None,
-        }
-
-    else:
-        raise HTTPException(400, "Unsupported file type")
+    question = (question or "").strip() or None
+
+    doc = None
+    with await receive_upload(file) as upload:
+        if upload.is_image:
+            file_key = document_key(upload.sha256)
+            # ✅ مسار الرياضيات: pix2tex يبدأ بالتوازي مع Vision
+            rich = await io_executor.run(
+                extract_rich_from_image_google, upload.read_bytes(), subject.lower().strip() == "math"
+            )
+            extracted_text = rich["merged"]
+            ocr_logger.log_rich(rich, "image", upload.sha256)
 
-    if not extracted_text:
+        else:
+            pdf_started = time.perf_counter()
+            # بدون سؤال يُقرأ الملف حتى ASK_FILE_MAX_CHARS فقط → مستند مختلف عن الملف كاملاً
+            file_key = document_key(upload.sha256, first_page, last_page, truncated=not question)
+            doc = rag.get_document(file_key) if question else None
+            if doc is not None:
+                # ✅ نفس الملف (ونفس الصفحات) مفهرس مسبقًا: لا حاجة لقراءته مرة أخرى
+                extracted_text = None
+            elif question:
+                # سؤال صريح عن الملف: نقرأ الملف كاملاً (ضمن حد الصفحات) ونفهرسه
+                extracted_text = await io_executor.run(
+                    extract_text_from_pdf_google, upload.path(), first_page, last_page
+                )
+            else:
+                # ✅ الصفحات تُقرأ بالتوازي ونتوقف عندما يكفي النص للسؤال
+                extracted_text = await io_executor.run(
+                    extract_text_from_pdf_google, upload.path(), first_page, last_page, ASK_FILE_MAX_CHARS
+                )
+            rich = {
+                "detected_type": "text",
+                "used_pix2tex": False,
+                "latex": None,
+                "timings": {"pdf_ms": round((time.perf_counter() - pdf_started) * 1000, 1)},
+            }
+            if extracted_text is not None:
+                ocr_logger.log("pdf", raw_text=extracted_text, image_hash=upload.sha256, timings=rich["timings"])
+
+    if extracted_text is not None and not extracted_text.strip():
         raise HTTPException(400, "لم يتم التعرف على أي نص من الملف.")
 
-    answer, sources = rag.answer(extracted_text, subject, grade)
+    # ✅ الملفات الطويلة: فهرس مؤقت للملف + المنهج، والمقاطع الأقرب فقط تذهب للنموذج
+    answer, sources = await io_executor.run(
+        rag.answer_document, file_key, extracted_text, subject, grade, question, doc
+    )
 
     return {
-        "question_extracted": extracted_text,
+        "question_extracted": extracted_text if extracted_text is not None else question,
         "detected_type": rich.get("detected_type"),
         "used_pix2tex": rich.get("used_pix2tex"),
         "latex": rich.get("latex"),
+        "latex_lines": rich.get("latex_lines"),
+        "timings": rich.get("timings"),
         "answer": answer,
         "sources": sources,
     }
@@ -659,7 +848,13 @@ def generate_exam(
     if grade not in GRADES:
         raise HTTPException(400, "Invalid grade")
 
-    raw_exam = exam_engine.generate_exam(subject, grade, req.num_questions)
+    if not 1 <= req.num_questions <= EXAM_MAX_QUESTIONS:
+        raise HTTPException(400, f"num_questions must be between 1 and {EXAM_MAX_QUESTIONS}")
+
+    # ✅ نحاول أولاً من المخزون الجاهز، وإلا نولّد مباشرة
+    raw_exam = exam_pool.pop(subject, grade, req.num_questions) if EXAM_POOL_ENABLED else None
+    if raw_exam is None:
+        raw_exam = exam_engine.generate_exam(subject, grade, req.num_questions)
 
     if "error" in raw_exam:
         raise HTTPException(
@@ -691,11 +886,29 @@ def generate_exam(
     if not questions:
         raise HTTPException(500, "No valid questions generated")
 
-    return GeneratedExam(subject=subject, grade=grade, questions=questions)
+    return GeneratedExam(
+        subject=subject,
+        grade=grade,
+        questions=questions,
+        generation_stats=raw_exam.get("generation_stats"),
+    )
 
 
 # ============ تصحيح امتحان كامل (طالب فقط) ============
 
+def _fast_path_summary(results) -> Dict[str, Any]:
+    """
+    كم إجابة حُسمت محليًا دون LLM في هذا الطلب، ونسبة التخطي التراكمية
+    """
+    results = list(results)
+    local = sum(1 for r in results if str(r.get("graded_by", "")).startswith("fast_path"))
+    return {
+        "graded_locally": local,
+        "graded_by_llm": len(results) - local,
+        "overall_skip_rate": answer_fast_path.skip_rate() if answer_fast_path else 0.0,
+    }
+
+
 @app.post("/submit_exam")
 def submit_exam(
     submission: ExamSubmission,
@@ -707,6 +920,7 @@ def submit_exam(
     question_map = {q.id: q for q in exam.questions}
 
     per_question_results = []
+    open_items = []
     total_score = 0.0
     question_count = 0
 
@@ -750,20 +964,6 @@ def submit_exam(
             total_score += score
 
         elif q.type == "open":
-            if not ans.answer_text:
-                grading_result = {
-                    "score": 0,
-                    "is_correct": False,
-                    "feedback": "لا توجد إجابة من الطالب.",
-                    "correct_answer": q.model_answer,
-                }
-            else:
-                grading_result = grading_engine.grade(
-                    question=q.question,
-                    student_answer=ans.answer_text,
-                    model_answer=q.model_answer,
-                )
-
             per_question_results.append(
                 {
                     "question_id": q.id,
@@ -771,12 +971,22 @@ def submit_exam(
                     "question": q.question,
                     "student_answer": ans.answer_text,
                     "model_answer": q.model_answer,
-                    "score": grading_result.get("score", 0),
-                    "is_correct": grading_result.get("is_correct", False),
-                    "feedback": grading_result.get("feedback", ""),
+                    "score": 0,
+                    "is_correct": False,
+                    "feedback": "لا توجد إجابة من الطالب.",
                 }
             )
-            total_score += grading_result.get("score", 0)
+
+            # ✅ نجمع الأسئلة المفتوحة ونصححها كلها معًا بعد الحلقة
+            if ans.answer_text:
+                open_items.append(
+                    {
+                        "id": len(per_question_results) - 1,
+                        "question": q.question,
+                        "student_answer": ans.answer_text,
+                        "model_answer": q.model_answer,
+                    }
+                )
 
         else:
             per_question_results.append(
@@ -795,23 +1005,93 @@ def submit_exam(
     if question_count == 0:
         raise HTTPException(400, "No valid answers/questions to grade")
 
+    # ✅ تصحيح الأسئلة المفتوحة بالتوازي مع مهلة إجمالية:
+    # زمن التسليم ≈ أبطأ سؤال واحد وليس مجموع الأسئلة
+    graded, late = grading_engine.grade_many(
+        open_items,
+        max_workers=SUBMIT_GRADING_CONCURRENCY,
+        deadline=SUBMIT_GRADING_DEADLINE_SECONDS,
+    )
+
+    for idx, grading_result in graded.items():
+        per_question_results[idx].update(
+            {
+                "score": grading_result.get("score", 0),
+                "is_correct": grading_result.get("is_correct", False),
+                "feedback": grading_result.get("feedback", ""),
+            }
+        )
+
+    for idx in late:
+        per_question_results[idx].update(
+            {
+                "status": "pending",
+                "feedback": "جارٍ التصحيح، ستظهر النتيجة في سجل الطالب لاحقًا.",
+            }
+        )
+
+    total_score += sum(r["score"] for r in per_question_results if r["type"] == "open")
     exam_score = total_score / question_count
 
+    exam_id = str(uuid.uuid4())
     result = {
+        "exam_id": exam_id,
         "subject": exam.subject,
         "grade": exam.grade,
         "num_questions": question_count,
         "total_score": exam_score,
         "questions": per_question_results,
+        "pending_question_ids": [per_question_results[idx]["question_id"] for idx in late],
+        "fast_path": _fast_path_summary(graded.values()),
     }
 
     # حفظ النتيجة باسم الطالب (username) من الـ JWT
     student_id = current_student["username"]
     student_records.add_exam_result(student_id, result)
 
+    # ✅ الأسئلة المتأخرة تُكمَل في السجل عند انتهاء تصحيحها
+    for idx, future in late.items():
+        future.add_done_callback(
+            lambda fut, qid=per_question_results[idx]["question_id"]: student_records.complete_pending_question(
+                student_id, exam_id, qid, fut.result()
+            )
+        )
+
     return result
 
 
+# ============ تصحيح جماعي (مدرّس فقط) ============
+
+@app.post("/grade_answers_bulk")
+def grade_answers_bulk(
+    req: BulkGradeRequest,
+    current_teacher: Dict[str, Any] = Depends(get_current_teacher),
+):
+    """
+    تصحيح عدد كبير من الإجابات دفعة واحدة:
+    الإجابات تُجمع في دفعات (طلب LLM واحد لكل دفعة) وتُرسل الدفعات بالتوازي.
+    """
+    if not req.items:
+        raise HTTPException(400, "No items to grade")
+    if len(req.items) > BULK_GRADE_MAX_ITEMS:
+        raise HTTPException(413, f"Too many items (max {BULK_GRADE_MAX_ITEMS} per request)")
+
+    ids = [item.id for item in req.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(400, "Duplicate item ids")
+
+    graded, _ = grading_engine.grade_many(
+        [item.dict() for item in req.items],
+        max_workers=SUBMIT_GRADING_CONCURRENCY,
+    )
+
+    return {
+        "num_items": len(req.items),
+        "results": [{"id": item_id, **graded.get(item_id, {})} for item_id in ids],
+        "fast_path": _fast_path_summary(graded.values()),
+    }
+
+
 @app.post("/submit_answer_file")
 async def submit_answer_from_file(
     question: str,
@@ -819,29 +1099,29 @@ async def submit_answer_from_file(
     file: UploadFile = File(...),
     current_student: Dict[str, Any] = Depends(get_current_student),
 ):
-    file_bytes = await file.read()
-    filename = file.filename.lower()
-
-    if filename.endswith((".png", ".jpg", ".jpeg", ".webp")):
-        rich = extract_rich_from_image_google(file_bytes)
-        student_answer_text = rich["merged"]
-        latex = rich["latex"]
-
-    elif filename.endswith(".pdf"):
-        student_answer_text = extract_text_from_pdf_google(file_bytes)
-        latex = None
-        rich = {
-            "detected_type": "text",
-            "used_pix2tex": False,
-        }
+    with await receive_upload(file) as upload:
+        if upload.is_image:
+            rich = await io_executor.run(extract_rich_from_image_google, upload.read_bytes())
+            student_answer_text = rich["merged"]
+            latex = rich["latex"]
+            ocr_logger.log_rich(rich, "image", upload.sha256)
 
-    else:
-        raise HTTPException(400, "Unsupported file type")
+        else:
+            pdf_started = time.perf_counter()
+            student_answer_text = await io_executor.run(extract_text_from_pdf_google, upload.path())
+            latex = None
+            rich = {
+                "detected_type": "text",
+                "used_pix2tex": False,
+                "timings": {"pdf_ms": round((time.perf_counter() - pdf_started) * 1000, 1)},
+            }
+            ocr_logger.log("pdf", raw_text=student_answer_text, image_hash=upload.sha256, timings=rich["timings"])
 
     if not student_answer_text:
         raise HTTPException(400, "لم يتم التعرف على أي نص من إجابة الطالب.")
 
-    grading_result = grading_engine.grade(
+    grading_result = await io_executor.run(
+        grading_engine.grade,
         question=question,
         student_answer=student_answer_text,
         model_answer=model_answer,
@@ -853,6 +1133,8 @@ async def submit_answer_from_file(
         "used_pix2tex": rich.get("used_pix2tex"),
         "student_answer_extracted": student_answer_text,
         "student_answer_latex": latex,
+        "student_answer_latex_lines": rich.get("latex_lines"),
+        "timings": rich.get("timings"),
         "grading_result": grading_result,
     }
 
@@ -898,16 +1180,28 @@ async def math_ocr_endpoint(
     file: UploadFile = File(...),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
-    file_bytes = await file.read()
-    filename = file.filename.lower()
-
-    if not filename.endswith((".png", ".jpg", ".jpeg", ".webp")):
-        raise HTTPException(400, "هذا المسار خاص بالصور فقط (png/jpg/jpeg/webp).")
-
+    with await receive_upload(
+        file,
+        allowed=IMAGE_TYPES,
+        max_bytes=UPLOAD_MAX_MATH_IMAGE_BYTES,
+        unsupported_message="هذا المسار خاص بالصور فقط (png/jpg/jpeg/webp).",
+    ) as upload:
+        file_bytes = upload.read_bytes()
+        file_key = upload.sha256
+
+    pix2tex_started = time.perf_counter()
     try:
-        latex = image_to_latex(file_bytes)
+        latex = await io_executor.run(image_to_latex, file_bytes)
+    except ExecutorOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(500, f"فشل تحويل الصورة إلى LaTeX: {e}")
+    ocr_logger.log(
+        "math_image",
+        pix2tex_latex=latex,
+        image_hash=file_key,
+        timings={"pix2tex_ms": round((time.perf_counter() - pix2tex_started) * 1000, 1)},
+    )
 
     return {
         "latex": latex
@@ -919,16 +1213,28 @@ async def ask_math_from_file(
     file: UploadFile = File(...),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
-    file_bytes = await file.read()
-    filename = file.filename.lower()
-
-    if not filename.endswith((".png", ".jpg", ".jpeg", ".webp")):
-        raise HTTPException(400, "هذا المسار خاص بصور المعادلات (png/jpg/jpeg/webp).")
-
+    with await receive_upload(
+        file,
+        allowed=IMAGE_TYPES,
+        max_bytes=UPLOAD_MAX_MATH_IMAGE_BYTES,
+        unsupported_message="هذا المسار خاص بصور المعادلات (png/jpg/jpeg/webp).",
+    ) as upload:
+        file_bytes = upload.read_bytes()
+        file_key = upload.sha256
+
+    pix2tex_started = time.perf_counter()
     try:
-        latex = image_to_latex(file_bytes)
+        latex = await io_executor.run(image_to_latex, file_bytes)
+    except ExecutorOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(500, f"فشل تحويل الصورة إلى LaTeX: {e}")
+    ocr_logger.log(
+        "math_image",
+        pix2tex_latex=latex,
+        image_hash=file_key,
+        timings={"pix2tex_ms": round((time.perf_counter() - pix2tex_started) * 1000, 1)},
+    )
 
     # نبني برومبت للـ LLM لحل أو شرح المعادلة
     system_prompt = (
@@ -938,7 +1244,7 @@ async def ask_math_from_file(
 
     user_prompt = f"المعادلة (LaTeX):\n{latex}\n\nحل المعادلة مع شرح الخطوات."
 
-    answer = math_llm.generate(system_prompt, user_prompt)
+    answer = await io_executor.run(math_llm.generate, system_prompt, user_prompt)
 
     return {
         "latex": latex,
@@ -954,30 +1260,65 @@ async def submit_math_answer_from_file(
     file: UploadFile = File(...),
     current_student: Dict[str, Any] = Depends(get_current_student),
 ):
-    file_bytes = await file.read()
-    filename = file.filename.lower()
-
-    if not filename.endswith((".png", ".jpg", ".jpeg", ".webp")):
-        raise HTTPException(400, "هذا المسار خاص بصور المعادلات (png/jpg/jpeg/webp).")
-
+    with await receive_upload(
+        file,
+        allowed=IMAGE_TYPES,
+        max_bytes=UPLOAD_MAX_MATH_IMAGE_BYTES,
+        unsupported_message="هذا المسار خاص بصور المعادلات (png/jpg/jpeg/webp).",
+    ) as upload:
+        file_bytes = upload.read_bytes()
+        file_key = upload.sha256
+
+    pix2tex_started = time.perf_counter()
     try:
-        student_latex = image_to_latex(file_bytes)
+        student_latex = await io_executor.run(image_to_latex, file_bytes)
+    except ExecutorOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(500, f"فشل تحويل صورة الطالب إلى LaTeX: {e}")
-
-    # نبني إجابة طالب نصية/رمزية لإرسالها لمحرك التصحيح
-    student_answer_text = f"إجابة الطالب بالصيغة LaTeX: {student_latex}"
-
-    grading_result = grading_engine.grade(
-        question=question,
-        student_answer=student_answer_text,
-        model_answer=model_answer
+    ocr_logger.log(
+        "math_image",
+        pix2tex_latex=student_latex,
+        image_hash=file_key,
+        timings={"pix2tex_ms": round((time.perf_counter() - pix2tex_started) * 1000, 1)},
     )
 
+    # ✅ تحقق رمزي أولاً (sympy): إن كان الحكم قاطعًا لا نحتاج Groq
+    # (في عامل MathWorkerPool بمهلة، مثل تصحيح الخطوات)
+    if math_worker_pool is not None:
+        verification = await io_executor.run(math_worker_pool.verify_answer, student_latex, model_answer)
+    else:
+        verification = await cpu_executor.run(verify_math_answer, student_latex, model_answer)
+
+    if verification["decisive"]:
+        is_correct = bool(verification["equivalent"])
+        grading_result = {
+            "score": 100 if is_correct else 0,
+            "is_correct": is_correct,
+            "feedback": (
+                "إجابة صحيحة ومكافئة رياضيًا للإجابة النموذجية."
+                if is_correct
+                else "الإجابة غير مكافئة رياضيًا للإجابة النموذجية."
+            ),
+            "correct_answer": model_answer,
+            "graded_by": "sympy",
+        }
+    else:
+        # نبني إجابة طالب نصية/رمزية لإرسالها لمحرك التصحيح
+        student_answer_text = f"إجابة الطالب بالصيغة LaTeX: {student_latex}"
+
+        grading_result = await io_executor.run(
+            grading_engine.grade,
+            question=question,
+            student_answer=student_answer_text,
+            model_answer=model_answer
+        )
+
     return {
         "question": question,
         "student_answer_latex": student_latex,
         "model_answer": model_answer,
+        "verification": verification,
         "grading_result": grading_result
     }
 
@@ -1008,3 +1349,122 @@ def grade_math_steps(
         correct_answer=req.correct_answer,
     )
     return result
+
+
+@app.post("/grade_math_steps_class")
+def grade_math_steps_class(
+    req: MathStepsClassRequest,
+    current_teacher: Dict[str, Any] = Depends(get_current_teacher),
+):
+    """
+    تصحيح حلول صف كامل لنفس المسألة خطوة بخطوة (مدرّس فقط).
+    المعادلة الصحيحة تُحل مرة واحدة، والخطوات المكررة بين الطلاب تُفحص مرة واحدة،
+    مع ملخص لأكثر الأخطاء الأولى تكرارًا.
+
+    {
+      "question": "حل المعادلة 2x + 3 = 7",
+      "correct_answer": "x = 2",
+      "submissions": [
+        {"student_id": "ali", "student_steps": ["2x + 3 = 7", "2x = 4", "x = 2"]},
+        {"student_id": "sara", "student_steps": ["2x + 3 = 7", "2x = 10", "x = 5"]}
+      ]
+    }
+    """
+    if not req.submissions:
+        raise HTTPException(400, "No submissions to grade")
+    if len(req.submissions) > MATH_CLASS_MAX_SUBMISSIONS:
+        raise HTTPException(400, f"Too many submissions (max {MATH_CLASS_MAX_SUBMISSIONS} per request)")
+    if any(len(sub.student_steps) > MATH_CLASS_MAX_STEPS for sub in req.submissions):
+        raise HTTPException(400, f"Too many steps in a submission (max {MATH_CLASS_MAX_STEPS})")
+
+    ids = [sub.student_id for sub in req.submissions]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(400, "Duplicate student ids")
+
+    return math_step_grader.grade_class(
+        question=req.question,
+        correct_answer=req.correct_answer,
+        submissions=[sub.dict() for sub in req.submissions],
+    )
+
+
+# ============ تحقق فوري من الخطوات (جلسات) ============
+
+@app.post("/math_steps/session")
+def create_math_step_session(
+    req: MathStepSessionRequest,
+    current_student: Dict[str, Any] = Depends(get_current_student),
+):
+    """
+    فتح جلسة لمسألة واحدة: المعادلة الصحيحة تُحل مرة واحدة هنا،
+    ثم يرسل الطالب كل سطر جديد إلى /math_steps/session/{session_id}/step
+    """
+    result = math_step_sessions.create(
+        owner=current_student["username"],
+        question=req.question,
+        correct_answer=req.correct_answer,
+        student_steps=req.student_steps,
+    )
+    if not result.get("success"):
+        raise HTTPException(400, result.get("error"))
+    return result
+
+
+@app.post("/math_steps/session/{session_id}/step")
+def append_math_step(
+    session_id: str,
+    req: MathStepAppendRequest,
+    current_student: Dict[str, Any] = Depends(get_current_student),
+):
+    """
+    فحص السطر الجديد فقط، مع ملخص الحل حتى الآن
+    """
+    result = math_step_sessions.append_step(session_id, current_student["username"], req.step)
+    if result is None:
+        raise HTTPException(404, "Session not found or expired")
+    return result
+
+
+@app.get("/math_steps/session/{session_id}")
+def get_math_step_session(
+    session_id: str,
+    current_student: Dict[str, Any] = Depends(get_current_student),
+):
+    result = math_step_sessions.get(session_id, current_student["username"])
+    if result is None:
+        raise HTTPException(404, "Session not found or expired")
+    return result
+
+
+@app.delete("/math_steps/session/{session_id}")
+def close_math_step_session(
+    session_id: str,
+    current_student: Dict[str, Any] = Depends(get_current_student),
+):
+    if not math_step_sessions.close(session_id, current_student["username"]):
+        raise HTTPException(404, "Session not found or expired")
+    return {"closed": True}
+
+
+# ============ مقاييس التشغيل ============
+
+@app.get("/metrics")
+def get_metrics(current_teacher: Dict[str, Any] = Depends(get_current_teacher)):
+    """
+    حالة المنفذات والكاشات وعمال sympy
+    """
+    return {
+        "executors": {
+            "io": io_executor.snapshot(),
+            "cpu": cpu_executor.snapshot(),
+        },
+        "pix2tex": latex_service.snapshot(),
+        "ocr_cache": ocr_cache.snapshot() if ocr_cache is not None else None,
+        "ocr_backend": get_ocr_backend().snapshot(),
+        "ocr_logger": ocr_logger.snapshot(),
+        "upload_index": rag.uploads.snapshot(),
+        "math_workers": math_worker_pool.snapshot() if math_worker_pool is not None else None,
+        "math_caches": math_cache_stats(),
+        "latex_rules": rule_stats(),
+        "json_salvage": salvage_snapshot(),
+    }
@@ -0,0 +1,200 @@
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    FASTPATH_SIM_HIGH,
+    FASTPATH_SIM_LOW,
+    FASTPATH_NUMERIC_REL_TOL,
+)
+
+_DIACRITICS_RE = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_PUNCT_RE = re.compile(r"[^\w\s./²³^%+\-]+")
+_SPACES_RE = re.compile(r"\s+")
+_ARABIC_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ة": "ه", "ؤ": "و", "ئ": "ي",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+    "٫": ".", "،": ",", "−": "-",
+})
+
+_QUANTITY_RE = re.compile(r"^([-+]?\d+(?:[.,]\d+)?)\s*(.*)$")
+
+# ✅ وحدات شائعة → (الوحدة الأساسية، معامل التحويل إليها)
+UNITS = {
+    "": ("", 1.0),
+    "n": ("N", 1.0), "نيوتن": ("N", 1.0),
+    "kg": ("kg", 1.0), "كغم": ("kg", 1.0), "كجم": ("kg", 1.0), "كغ": ("kg", 1.0), "كيلوغرام": ("kg", 1.0),
+    "g": ("kg", 0.001), "غم": ("kg", 0.001), "غرام": ("kg", 0.001), "جم": ("kg", 0.001),
+    "m": ("m", 1.0), "م": ("m", 1.0), "متر": ("m", 1.0),
+    "cm": ("m", 0.01), "سم": ("m", 0.01),
+    "km": ("m", 1000.0), "كم": ("m", 1000.0),
+    "s": ("s", 1.0), "ث": ("s", 1.0), "ثانيه": ("s", 1.0),
+    "min": ("s", 60.0), "دقيقه": ("s", 60.0),
+    "m/s": ("m/s", 1.0), "م/ث": ("m/s", 1.0),
+    "km/h": ("m/s", 1000.0 / 3600.0), "كم/س": ("m/s", 1000.0 / 3600.0),
+    "m/s2": ("m/s2", 1.0), "m/s^2": ("m/s2", 1.0), "m/s²": ("m/s2", 1.0),
+    "م/ث2": ("m/s2", 1.0), "م/ث^2": ("m/s2", 1.0), "م/ث²": ("m/s2", 1.0),
+    "j": ("J", 1.0), "جول": ("J", 1.0),
+    "w": ("W", 1.0), "واط": ("W", 1.0),
+    "%": ("%", 1.0),
+}
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    تطبيع للمقارنة: إزالة التشكيل والتطويل، توحيد الألف/الياء/التاء المربوطة،
+    تحويل الأرقام العربية، إزالة علامات الترقيم (مع إبقاء الإشارات + -) وتوحيد المسافات.
+    """
+    if not text:
+        return ""
+    text = _DIACRITICS_RE.sub("", text)
+    text = text.translate(_ARABIC_LETTERS)
+    text = _PUNCT_RE.sub(" ", text)
+    text = _SPACES_RE.sub(" ", text)
+    return text.strip().lower().rstrip(".")
+
+
+def parse_quantity(text: str) -> Optional[Tuple[float, str, float]]:
+    """
+    '6 نيوتن' → (6.0, 'N', 6.0)، '250 g' → (0.25, 'kg', 250.0):
+    (القيمة بالوحدة الأساسية، الوحدة الأساسية، الرقم كما كُتب).
+    يرجع None إن لم تكن الإجابة كمية واحدة.
+    """
+    match = _QUANTITY_RE.match(normalize_arabic(text))
+    if not match:
+        return None
+    unit = UNITS.get(match.group(2).replace(" ", ""))
+    if unit is None:
+        return None
+    base, factor = unit
+    value = float(match.group(1).replace(",", "."))
+    return value * factor, base, value
+
+
+class AnswerFastPath:
+    """
+    مرحلة تصحيح محلية قبل الـ LLM:
+    1) تطابق نصي بعد التطبيع العربي
+    2) تكافؤ رقمي مع الوحدات (6 نيوتن = 6N، 250 غم = 0.25 كغم)
+    3) تشابه embeddings مع الإجابة النموذجية (EmbeddingModel الموجود)
+
+    عند ثقة عالية (أو منخفضة جدًا) تُعاد الدرجة مباشرة،
+    والحالات الوسطى فقط تذهب إلى الـ LLM.
+    """
+
+    def __init__(
+        self,
+        embedding_model=None,
+        sim_high: float = FASTPATH_SIM_HIGH,
+        sim_low: float = FASTPATH_SIM_LOW,
+        rel_tol: float = FASTPATH_NUMERIC_REL_TOL,
+    ):
+        self.embedding_model = embedding_model
+        self.sim_high = sim_high
+        self.sim_low = sim_low
+        self.rel_tol = rel_tol
+
+        self.stats = {"checked": 0, "empty": 0, "exact": 0, "numeric": 0, "embedding": 0, "to_llm": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def skip_rate(self) -> float:
+        with self._lock:
+            checked = self.stats["checked"]
+            return 0.0 if checked == 0 else round(1 - self.stats["to_llm"] / checked, 4)
+
+    @staticmethod
+    def _result(score: float, feedback: str, model_answer: str, check: str) -> Dict[str, Any]:
+        return {
+            "score": score,
+            "is_correct": score >= 50,
+            "feedback": feedback,
+            "correct_answer": model_answer,
+            "graded_by": f"fast_path:{check}",
+        }
+
+    def _check_local(self, student_answer: str, model_answer: str) -> Optional[Dict[str, Any]]:
+        student_norm = normalize_arabic(student_answer)
+        model_norm = normalize_arabic(model_answer)
+
+        if not student_norm:
+            self._count("empty")
+            return self._result(0, "لا توجد إجابة من الطالب.", model_answer, "empty")
+
+        if student_norm == model_norm:
+            self._count("exact")
+            return self._result(100, "إجابة صحيحة ومطابقة للإجابة النموذجية.", model_answer, "exact")
+
+        student_q = parse_quantity(student_answer)
+        model_q = parse_quantity(model_answer)
+        if not student_q or not model_q:
+            return None
+
+        if student_q[1] == model_q[1]:
+            self._count("numeric")
+            if math.isclose(student_q[0], model_q[0], rel_tol=self.rel_tol, abs_tol=1e-12):
+                return self._result(100, "إجابة صحيحة (القيمة العددية مطابقة).", model_answer, "numeric")
+            return self._result(0, "القيمة العددية غير صحيحة.", model_answer, "numeric")
+
+        # ✅ وحدة في طرف واحد فقط: نقارن الرقمين كما كُتبا (بدون تحويل)،
+        # وعند الاختلاف لا نحكم محليًا (قد يقصد الطالب وحدة أخرى) → LLM
+        if "" in (student_q[1], model_q[1]) and math.isclose(
+            student_q[2], model_q[2], rel_tol=self.rel_tol, abs_tol=1e-12
+        ):
+            self._count("numeric")
+            return self._result(100, "إجابة صحيحة (القيمة العددية مطابقة).", model_answer, "numeric")
+
+        return None
+
+    def pregrade_many(
+        self, items: List[Dict[str, Any]]
+    ) -> Tuple[Dict[Any, Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        :param items: [{"id", "question", "student_answer", "model_answer"}, ...]
+        :return: (النتائج المحسومة محليًا حسب id، العناصر التي تحتاج LLM)
+        """
+        self._count("checked", len(items))
+        decided: Dict[Any, Dict[str, Any]] = {}
+        remaining = []
+
+        for item in items:
+            result = self._check_local(item.get("student_answer") or "", item["model_answer"])
+            if result is not None:
+                decided[item["id"]] = result
+            else:
+                remaining.append(item)
+
+        # ✅ embeddings لكل الإجابات المتبقية في استدعاء واحد
+        if remaining and self.embedding_model is not None:
+            texts = [item["student_answer"] for item in remaining] + [item["model_answer"] for item in remaining]
+            vectors = np.asarray(self.embedding_model.embed_texts(texts), dtype=float)
+            students, models = vectors[: len(remaining)], vectors[len(remaining):]
+            norms = np.linalg.norm(students, axis=1) * np.linalg.norm(models, axis=1)
+            sims = np.sum(students * models, axis=1) / np.where(norms == 0, 1, norms)
+
+            undecided = []
+            for item, sim in zip(remaining, sims):
+                if sim >= self.sim_high:
+                    self._count("embedding")
+                    decided[item["id"]] = self._result(
+                        100, "إجابة صحيحة (مطابقة في المعنى للإجابة النموذجية).", item["model_answer"], "embedding"
+                    )
+                elif sim <= self.sim_low:
+                    self._count("embedding")
+                    decided[item["id"]] = self._result(
+                        0, "الإجابة لا تتعلق بالإجابة النموذجية.", item["model_answer"], "embedding"
+                    )
+                else:
+                    undecided.append(item)
+            remaining = undecided
+
+        self._count("to_llm", len(remaining))
+        return decided, remaining
@@ -4,6 +4,7 @@ from tqdm import tqdm
 
 from .config import DATA_DIR, CHROMA_DIR, SUBJECTS, GRADES
 from .embeddings import EmbeddingModel
+from .topic_clusters import TopicClusterStore, build_topic_clusters
 
 class ChromaKnowledgeBase:
     def __init__(self):
@@ -44,11 +45,28 @@ class ChromaKnowledgeBase:
                     embeddings = self.embedding_model.embed_texts(texts)
                     collection.add(ids=ids, documents=texts, metadatas=metas, embeddings=embeddings)
 
+                self.build_topic_clusters(collection)
+
         print("✅ Index built successfully.")
 
-    def query(self, question, subject, grade, k=4):
+    def build_topic_clusters(self, collection):
+        """
+        عناقيد المواضيع (k-means) لكل المجموعة، تُحسب هنا مرة واحدة
+        حتى لا يحتاج توليد الامتحان لأي استرجاع وقت الطلب.
+        """
+        data = collection.get(include=["documents", "embeddings"])
+        texts = data.get("documents") or []
+        embeddings = data.get("embeddings")
+        if not texts or embeddings is None or len(embeddings) == 0:
+            return
+
+        clusters = build_topic_clusters(texts, embeddings)
+        TopicClusterStore().save_collection(collection.name, clusters)
+        print(f"🧩 Topic clusters: {collection.name} → {len(clusters)}")
+
+    def query(self, question, subject, grade, k=4, embedding=None):
         collection = self._get_collection(subject, grade)
-        emb = self.embedding_model.embed_query(question)
+        emb = embedding if embedding is not None else self.embedding_model.embed_query(question)
         result = collection.query(query_embeddings=[emb], n_results=k)
         docs = result.get("documents", [[]])[0]
         metas = result.get("metadatas", [[]])[0]
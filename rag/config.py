@@ -15,3 +15,150 @@ EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 GROQ_MODEL_NAME = "llama-3.1-8b-instant"
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "60"))
+
+# ✅ قاطع الدائرة لـ Groq: بعد عدد من الأخطاء المتتالية نتوقف مؤقتًا عن الإرسال
+GROQ_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("GROQ_CIRCUIT_FAILURE_THRESHOLD", "5"))
+GROQ_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("GROQ_CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+# ✅ مخزون الامتحانات الجاهزة لـ /generate_exam
+EXAM_POOL_ENABLED = os.getenv("EXAM_POOL_ENABLED", "1") == "1"
+EXAM_POOL_TARGET_SIZE = int(os.getenv("EXAM_POOL_TARGET_SIZE", "3"))
+EXAM_POOL_REFILL_INTERVAL_SECONDS = float(os.getenv("EXAM_POOL_REFILL_INTERVAL_SECONDS", "5"))
+EXAM_POOL_MAX_KEYS = int(os.getenv("EXAM_POOL_MAX_KEYS", "30"))
+EXAM_POOL_MAX_QUESTIONS = int(os.getenv("EXAM_POOL_MAX_QUESTIONS", "20"))
+# مثال: "physics:grade6:5,math:grade5:10"
+EXAM_POOL_PREWARM = os.getenv("EXAM_POOL_PREWARM", "")
+
+# ✅ توليد الامتحان على أجزاء متوازية (shards)
+EXAM_SHARD_SIZE = int(os.getenv("EXAM_SHARD_SIZE", "4"))
+EXAM_SHARD_MAX_WORKERS = int(os.getenv("EXAM_SHARD_MAX_WORKERS", "5"))
+EXAM_SHARD_MAX_RETRIES = int(os.getenv("EXAM_SHARD_MAX_RETRIES", "2"))
+# حد عدد الأسئلة في امتحان واحد (كل EXAM_SHARD_SIZE سؤال = طلب Groq أو أكثر)
+EXAM_MAX_QUESTIONS = int(os.getenv("EXAM_MAX_QUESTIONS", "20"))
+
+# ✅ عناقيد المواضيع (k-means) المحسوبة وقت بناء الفهرس لتأسيس أسئلة الامتحان على المنهج
+TOPIC_CLUSTERS_FILE = os.path.join(CHROMA_DIR, "topic_clusters.json")
+TOPIC_CLUSTER_COUNT = int(os.getenv("TOPIC_CLUSTER_COUNT", "8"))
+TOPIC_CLUSTER_REPRESENTATIVES = int(os.getenv("TOPIC_CLUSTER_REPRESENTATIVES", "2"))
+
+# ✅ تصحيح الأسئلة المفتوحة بالتوازي في /submit_exam
+SUBMIT_GRADING_CONCURRENCY = int(os.getenv("SUBMIT_GRADING_CONCURRENCY", "8"))
+SUBMIT_GRADING_DEADLINE_SECONDS = float(os.getenv("SUBMIT_GRADING_DEADLINE_SECONDS", "20"))
+
+# ✅ تصحيح عدة إجابات في طلب واحد (برومبت نظام مشترك)
+GRADING_BATCH_MAX_ITEMS = int(os.getenv("GRADING_BATCH_MAX_ITEMS", "8"))
+GRADING_BATCH_MAX_TOKENS = int(os.getenv("GRADING_BATCH_MAX_TOKENS", "3000"))
+
+# ✅ حد عدد الإجابات في طلب /grade_answers_bulk واحد
+BULK_GRADE_MAX_ITEMS = int(os.getenv("BULK_GRADE_MAX_ITEMS", "500"))
+
+# ✅ تصحيح محلي سريع قبل الـ LLM (تطابق نصي / رقمي / تشابه embeddings)
+FASTPATH_ENABLED = os.getenv("FASTPATH_ENABLED", "1") == "1"
+FASTPATH_SIM_HIGH = float(os.getenv("FASTPATH_SIM_HIGH", "0.97"))
+FASTPATH_SIM_LOW = float(os.getenv("FASTPATH_SIM_LOW", "0.2"))
+FASTPATH_NUMERIC_REL_TOL = float(os.getenv("FASTPATH_NUMERIC_REL_TOL", "1e-6"))
+
+# ✅ كاش التحليل والحل في MathStepGrader (مشترك بين الطلبات)
+MATH_PARSE_CACHE_SIZE = int(os.getenv("MATH_PARSE_CACHE_SIZE", "4096"))
+MATH_SOLVE_CACHE_SIZE = int(os.getenv("MATH_SOLVE_CACHE_SIZE", "1024"))
+
+# ✅ عمليات منفصلة لـ sympy (مهلة لكل خطوة/طلب، حد ذاكرة، وإعادة تدوير العامل)
+MATH_WORKERS_ENABLED = os.getenv("MATH_WORKERS_ENABLED", "1") == "1"
+MATH_WORKERS = int(os.getenv("MATH_WORKERS", "2"))
+MATH_STEP_TIMEOUT_SECONDS = float(os.getenv("MATH_STEP_TIMEOUT_SECONDS", "3"))
+MATH_REQUEST_TIMEOUT_SECONDS = float(os.getenv("MATH_REQUEST_TIMEOUT_SECONDS", "10"))
+MATH_WORKER_MEMORY_MB = int(os.getenv("MATH_WORKER_MEMORY_MB", "512"))
+MATH_WORKER_MAX_TASKS = int(os.getenv("MATH_WORKER_MAX_TASKS", "200"))
+
+# ✅ تصحيح خطوات صف كامل لنفس المسألة (مدرّس)
+MATH_CLASS_TIMEOUT_SECONDS = float(os.getenv("MATH_CLASS_TIMEOUT_SECONDS", "60"))
+MATH_CLASS_TOP_ERRORS = int(os.getenv("MATH_CLASS_TOP_ERRORS", "5"))
+MATH_CLASS_MAX_SUBMISSIONS = int(os.getenv("MATH_CLASS_MAX_SUBMISSIONS", "100"))
+MATH_CLASS_MAX_STEPS = int(os.getenv("MATH_CLASS_MAX_STEPS", "30"))  # لكل طالب
+
+# ✅ جلسات التحقق الفوري من الخطوات (سطر بسطر أثناء الكتابة)
+MATH_SESSION_IDLE_TTL_SECONDS = float(os.getenv("MATH_SESSION_IDLE_TTL_SECONDS", "900"))
+MATH_SESSION_MAX = int(os.getenv("MATH_SESSION_MAX", "1000"))
+
+# ✅ كاش نتائج OCR (Google Vision / pix2tex) حسب محتوى الصورة: ذاكرة (LRU) + قرص
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(BASE_DIR, "ocr_cache"))
+OCR_CACHE_MEMORY_ITEMS = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256"))
+OCR_CACHE_DISK_ITEMS = int(os.getenv("OCR_CACHE_DISK_ITEMS", "5000"))
+# بصمة إدراكية (dHash) لصور شبه متطابقة: معطلة افتراضيًا لأن إجابات مكتوبة بخط اليد
+# على نفس الورقة المطبوعة قد تتقارب بصماتها
+OCR_CACHE_PHASH_ENABLED = os.getenv("OCR_CACHE_PHASH_ENABLED", "0") == "1"
+OCR_CACHE_PHASH_MAX_DISTANCE = int(os.getenv("OCR_CACHE_PHASH_MAX_DISTANCE", "3"))
+# يدخل في مفتاح الكاش مع اسم محرك OCR وأبعاد pix2tex: غيّره عند تغيير الموديل أو تصحيحاته
+OCR_CACHE_VERSION = os.getenv("OCR_CACHE_VERSION", "1")
+
+# ✅ منفذات مخصصة للعمل الحاجب داخل الـ endpoints غير المتزامنة (async)
+# io: Google Vision / Groq / HTTP — cpu: pdfplumber / sympy (عمليات منفصلة)؛ pix2tex له خدمته الخاصة
+IO_EXECUTOR_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "16"))
+IO_EXECUTOR_MAX_QUEUE = int(os.getenv("IO_EXECUTOR_MAX_QUEUE", "64"))
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+CPU_EXECUTOR_MAX_QUEUE = int(os.getenv("CPU_EXECUTOR_MAX_QUEUE", "16"))
+
+# ✅ خدمة pix2tex: نسخ مُحمّلة مسبقًا من الموديل + تجميع الطلبات المتزامنة في دفعات
+LATEX_REPLICAS = int(os.getenv("LATEX_REPLICAS", "1"))
+LATEX_MAX_BATCH = int(os.getenv("LATEX_MAX_BATCH", "8"))
+LATEX_MAX_WAIT_MS = float(os.getenv("LATEX_MAX_WAIT_MS", "10"))
+LATEX_MAX_QUEUE = int(os.getenv("LATEX_MAX_QUEUE", "64"))
+LATEX_WARMUP = os.getenv("LATEX_WARMUP", "1") == "1"
+
+# ✅ تشغيل pix2tex بالتوازي مع Google Vision قبل معرفة هل توجد معادلة
+# "auto" = حسب المسار (math_hint)، "always" / "never"
+OCR_SPECULATIVE_PIX2TEX = os.getenv("OCR_SPECULATIVE_PIX2TEX", "auto")
+
+# ✅ قص مناطق المعادلات قبل pix2tex (سطر لكل معادلة) وتصغيرها لأبعاد pix2tex
+PIX2TEX_MAX_WIDTH = int(os.getenv("PIX2TEX_MAX_WIDTH", "672"))
+PIX2TEX_MAX_HEIGHT = int(os.getenv("PIX2TEX_MAX_HEIGHT", "192"))
+EQUATION_MAX_REGIONS = int(os.getenv("EQUATION_MAX_REGIONS", "12"))
+
+# ✅ استخراج نص PDF صفحةً صفحة بالتوازي (مع حدود للصفحات والحجم)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+PDF_MAX_INFLIGHT_TASKS = int(os.getenv("PDF_MAX_INFLIGHT_TASKS", "4"))
+# /ask_file: نتوقف عن قراءة الصفحات بعد هذا العدد من الأحرف (السؤال عادة في أول الملف)
+ASK_FILE_MAX_CHARS = int(os.getenv("ASK_FILE_MAX_CHARS", "6000"))
+
+# ✅ فهرس مؤقت في الذاكرة لكل ملف مرفوع (حسب محتواه) في /ask_file:
+# نرسل للنموذج المقاطع الأقرب فقط بدل نص الملف كاملاً
+UPLOAD_INDEX_TTL_SECONDS = int(os.getenv("UPLOAD_INDEX_TTL_SECONDS", "1800"))
+UPLOAD_INDEX_MAX_DOCS = int(os.getenv("UPLOAD_INDEX_MAX_DOCS", "32"))
+UPLOAD_CHUNK_CHARS = int(os.getenv("UPLOAD_CHUNK_CHARS", "800"))
+UPLOAD_CHUNK_OVERLAP = int(os.getenv("UPLOAD_CHUNK_OVERLAP", "100"))
+UPLOAD_INDEX_TOP_K = int(os.getenv("UPLOAD_INDEX_TOP_K", "4"))
+# نص أقصر من هذا يُرسل كما هو (لا حاجة للفهرسة)
+UPLOAD_INDEX_MIN_CHARS = int(os.getenv("UPLOAD_INDEX_MIN_CHARS", "1500"))
+# بدون سؤال صريح: بداية الملف هي الاستعلام
+UPLOAD_QUERY_CHARS = int(os.getenv("UPLOAD_QUERY_CHARS", "500"))
+
+# ✅ استقبال الملفات المرفوعة: حد لحجم جسم الطلب قبل قراءة النموذج، ثم فحص النوع والحجم والأبعاد
+UPLOAD_READ_CHUNK_BYTES = int(os.getenv("UPLOAD_READ_CHUNK_BYTES", str(256 * 1024)))
+# هامش فوق حد الملف لترويسات multipart وباقي حقول النموذج
+UPLOAD_FORM_OVERHEAD_BYTES = int(os.getenv("UPLOAD_FORM_OVERHEAD_BYTES", str(64 * 1024)))
+# مجلد نسخة PDF على القرص (عمليات استخراج الصفحات تحتاج مسارًا)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_MAX_PDF_BYTES = int(os.getenv("UPLOAD_MAX_PDF_BYTES", str(25 * 1024 * 1024)))
+# مسارات صور المعادلات (pix2tex) تحتاج صورًا أصغر بكثير
+UPLOAD_MAX_MATH_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_MATH_IMAGE_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_MAX_IMAGE_PIXELS = int(os.getenv("UPLOAD_MAX_IMAGE_PIXELS", str(40_000_000)))
+
+# ✅ محرك OCR للنص: "google" (Google Vision) أو "fixture" (نتائج محفوظة محليًا، بدون شبكة أو مفاتيح)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "google")
+OCR_FIXTURES_DIR = os.getenv("OCR_FIXTURES_DIR", os.path.join(BASE_DIR, "ocr_fixtures"))
+# تأخير مصطنع لكل طلب OCR (لمحاكاة زمن الشبكة عند القياس محليًا)
+OCR_LATENCY_MS = float(os.getenv("OCR_LATENCY_MS", "0"))
+OCR_LATENCY_JITTER_MS = float(os.getenv("OCR_LATENCY_JITTER_MS", "0"))
+
+# ✅ سجل OCR (جدول ocr_logs): يُكتب في الخلفية على دفعات بدل كتابة لكل طلب
+OCR_LOG_ENABLED = os.getenv("OCR_LOG_ENABLED", "1") == "1"
+OCR_LOG_BATCH_SIZE = int(os.getenv("OCR_LOG_BATCH_SIZE", "100"))
+OCR_LOG_FLUSH_SECONDS = float(os.getenv("OCR_LOG_FLUSH_SECONDS", "2"))
+# حد أقصى للسجلات المنتظرة في الذاكرة؛ ما زاد عنه يُهمل (ويُعد)
+OCR_LOG_MAX_PENDING = int(os.getenv("OCR_LOG_MAX_PENDING", "5000"))
+# نص PDF قد يكون طويلاً جدًا: نحفظ أوله فقط
+OCR_LOG_MAX_TEXT_CHARS = int(os.getenv("OCR_LOG_MAX_TEXT_CHARS", "10000"))
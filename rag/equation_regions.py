@@ -0,0 +1,135 @@
+import io
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .config import PIX2TEX_MAX_WIDTH, PIX2TEX_MAX_HEIGHT, EQUATION_MAX_REGIONS
+
+Box = List[int]  # [x0, y0, x1, y1]
+
+REGION_MARGIN = 8
+MIN_REGION_HEIGHT = 8
+INK_THRESHOLD = 0.6  # نسبة من متوسط السطوع: ما هو أغمق يُعتبر حبرًا
+
+
+def load_gray(file_bytes: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(file_bytes)).convert("L")
+
+
+def to_png(img: Image.Image) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _ink_mask(img: Image.Image) -> np.ndarray:
+    pixels = np.asarray(img, dtype=np.float32)
+    return pixels < pixels.mean() * INK_THRESHOLD
+
+
+def prepare_for_pix2tex(img: Image.Image) -> Image.Image:
+    """
+    قص الهوامش الفارغة ثم التصغير إلى أبعاد pix2tex القصوى (نفس ما يفعله pix2tex داخليًا،
+    لكن قبل أن يمر عليه الحجم الكامل لصورة الهاتف).
+    """
+    img = img.convert("L")
+    mask = _ink_mask(img)
+    if mask.any():
+        rows = np.where(mask.any(axis=1))[0]
+        cols = np.where(mask.any(axis=0))[0]
+        img = img.crop((
+            max(0, int(cols[0]) - REGION_MARGIN),
+            max(0, int(rows[0]) - REGION_MARGIN),
+            min(img.width, int(cols[-1]) + REGION_MARGIN + 1),
+            min(img.height, int(rows[-1]) + REGION_MARGIN + 1),
+        ))
+    img.thumbnail((PIX2TEX_MAX_WIDTH, PIX2TEX_MAX_HEIGHT), Image.BILINEAR)
+    return img
+
+
+def group_words_into_lines(words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    كلمات Google Vision ({"text", "box"}) → أسطر: كلمتان في نفس السطر
+    إذا كان المركز العمودي لإحداهما داخل ارتفاع الأخرى.
+    """
+    lines: List[Dict[str, Any]] = []
+    for word in sorted(words, key=lambda w: (w["box"][1] + w["box"][3]) / 2):
+        x0, y0, x1, y1 = word["box"]
+        center = (y0 + y1) / 2
+        for line in lines:
+            lx0, ly0, lx1, ly1 = line["box"]
+            if ly0 <= center <= ly1:
+                line["words"].append(word)
+                line["box"] = [min(lx0, x0), min(ly0, y0), max(lx1, x1), max(ly1, y1)]
+                break
+        else:
+            lines.append({"words": [word], "box": [x0, y0, x1, y1]})
+
+    result = []
+    for line in sorted(lines, key=lambda l: l["box"][1]):
+        ordered = sorted(line["words"], key=lambda w: w["box"][0])
+        result.append({"text": " ".join(w["text"] for w in ordered), "box": line["box"]})
+    return result
+
+
+def projection_regions(img: Image.Image) -> List[Box]:
+    """
+    بديل محلي بدون Vision: أشرطة أفقية من الحبر تفصلها صفوف فارغة (إسقاط الصفوف).
+    """
+    mask = _ink_mask(img)
+    ink_rows = mask.any(axis=1)
+
+    regions = []
+    start = None
+    for y, has_ink in enumerate(list(ink_rows) + [False]):
+        if has_ink and start is None:
+            start = y
+        elif not has_ink and start is not None:
+            if y - start >= MIN_REGION_HEIGHT:
+                cols = np.where(mask[start:y].any(axis=0))[0]
+                regions.append([int(cols[0]), start, int(cols[-1]) + 1, y])
+            start = None
+    return regions
+
+
+def _crop(img: Image.Image, box: Box) -> Image.Image:
+    x0, y0, x1, y1 = box
+    return img.crop((
+        max(0, x0 - REGION_MARGIN),
+        max(0, y0 - REGION_MARGIN),
+        min(img.width, x1 + REGION_MARGIN),
+        min(img.height, y1 + REGION_MARGIN),
+    ))
+
+
+def crop_equation_regions(
+    file_bytes: bytes,
+    lines: Optional[List[Dict[str, Any]]] = None,
+    max_regions: int = EQUATION_MAX_REGIONS,
+) -> List[Dict[str, Any]]:
+    """
+    مناطق المعادلات جاهزة لـ pix2tex:
+    - lines: أسطر Vision الرياضية ({"text", "box"}) إن توفرت
+    - وإلا أشرطة إسقاط الصفوف
+    يرجع [{"box", "text", "image": PNG bytes مقصوص ومصغّر}, ...]؛ قائمة فارغة إن لم توجد مناطق.
+    """
+    try:
+        img = load_gray(file_bytes)
+    except Exception:
+        return []
+
+    if lines:
+        candidates = [{"box": line["box"], "text": line.get("text")} for line in lines]
+    else:
+        candidates = [{"box": box, "text": None} for box in projection_regions(img)]
+
+    regions = []
+    for candidate in candidates[:max_regions]:
+        crop = prepare_for_pix2tex(_crop(img, candidate["box"]))
+        regions.append({**candidate, "image": to_png(crop)})
+    return regions
+
+
+def overlaps_vertically(box: Box, other: Box) -> bool:
+    return box[1] < other[3] and other[1] < box[3]
@@ -1,7 +1,12 @@
 import json
-from typing import Any, Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
+from .config import EXAM_SHARD_SIZE, EXAM_SHARD_MAX_WORKERS, EXAM_SHARD_MAX_RETRIES, EXAM_MAX_QUESTIONS
 from .groq_client import GroqClient
+from .json_salvage import extract_json, extract_objects
+from .topic_clusters import TopicClusterStore
 
 EXAM_SYSTEM_PROMPT = """
 أنت منشئ امتحانات ذكي لمادة دراسية لطلاب المدارس.
@@ -39,35 +44,254 @@ EXAM_SYSTEM_PROMPT = """
 - الأسئلة يجب أن تكون مناسبة للمستوى الدراسي المعطى.
 """
 
+# ✅ محاور مختلفة لكل جزء (shard) حتى لا تتكرر الأسئلة بين الأجزاء المتوازية
+SHARD_FOCUSES = [
+    "المفاهيم الأساسية والتعاريف",
+    "القوانين والعلاقات بين الكميات",
+    "المسائل الحسابية والتطبيق العددي",
+    "الظواهر والتطبيقات من الحياة اليومية",
+    "التجارب العملية والملاحظة والاستنتاج",
+    "المقارنة والتمييز بين المفاهيم المتشابهة",
+]
+
+# ✅ إحصائيات كل امتحان: كم مرة احتجنا إصلاح/إنقاذ/إعادة طلب
+GENERATION_STATS_KEYS = (
+    "llm_calls",
+    "repaired_responses",
+    "partial_salvages",
+    "invalid_items",
+    "reasked_items",
+    "failed_shards",
+)
+
+
+def is_valid_question(q: Any) -> bool:
+    """
+    نفس الشروط التي يتطلبها GeneratedQuestion في main.py
+    """
+    if not isinstance(q, dict):
+        return False
+    if q.get("type") not in ("mcq", "open"):
+        return False
+    if not isinstance(q.get("question"), str) or not q["question"].strip():
+        return False
+    if not isinstance(q.get("model_answer"), str):
+        return False
+    if q["type"] == "mcq":
+        options = q.get("options")
+        idx = q.get("correct_option_index")
+        if not isinstance(options, list) or not isinstance(idx, int):
+            return False
+        if not 0 <= idx < len(options):
+            return False
+    return True
+
+
+def _question_key(q: Dict[str, Any]) -> str:
+    """
+    مفتاح لإزالة التكرار: نص السؤال بدون مسافات زائدة أو علامات ترقيم
+    """
+    text = re.sub(r"[^\w]+", " ", q.get("question", "")).strip().lower()
+    return text
+
 
 class ExamEngine:
-    def __init__(self):
+    def __init__(
+        self,
+        shard_size: int = EXAM_SHARD_SIZE,
+        max_workers: int = EXAM_SHARD_MAX_WORKERS,
+        max_retries: int = EXAM_SHARD_MAX_RETRIES,
+    ):
         self.llm = GroqClient()
+        self.topics = TopicClusterStore()
+        self.shard_size = max(1, shard_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(0, max_retries)
 
-    def generate_exam(self, subject: str, grade: str, num_questions: int = 5) -> Dict[str, Any]:
+    def _plan_shards(
+        self, subject: str, grade: str, num_questions: int, offset: int = 0
+    ) -> List[Tuple[int, str, List[str]]]:
         """
-        توليد امتحان مكوّن من num_questions سؤال (مزيج بين mcq و open)
+        تقسيم num_questions إلى أجزاء صغيرة، لكل جزء محور مختلف.
+        إن وُجدت عناقيد مواضيع محسوبة مسبقًا لهذه المادة/الصف، يأخذ كل جزء
+        عنقودًا مختلفًا ومقاطعه الممثِّلة كسياق من الكتاب.
         """
+        counts = []
+        remaining = max(1, num_questions)
+        while remaining > 0:
+            counts.append(min(self.shard_size, remaining))
+            remaining -= counts[-1]
+
+        clusters = self.topics.sample(subject, grade, len(counts))
+
+        shards = []
+        for i, count in enumerate(counts):
+            focus = SHARD_FOCUSES[(offset + i) % len(SHARD_FOCUSES)]
+            context = clusters[i]["representatives"] if clusters else []
+            shards.append((count, focus, context))
+        return shards
+
+    def _ask_shard(
+        self,
+        subject: str,
+        grade: str,
+        count: int,
+        focus: str,
+        context: Optional[List[str]] = None,
+        avoid: Optional[List[str]] = None,
+        broken: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
         user_prompt = f"""
 المادة: {subject}
 الصف: {grade}
-عدد الأسئلة المطلوب تقريباً: {num_questions}
+عدد الأسئلة المطلوب: {count}
+محور الأسئلة: {focus}
 
-أنشئ أسئلة امتحان مناسبة للمستوى، تتناول أهم المفاهيم في هذه المادة وهذا الصف.
+أنشئ أسئلة امتحان مناسبة للمستوى، تركّز على هذا المحور فقط.
 """
+        if context:
+            user_prompt += "\nاعتمد في الأسئلة على المقاطع التالية من الكتاب المدرسي:\n" + "\n---\n".join(context) + "\n"
+        if broken:
+            user_prompt += (
+                "\nالأسئلة التالية وصلت ناقصة أو غير صالحة، أصلحها وأعدها ضمن الأسئلة المطلوبة:\n"
+                + "\n".join(json.dumps(q, ensure_ascii=False) for q in broken)
+                + "\n"
+            )
+        if avoid:
+            user_prompt += "\nلا تكرر أيًا من الأسئلة التالية:\n" + "\n".join(f"- {q}" for q in avoid)
+
+        return self.llm.generate(EXAM_SYSTEM_PROMPT, user_prompt)
+
+    def _parse_questions(self, raw: str, stats: Dict[str, int]):
+        """
+        تحليل متسامح: يُصلح الـ JSON إن أمكن، وإلا يُنقذ الأسئلة السليمة واحدًا واحدًا.
+        يرجع (الأسئلة الصالحة، الأسئلة غير الصالحة).
+        """
+        data, info = extract_json(raw)
+        if info["repaired"]:
+            stats["repaired_responses"] += 1
+
+        items = None
+        if isinstance(data, dict) and isinstance(data.get("questions"), list):
+            items = data["questions"]
+        elif isinstance(data, list):
+            items = data
+
+        if items is None:
+            items = extract_objects(raw)
+            if items:
+                stats["partial_salvages"] += 1
+
+        valid = [q for q in items if is_valid_question(q)]
+        invalid = [q for q in items if not is_valid_question(q)]
+        stats["invalid_items"] += len(invalid)
+        return valid, invalid
+
+    def _generate_shard(
+        self,
+        subject: str,
+        grade: str,
+        count: int,
+        focus: str,
+        context: Optional[List[str]] = None,
+        avoid: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        توليد جزء واحد. عند النقص أو وجود أسئلة معطوبة لا نعيد الجزء كاملاً،
+        بل نطلب من النموذج الأسئلة الناقصة فقط (مع الأسئلة المعطوبة لإصلاحها).
+        """
+        stats = {key: 0 for key in GENERATION_STATS_KEYS}
+        questions: List[Dict[str, Any]] = []
+        broken: List[Dict[str, Any]] = []
+        raw = None
 
-        raw = self.llm.generate(EXAM_SYSTEM_PROMPT, user_prompt)
+        for attempt in range(self.max_retries + 1):
+            need = count - len(questions)
+            if need <= 0:
+                break
 
-        try:
-            data = json.loads(raw)
-            # ضمان وجود questions
-            if "questions" not in data or not isinstance(data["questions"], list):
-                raise ValueError("Invalid exam JSON: 'questions' missing or not a list")
-            return data
-        except Exception as e:
-            # في حال فشل التحليل، نرجع شكل بسيط مع الخطأ للمساعدة في التصحيح
+            if attempt > 0:
+                stats["reasked_items"] += need
+
+            raw = self._ask_shard(
+                subject,
+                grade,
+                need,
+                focus,
+                context,
+                (avoid or []) + [q["question"] for q in questions],
+                broken[:need],
+            )
+            stats["llm_calls"] += 1
+
+            valid, broken = self._parse_questions(raw, stats)
+            questions.extend(valid[:need])
+
+        if not questions:
+            stats["failed_shards"] += 1
+            return {
+                "questions": [],
+                "error": "No valid questions in shard",
+                "raw_output": raw,
+                "stats": stats,
+            }
+
+        return {"questions": questions, "stats": stats}
+
+    def _run_shards(self, subject: str, grade: str, shards: List[Tuple[int, str, List[str]]], avoid=None):
+        workers = min(len(shards), self.max_workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._generate_shard, subject, grade, count, focus, context, avoid)
+                for count, focus, context in shards
+            ]
+            return [f.result() for f in futures]
+
+    def generate_exam(self, subject: str, grade: str, num_questions: int = 5) -> Dict[str, Any]:
+        """
+        توليد امتحان مكوّن من num_questions سؤال (مزيج بين mcq و open)
+        عبر عدة طلبات صغيرة متوازية، ثم دمجها وإعادة ترقيمها وإزالة المكرر.
+        """
+        num_questions = min(max(1, num_questions), EXAM_MAX_QUESTIONS)
+        shard_results = self._run_shards(subject, grade, self._plan_shards(subject, grade, num_questions))
+
+        merged: List[Dict[str, Any]] = []
+        seen = set()
+        stats = {key: 0 for key in GENERATION_STATS_KEYS}
+
+        def _merge(results):
+            for res in results:
+                for key, value in res.get("stats", {}).items():
+                    stats[key] += value
+                for q in res.get("questions", []):
+                    key = _question_key(q)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    merged.append(q)
+
+        _merge(shard_results)
+
+        # ✅ إن نقص العدد (أجزاء فاشلة أو أسئلة مكررة) نطلب الباقي فقط
+        missing = num_questions - len(merged)
+        if merged and missing > 0:
+            avoid = [q["question"] for q in merged]
+            extra = self._plan_shards(subject, grade, missing, offset=len(shard_results))
+            _merge(self._run_shards(subject, grade, extra, avoid))
+
+        if not merged:
+            failed = next((r for r in shard_results if "error" in r), {})
             return {
                 "questions": [],
-                "error": str(e),
-                "raw_output": raw
+                "error": failed.get("error", "No questions generated"),
+                "raw_output": failed.get("raw_output"),
+                "generation_stats": stats,
             }
+
+        questions = []
+        for i, q in enumerate(merged[:num_questions], start=1):
+            q = dict(q)
+            q["id"] = i
+            questions.append(q)
+
+        return {"questions": questions, "generation_stats": stats}
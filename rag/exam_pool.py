@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .config import (
+    EXAM_POOL_TARGET_SIZE,
+    EXAM_POOL_REFILL_INTERVAL_SECONDS,
+    EXAM_POOL_MAX_KEYS,
+    EXAM_POOL_MAX_QUESTIONS,
+    SUBJECTS,
+    GRADES,
+)
+from .exam_engine import is_valid_question
+from .groq_client import groq_circuit
+
+PoolKey = Tuple[str, str, int]
+
+
+def _valid_questions(raw_exam: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    نُبقي فقط الأسئلة السليمة (نفس الشروط التي يتطلبها GeneratedQuestion في main.py)
+    """
+    valid = []
+    for q in raw_exam.get("questions") or []:
+        if not is_valid_question(q):
+            continue
+        try:
+            int(q.get("id"))
+        except (TypeError, ValueError):
+            continue
+        valid.append(q)
+    return valid
+
+
+class ExamPool:
+    """
+    مخزون امتحانات مولّدة مسبقًا لكل (subject, grade, num_questions):
+    - منتج في الخلفية يملأ كل مخزون حتى target_size
+    - /generate_exam يسحب امتحانًا جاهزًا فورًا، أو يولّد مباشرة إن كان المخزون فارغًا
+    - التعبئة محدودة المعدل (طلب واحد كل refill_interval ثانية)
+      وتتوقف مؤقتًا عندما تكون دائرة Groq مفتوحة
+    """
+
+    def __init__(
+        self,
+        exam_engine,
+        target_size: int = EXAM_POOL_TARGET_SIZE,
+        refill_interval: float = EXAM_POOL_REFILL_INTERVAL_SECONDS,
+        max_keys: int = EXAM_POOL_MAX_KEYS,
+        max_questions: int = EXAM_POOL_MAX_QUESTIONS,
+    ):
+        self.exam_engine = exam_engine
+        self.target_size = target_size
+        self.refill_interval = refill_interval
+        self.max_keys = max_keys
+        self.max_questions = max_questions
+
+        self._pools: Dict[PoolKey, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"hits": 0, "misses": 0, "generated": 0, "rejected": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    # ---------- واجهة الاستخدام ----------
+
+    def register(self, subject: str, grade: str, num_questions: int) -> bool:
+        """
+        يضيف مفتاحًا لقائمة المخزونات التي يملؤها المنتج.
+        """
+        if subject not in SUBJECTS or grade not in GRADES:
+            return False
+        if not 1 <= num_questions <= self.max_questions:
+            return False
+
+        key = (subject, grade, num_questions)
+        with self._lock:
+            if key in self._pools:
+                return True
+            if len(self._pools) >= self.max_keys:
+                return False
+            self._pools[key] = deque()
+
+        self._wakeup.set()
+        return True
+
+    def register_from_spec(self, spec: str):
+        """
+        spec بالشكل: "physics:grade6:5,math:grade5:10"
+        """
+        for item in spec.split(","):
+            parts = item.strip().split(":")
+            if len(parts) != 3:
+                continue
+            try:
+                self.register(parts[0], parts[1], int(parts[2]))
+            except ValueError:
+                continue
+
+    def pop(self, subject: str, grade: str, num_questions: int) -> Optional[Dict[str, Any]]:
+        """
+        يرجع امتحانًا جاهزًا أو None. في كل الحالات يُسجَّل المفتاح لتتم تعبئته لاحقًا.
+        """
+        key = (subject, grade, num_questions)
+        exam = None
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool:
+                exam = pool.popleft()
+            self.stats["misses" if exam is None else "hits"] += 1
+
+        if exam is not None:
+            # ✅ نقص المخزون → نوقظ المنتج
+            self._wakeup.set()
+
+        self.register(subject, grade, num_questions)
+        return exam
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            return {f"{s}:{g}:{n}": len(pool) for (s, g, n), pool in self._pools.items()}
+
+    # ---------- المنتج في الخلفية ----------
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="exam-pool-refill", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _next_key(self) -> Optional[PoolKey]:
+        """
+        المفتاح الأكثر نقصًا (الأقل امتلاءً) أولاً.
+        """
+        with self._lock:
+            missing = [
+                (len(pool), key)
+                for key, pool in self._pools.items()
+                if len(pool) < self.target_size
+            ]
+        if not missing:
+            return None
+        missing.sort(key=lambda item: item[0])
+        return missing[0][1]
+
+    def _fill_one(self, key: PoolKey):
+        subject, grade, num_questions = key
+        raw_exam = self.exam_engine.generate_exam(subject, grade, num_questions)
+
+        if "error" in raw_exam:
+            self._count("rejected")
+            return
+
+        # ✅ امتحان بعدد أسئلة أقل من المفتاح لا يُخزن (يُسحب لاحقًا على أنه num_questions سؤالاً)
+        questions = _valid_questions(raw_exam)
+        if len(questions) < num_questions:
+            self._count("rejected")
+            return
+
+        exam = dict(raw_exam)
+        exam["questions"] = questions[:num_questions]
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is not None and len(pool) < self.target_size:
+                pool.append(exam)
+                self.stats["generated"] += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            # ✅ لا نستهلك حصة Groq أثناء فتح الدائرة
+            if groq_circuit.is_open():
+                self._stop.wait(self.refill_interval)
+                continue
+
+            key = self._next_key()
+            if key is None:
+                # لا يوجد ما يُملأ → ننتظر حتى يُسحب امتحان أو يُسجَّل مفتاح جديد
+                self._wakeup.wait(timeout=60)
+                self._wakeup.clear()
+                continue
+
+            started = time.monotonic()
+            try:
+                self._fill_one(key)
+            except Exception as e:
+                print("Exam pool refill error:", key, e)
+                self._count("rejected")
+
+            # ✅ تحديد المعدل: طلب واحد على الأكثر كل refill_interval
+            elapsed = time.monotonic() - started
+            self._stop.wait(max(0.0, self.refill_interval - elapsed))
@@ -0,0 +1,114 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .config import (
+    IO_EXECUTOR_WORKERS,
+    IO_EXECUTOR_MAX_QUEUE,
+    CPU_EXECUTOR_WORKERS,
+    CPU_EXECUTOR_MAX_QUEUE,
+)
+
+
+class ExecutorOverloaded(Exception):
+    """
+    الطابور ممتلئ → main.py يحولها إلى 503 مع Retry-After
+    """
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} executor is overloaded")
+        self.name = name
+
+
+class BoundedExecutor:
+    """
+    منفذ بطابور محدود ومقاييس:
+    - kind="thread" للعمل المقيد بالشبكة، kind="process" للعمل المقيد بالمعالج
+    - يرفض المهام الجديدة (ExecutorOverloaded) إذا تجاوز عدد المهام الجارية + المنتظرة
+      max_workers + max_queue بدل أن يتراكم الطابور بلا حد
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+
+        if kind == "process":
+            # spawn: torch / عملاء gRPC لا يتحملون fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+        }
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.stats["rejected"] += 1
+                raise ExecutorOverloaded(self.name)
+            self._in_flight += 1
+            self.stats["submitted"] += 1
+
+        started_at = time.monotonic()
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            # ✅ المنفذ أُغلق أو انكسر (BrokenProcessPool) → نعيد الحجز حتى لا يُحسب ممتلئًا للأبد
+            with self._lock:
+                self._in_flight -= 1
+                self.stats["failed"] += 1
+            raise
+
+        def _done(fut: Future):
+            elapsed = time.monotonic() - started_at
+            with self._lock:
+                self._in_flight -= 1
+                self.stats["failed" if fut.cancelled() or fut.exception() else "completed"] += 1
+                self.stats["total_seconds"] += elapsed
+                self.stats["max_seconds"] = max(self.stats["max_seconds"], elapsed)
+
+        future.add_done_callback(_done)
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        للاستخدام داخل async def: لا يحجز حلقة الأحداث أثناء التنفيذ
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.stats["completed"] + self.stats["failed"]
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                **{k: v for k, v in self.stats.items() if k != "total_seconds"},
+                "max_seconds": round(self.stats["max_seconds"], 4),
+                "avg_seconds": round(self.stats["total_seconds"] / finished, 4) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+io_executor = BoundedExecutor("io", "thread", IO_EXECUTOR_WORKERS, IO_EXECUTOR_MAX_QUEUE)
+cpu_executor = BoundedExecutor("cpu", "process", CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_MAX_QUEUE)
@@ -1,16 +1,15 @@
-import io
-import os
-import pdfplumber
-from google.cloud import vision
+import json
+import time
+from typing import Any, Dict, List, Optional, Union
 import re
 
-from .math_ocr import image_to_latex  # ✅ من ملف math_ocr.py
-from .math_normalizer import normalize_math_expression
-from .semantic_corrector import semantic_correct
-from .symbol_corrector import correct_latex_with_vision
-
-# ✅ تهيئة عميل Google Vision مرة واحدة
-vision_client = vision.ImageAnnotatorClient()
+from .config import OCR_SPECULATIVE_PIX2TEX
+from .math_ocr import image_to_latex_future  # ✅ من ملف math_ocr.py
+from .latex_rules import correct_latex
+from .ocr_cache import ocr_cache
+from .pdf_extractor import extract_text_from_pdf
+from .equation_regions import crop_equation_regions, group_words_into_lines, overlaps_vertically
+from .ocr_backends import get_ocr_backend
 
 
 MATH_PATTERNS = [
@@ -33,71 +32,172 @@ def has_math_expression(text: str) -> bool:
     return False
 
 
+def extract_vision_google(file_bytes: bytes) -> Dict[str, Any]:
+    """
+    {"text", "words"} من كاش OCR إن سبقت معالجة نفس الصورة،
+    وإلا من محرك OCR المختار (Google Vision افتراضيًا، انظر ocr_backends)
+    """
+    if ocr_cache is not None:
+        text = ocr_cache.get(file_bytes, "vision")
+        words = ocr_cache.get(file_bytes, "vision_words")
+        if text is not None and words is not None:
+            return {"text": text, "words": json.loads(words)}
+
+    result = get_ocr_backend().annotate(file_bytes)
+    if ocr_cache is not None:
+        ocr_cache.put_fields(file_bytes, {
+            "vision": result["text"],
+            "vision_words": json.dumps(result["words"], ensure_ascii=False),
+        })
+    return result
+
+
 def extract_text_from_image_google(file_bytes: bytes) -> str:
-    image = vision.Image(content=file_bytes)
+    return extract_vision_google(file_bytes)["text"]
 
-    response = vision_client.text_detection(image=image)
-    if response.error.message:
-        raise RuntimeError(response.error.message)
 
-    texts = response.text_annotations
-    if not texts:
-        return ""
+def extract_text_from_pdf_google(
+    source: Union[bytes, str],
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> str:
+    """
+    نص الـ PDF: الصفحات تُستخرج بالتوازي (pdf_extractor) ضمن نطاق/ميزانية محددة.
+    source: بايتات الملف أو مسار الملف المرفوع على القرص
+    """
+    return extract_text_from_pdf(source, first_page, last_page, max_chars=max_chars)
+
+
+def _should_speculate(math_hint: Optional[bool]) -> bool:
+    """
+    "auto": حسب المسار فقط (math_hint). مؤشر أبعاد الصورة أُزيل: في bench_image_pipeline
+    كانت الصور "العريضة" هي صور النص، فأُهدر pix2tex عليها كلها ولم تُخمَّن صور المعادلات.
+    """
+    if OCR_SPECULATIVE_PIX2TEX == "always":
+        return True
+    if OCR_SPECULATIVE_PIX2TEX == "never":
+        return False
+    return bool(math_hint)
+
 
-    # ✅ أول عنصر يحتوي النص الكامل
-    return texts[0].description.strip()
+def _submit_regions(regions: List[Dict[str, Any]]):
+    return [(region, image_to_latex_future(region["image"])) for region in regions]
 
 
-def extract_text_from_pdf_google(file_bytes: bytes) -> str:
-    text = ""
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text.strip()
+def _full_image_region(file_bytes: bytes) -> Dict[str, Any]:
+    return {"box": None, "text": None, "image": file_bytes}
 
 
-def extract_rich_from_image_google(file_bytes: bytes):
+def extract_rich_from_image_google(file_bytes: bytes, math_hint: Optional[bool] = None):
     """
     يقرر تلقائيًا:
     - هل يوجد معادلة؟
     - هل نحتاج pix2tex أو لا؟
 
+    pix2tex لا يرى الصورة كاملة: تُقص أسطر المعادلات (من مربعات Vision للأسطر الرياضية،
+    أو بإسقاط الصفوف محليًا) وتُصغّر، ثم تُرسل معًا كدفعة → LaTeX لكل سطر.
+
+    إن كانت الصورة على الأرجح رياضية (math_hint من المسار)
+    يبدأ pix2tex بالتوازي مع Google Vision، ويُلغى/يُهمل إن لم يجد Vision أي معادلة.
+
     ويُرجع:
     {
-      "text": ...       (نص Google Vision)
-      "latex": ...      (معادلة إن وُجدت)
-      "merged": ...     (نص موحد)
+      "text": ...        (نص Google Vision)
+      "latex": ...       (المعادلات إن وُجدت، سطر لكل معادلة)
+      "pix2tex_latex": ... (مخرج pix2tex الخام قبل التصحيحات، لسجل OCR)
+      "region_texts": [...] (نص Vision لكل سطر من pix2tex_latex بنفس الترتيب، None = النص الكامل)
+      "latex_lines": [{"box", "text", "latex"}, ...]
+      "merged": ...      (نص موحد)
       "detected_type": "text" | "math" | "mixed"
       "used_pix2tex": True | False
+      "timings": {...}   (بالملي ثانية)
     }
     """
+    started = time.perf_counter()
+    timings = {"speculative": False, "speculation_wasted": False}
 
-    # ✅ المرحلة 1: نستخرج النص عادي من Google Vision
-    text = extract_text_from_image_google(file_bytes)
+    # ✅ المرحلة 0: تشغيل pix2tex تخمينيًا (على أشرطة الإسقاط) قبل انتظار Vision
+    pending = []
+    if _should_speculate(math_hint):
+        try:
+            regions = crop_equation_regions(file_bytes) or [_full_image_region(file_bytes)]
+            pending = _submit_regions(regions)
+            timings["speculative"] = True
+        except Exception as e:
+            print("pix2tex speculative submit error:", e)
+
+    # ✅ المرحلة 1: نستخرج النص عادي (مع مربعات الكلمات) من Google Vision
+    try:
+        vision_result = extract_vision_google(file_bytes)
+    except Exception:
+        for _, future in pending:
+            future.cancel()
+        raise
+    text = vision_result["text"]
+    timings["vision_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
     # ✅ المرحلة 2: نقرر هل يوجد مؤشرات رياضية
     contains_math = has_math_expression(text)
+    math_lines = [
+        line for line in group_words_into_lines(vision_result["words"])
+        if has_math_expression(line["text"])
+    ]
 
     latex = None
+    latex_lines = []
+    raw_lines = []
+    region_texts = []
     used_pix2tex = False
 
-    # ✅ المرحلة 3: نستدعي pix2tex فقط إذا فعلاً يوجد مؤشر رياضي
+    # ✅ المرحلة 3: نستخدم pix2tex فقط إذا فعلاً يوجد مؤشر رياضي
     if contains_math:
-        try:
-            raw_latex = image_to_latex(file_bytes)
-
-            latex_step_1 = normalize_math_expression(raw_latex)
-            latex_step_2 = semantic_correct(latex_step_1, text)
-            latex_step_3 = correct_latex_with_vision(latex_step_2, text)
-
-            latex = latex_step_3
-
+        pix2tex_started = time.perf_counter()
+
+        # الأشرطة التخمينية التي لا تقع على سطر رياضي (نص عربي مثلاً) تُلغى
+        if pending and math_lines:
+            kept = []
+            for region, future in pending:
+                if region["box"] is None:
+                    kept.append((region, future))
+                    continue
+                line = next((l for l in math_lines if overlaps_vertically(region["box"], l["box"])), None)
+                if line is not None:
+                    kept.append(({**region, "text": line["text"]}, future))
+                else:
+                    future.cancel()
+            pending = kept
+
+        if not pending:
+            try:
+                regions = crop_equation_regions(file_bytes, math_lines) or [_full_image_region(file_bytes)]
+                pending = _submit_regions(regions)
+            except Exception as e:
+                print("pix2tex error:", e)
+
+        for region, future in pending:
+            try:
+                raw_latex = future.result()
+            except Exception as e:
+                print("pix2tex error:", e)
+                continue
+            raw_lines.append(raw_latex)
+            region_texts.append(region["text"] or None)
+            line_latex = correct_latex(raw_latex, region["text"] or text)
+            if line_latex:
+                latex_lines.append({"box": region["box"], "text": region["text"], "latex": line_latex})
+
+        timings["pix2tex_wait_ms"] = round((time.perf_counter() - pix2tex_started) * 1000, 1)
+        timings["regions"] = len(pending)
+
+        if latex_lines:
+            latex = "\n".join(line["latex"] for line in latex_lines)
             used_pix2tex = True
-        except Exception as e:
-            print("pix2tex error:", e)
-            latex = None
+    elif pending:
+        # لا توجد معادلة: نلغي الطلبات إن كانت ما زالت في الطابور، وإلا نهمل نتائجها
+        for _, future in pending:
+            future.cancel()
+        timings["speculation_wasted"] = True
 
     # ✅ المرحلة 4: تحديد نوع المحتوى
     if text and latex:
@@ -116,10 +216,16 @@ def extract_rich_from_image_google(file_bytes: bytes):
         else:
             merged = "[معادلة LaTeX]: " + latex
 
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
     return {
         "text": text,
         "latex": latex,
+        "pix2tex_latex": "\n".join(raw_lines) if raw_lines else None,
+        "region_texts": region_texts if raw_lines else None,
+        "latex_lines": latex_lines,
         "merged": merged,
         "detected_type": detected_type,
         "used_pix2tex": used_pix2tex,
+        "timings": timings,
     }
@@ -1,5 +1,9 @@
-import json
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import GRADING_BATCH_MAX_ITEMS, GRADING_BATCH_MAX_TOKENS
 from .groq_client import GroqClient
+from .json_salvage import extract_json
 
 GRADING_SYSTEM_PROMPT = GRADING_SYSTEM_PROMPT = """
 أنت مصحح امتحانات ذكي ودقيق.
@@ -29,9 +33,54 @@ GRADING_SYSTEM_PROMPT = GRADING_SYSTEM_PROMPT = """
 - تحقق من صحة الخطوات.
 """
 
+BATCH_GRADING_SYSTEM_PROMPT = """
+أنت مصحح امتحانات ذكي ودقيق.
+
+ستصلك عدة إجابات طلاب، لكل منها رقم id وسؤال وإجابة نموذجية.
+
+مهمتك لكل إجابة:
+- قارن إجابة الطالب بالإجابة النموذجية.
+- قيّمها بدقة من 0 إلى 100.
+- إن كانت الإجابة صحيحة تمامًا → درجة كاملة.
+- إن كانت جزئية → درجة متوسطة.
+- إن كانت خاطئة → درجة منخفضة.
+
+❗ مهم جدًا:
+يجب أن تُخرج النتيجة بصيغة JSON فقط: مصفوفة فيها عنصر لكل إجابة،
+مع إعادة نفس id كما هو، وبالمفاتيح الإنجليزية التالية فقط ❗❗❗:
+
+[
+  {
+    "id": "نفس id المُرسل",
+    "score": 0-100,
+    "is_correct": true | false,
+    "feedback": "شرح مختصر",
+    "correct_answer": "الإجابة النموذجية الصحيحة"
+  }
+]
+
+❌ ممنوع استخدام مفاتيح عربية.
+❌ ممنوع إضافة أي نص خارج JSON.
+❌ ممنوع حذف أي id.
+
+إن كانت الإجابة تحتوي على حسابات رياضية:
+- تحقق من صحة الناتج.
+- تحقق من صحة الخطوات.
+"""
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    تقدير تقريبي لعدد التوكنات (النص العربي يستهلك توكنات أكثر من الإنجليزي)
+    """
+    return len(text or "") // 3 + 1
+
+
 class GradingEngine:
-    def __init__(self):
+    def __init__(self, fast_path=None):
         self.llm = GroqClient()
+        # AnswerFastPath اختياري: يحسم الإجابات الواضحة محليًا قبل الـ LLM
+        self.fast_path = fast_path
 
     def _normalize_keys(self, data: dict):
         """
@@ -54,6 +103,20 @@ class GradingEngine:
 
         return normalized
 
+    def _finalize(self, data: dict):
+        data = self._normalize_keys(data)
+
+        # ✅ تصحيح is_correct منطقيًا بناءً على الدرجة
+        if "score" in data:
+            try:
+                data["score"] = float(data["score"])
+                data["is_correct"] = data["score"] >= 50
+            except (TypeError, ValueError):
+                data["score"] = 0
+                data["is_correct"] = False
+
+        return data
+
     def grade(self, question: str, student_answer: str, model_answer: str):
         user_prompt = f"""
 سؤال الامتحان:
@@ -68,21 +131,196 @@ class GradingEngine:
 
         result_text = self.llm.generate(GRADING_SYSTEM_PROMPT, user_prompt)
 
-        try:
-            data = json.loads(result_text)
-            data = self._normalize_keys(data)
+        # ✅ تحليل متسامح: يزيل ``` والكلام المحيط ويصلح العيوب الشائعة
+        data, _ = extract_json(result_text)
 
-            # ✅ تصحيح is_correct منطقيًا بناءً على الدرجة
-            if "score" in data:
-                data["is_correct"] = data["score"] >= 50
+        if isinstance(data, dict):
+            return self._finalize(data)
+
+        return {
+            "score": 0,
+            "is_correct": False,
+            "feedback": "تعذر تحليل نتيجة التصحيح.",
+            "correct_answer": model_answer,
+            "raw_output": result_text
+        }
+
+    # ---------- التصحيح الدفعي ----------
+
+    def _item_tokens(self, item: Dict[str, Any]) -> int:
+        return (
+            _estimate_tokens(item["question"])
+            + _estimate_tokens(item["student_answer"])
+            + _estimate_tokens(item["model_answer"])
+            + 20
+        )
+
+    def pack_batches(
+        self,
+        items: List[Dict[str, Any]],
+        max_items: int = GRADING_BATCH_MAX_ITEMS,
+        max_tokens: int = GRADING_BATCH_MAX_TOKENS,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        تقسيم الإجابات إلى دفعات حسب ميزانية التوكنات وعدد العناصر
+        """
+        batches, current, current_tokens = [], [], 0
+        for item in items:
+            tokens = self._item_tokens(item)
+            if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _grade_batch_once(self, batch: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+        """
+        طلب واحد لعدة إجابات. يرجع فقط النتائج التي أعاد النموذج id لها بشكل سليم.
+        """
+        parts = []
+        for item in batch:
+            parts.append(
+                f"""
+[id: {item["id"]}]
+سؤال الامتحان:
+{item["question"]}
+
+إجابة الطالب:
+{item["student_answer"]}
+
+الإجابة النموذجية:
+{item["model_answer"]}
+"""
+            )
+        user_prompt = "\n---\n".join(parts)
+
+        result_text = self.llm.generate(BATCH_GRADING_SYSTEM_PROMPT, user_prompt)
+        data, _ = extract_json(result_text)
+
+        if isinstance(data, dict):
+            data = data.get("results") or data.get("grades") or [data]
+        if not isinstance(data, list):
+            return {}
+
+        by_id = {str(item["id"]): item["id"] for item in batch}
+        results = {}
+        for entry in data:
+            if not isinstance(entry, dict) or "score" not in entry:
+                continue
+            item_id = by_id.get(str(entry.get("id")))
+            if item_id is None:
+                continue
+            entry = dict(entry)
+            entry.pop("id", None)
+            results[item_id] = self._finalize(entry)
+        return results
+
+    def grade_batch(self, batch: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+        """
+        تصحيح دفعة واحدة. إن فشل التحليل أو نقصت بعض الـ ids،
+        نقسم الباقي إلى نصفين ونعيد المحاولة، وصولاً إلى grade العادي لعنصر واحد.
+        """
+        if not batch:
+            return {}
+        if len(batch) == 1:
+            item = batch[0]
+            return {item["id"]: self._safe_grade(item)}
+
+        results = self._grade_batch_once(batch)
+        missing = [item for item in batch if item["id"] not in results]
 
-            return data
+        if missing:
+            mid = len(missing) // 2 or 1
+            results.update(self.grade_batch(missing[:mid]))
+            results.update(self.grade_batch(missing[mid:]))
 
-        except json.JSONDecodeError:
+        return results
+
+    def _safe_grade(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.grade(
+                question=item["question"],
+                student_answer=item["student_answer"],
+                model_answer=item["model_answer"],
+            )
+        except Exception as e:
+            print("Grading error:", item.get("id"), e)
             return {
                 "score": 0,
                 "is_correct": False,
-                "feedback": "تعذر تحليل نتيجة التصحيح.",
-                "correct_answer": model_answer,
-                "raw_output": result_text
+                "feedback": "تعذر تصحيح هذه الإجابة.",
+                "correct_answer": item["model_answer"],
             }
+
+    def grade_many(
+        self,
+        items: List[Dict[str, Any]],
+        max_workers: int,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Dict[Any, Dict[str, Any]], Dict[Any, Future]]:
+        """
+        تصحيح عدة إجابات: تُجمع في دفعات (طلب واحد لكل دفعة)،
+        وتُرسل الدفعات بالتوازي (حد أقصى max_workers طلبًا في نفس الوقت).
+
+        :param items: [{"id", "question", "student_answer", "model_answer"}, ...]
+        :param deadline: أقصى زمن بالثواني ننتظره قبل الرد (None = ننتظر الكل)
+        :return: (النتائج الجاهزة حسب id، والمهام التي فاتت المهلة حسب id)
+                 المهام المتأخرة تكمل في الخلفية، ويمكن للمستدعي ربط add_done_callback بها.
+        """
+        if not items:
+            return {}, {}
+
+        results = {}
+        if self.fast_path is not None:
+            try:
+                results, items = self.fast_path.pregrade_many(items)
+            except Exception as e:
+                print("Fast path error:", e)
+                results = {}
+
+        if not items:
+            return results, {}
+
+        batches = self.pack_batches(items)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches))))
+        futures = {executor.submit(self.grade_batch, batch): batch for batch in batches}
+
+        done, not_done = wait(futures, timeout=deadline)
+
+        for f in done:
+            try:
+                batch_results = f.result()
+            except Exception as e:
+                # ✅ دفعة فشلت: لا نُسقط الامتحان كله، نصحح إجاباتها منفردة (كما في _resolve)
+                print("Batch grading error:", e)
+                batch_results = {}
+            for item in futures[f]:
+                results[item["id"]] = batch_results.get(item["id"]) or self._safe_grade(item)
+
+        # ✅ لكل إجابة متأخرة Future خاص بها يُكمَل عند انتهاء دفعتها
+        pending = {}
+        for f in not_done:
+            for item in futures[f]:
+                item_future = Future()
+                pending[item["id"]] = item_future
+
+            def _resolve(batch_future, batch=futures[f]):
+                try:
+                    batch_results = batch_future.result()
+                except Exception:
+                    batch_results = {}
+                for item in batch:
+                    pending[item["id"]].set_result(
+                        batch_results.get(item["id"]) or self._safe_grade(item)
+                    )
+
+            f.add_done_callback(_resolve)
+
+        # لا ننتظر المهام المتبقية؛ ستكمل ثم تُغلق الخيوط تلقائيًا
+        executor.shutdown(wait=False)
+
+        return results, pending
@@ -1,9 +1,65 @@
+import threading
+import time
+
 import requests
-from .config import GROQ_API_KEY, GROQ_API_URL, GROQ_MODEL_NAME
+from .config import (
+    GROQ_API_KEY,
+    GROQ_API_URL,
+    GROQ_MODEL_NAME,
+    GROQ_TIMEOUT_SECONDS,
+    GROQ_CIRCUIT_FAILURE_THRESHOLD,
+    GROQ_CIRCUIT_COOLDOWN_SECONDS,
+)
+
+
+class CircuitBreaker:
+    """
+    قاطع دائرة بسيط لمزود الذكاء الاصطناعي:
+    - بعد failure_threshold أخطاء متتالية تُفتح الدائرة
+    - أثناء فترة التهدئة لا نرسل أي طلب (نفشل فورًا)
+    - بعد انتهاء التهدئة نسمح بالمحاولة من جديد
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                # ✅ انتهت التهدئة → نسمح بمحاولة جديدة
+                self._opened_at = None
+                self._failures = 0
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and self._opened_at is None:
+                print("⚠️ Groq circuit opened after", self._failures, "failures")
+                self._opened_at = time.monotonic()
+
+
+# ✅ دائرة مشتركة بين كل نسخ GroqClient (نفس المزود ونفس الحصة)
+groq_circuit = CircuitBreaker(GROQ_CIRCUIT_FAILURE_THRESHOLD, GROQ_CIRCUIT_COOLDOWN_SECONDS)
 
 
 class GroqClient:
     def generate(self, system_prompt, user_prompt):
+        if groq_circuit.is_open():
+            return "❌ مزود الذكاء الاصطناعي (Groq) غير متاح مؤقتًا. حاول لاحقًا."
+
         headers = {
             "Authorization": f"Bearer {GROQ_API_KEY}",
             "Content-Type": "application/json"
@@ -18,12 +74,18 @@ class GroqClient:
             "temperature": 0.3
         }
 
-        res = requests.post(GROQ_API_URL, headers=headers, json=payload)
+        try:
+            res = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=GROQ_TIMEOUT_SECONDS)
+        except requests.RequestException as e:
+            print("❌ Groq Request Error:", e)
+            groq_circuit.record_failure()
+            return "❌ تعذر الاتصال بمزود الذكاء الاصطناعي (Groq)."
 
         # ✅ اطبع الخطأ الحقيقي إن حصل
         if res.status_code != 200:
             print("❌ Groq Error Status:", res.status_code)
             print("❌ Groq Error Body:", res.text)
+            groq_circuit.record_failure()
             return "❌ حدث خطأ من مزود الذكاء الاصطناعي (Groq). تحقق من الإعدادات أو الموديل."
 
         data = res.json()
@@ -31,6 +93,8 @@ class GroqClient:
         # ✅ حماية من KeyError
         if "choices" not in data:
             print("❌ Unexpected Groq Response:", data)
+            groq_circuit.record_failure()
             return "❌ استجابة غير متوقعة من Groq. تحقق من الموديل أو الصلاحيات."
 
+        groq_circuit.record_success()
         return data["choices"][0]["message"]["content"]
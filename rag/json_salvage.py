@@ -0,0 +1,212 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# ✅ عدادات تراكمية: كم مرة احتجنا للإصلاح أو الإنقاذ الجزئي
+salvage_stats = {"parsed": 0, "clean": 0, "repaired": 0, "partial": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PY_LITERALS_RE = re.compile(r"\b(True|False|None)\b")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# « » لا تُستبدل: علامات تنصيص عادية داخل النصوص العربية وليست بديلاً عن " في بنية JSON
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+
+
+def _count(key: str):
+    with _stats_lock:
+        salvage_stats[key] += 1
+
+
+def salvage_snapshot() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(salvage_stats)
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    يزيل ```json ... ``` إن أحاط النموذج الإخراج بها
+    """
+    match = _FENCE_RE.search(text)
+    return match.group(1) if match else text
+
+
+def _scan_balanced(text: str, start: int) -> Tuple[int, List[str]]:
+    """
+    يمشي من قوس الفتح عند start حتى قوس الإغلاق المطابق مع احترام النصوص.
+    يرجع (موضع النهاية أو -1 إن انقطع النص، الأقواس التي بقيت مفتوحة).
+    """
+    stack = []
+    in_string = False
+    escaped = False
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack and stack[-1] == ch:
+                stack.pop()
+            if not stack:
+                return i, []
+
+    if in_string:
+        stack.append('"')
+    return -1, stack
+
+
+def _extract_span(text: str, start: int) -> str:
+    """
+    كائن/مصفوفة JSON يبدأ عند start (يتجاهل أي كلام بعده).
+    إن كان الإخراج مقطوعًا نُكمل الأقواس الناقصة.
+    """
+    end, still_open = _scan_balanced(text, start)
+    if end != -1:
+        return text[start:end + 1]
+
+    # ✅ إخراج مقطوع: نغلق النص المفتوح ثم الأقواس بالترتيب العكسي
+    closing = "".join(reversed(still_open))
+    if closing.startswith('"'):
+        return text[start:] + closing
+    return text[start:].rstrip().rstrip(",") + closing
+
+
+def _split_strings(text: str) -> List[Tuple[bool, str]]:
+    """
+    يقسم النص إلى مقاطع (داخل نص "..."؟، المقطع) مع احترام الهروب \\"
+    """
+    parts = []
+    start = 0
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                parts.append((True, text[start:i + 1]))
+                start = i + 1
+                in_string = False
+        elif ch == '"':
+            parts.append((False, text[start:i]))
+            start = i
+            in_string = True
+
+    parts.append((in_string, text[start:]))
+    return parts
+
+
+def _repair_structure(text: str) -> str:
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    return _PY_LITERALS_RE.sub(lambda m: _PY_LITERALS[m.group(1)], text)
+
+
+def repair_json(text: str) -> str:
+    """
+    إصلاح العيوب الشائعة في JSON الصادر عن النماذج اللغوية
+    """
+    text = text.translate(_SMART_QUOTES)
+    # ✅ الفواصل الزائدة و True/False/None تُصلح خارج النصوص فقط (لا نغيّر محتوى الأسئلة)
+    return "".join(
+        part if in_string else _repair_structure(part)
+        for in_string, part in _split_strings(text)
+    )
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def extract_json(raw: str) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    يحاول تحليل إخراج النموذج على مراحل:
+    1) json.loads مباشرة
+    2) إزالة ``` والكلام المحيط، ثم إصلاح العيوب الشائعة
+    يرجع (البيانات أو None، معلومات عن الإصلاح).
+    """
+    info = {"repaired": False}
+    _count("parsed")
+
+    if not isinstance(raw, str):
+        _count("failed")
+        return None, info
+
+    data = _loads(raw)
+    if data is not None:
+        _count("clean")
+        return data, info
+
+    text = strip_code_fences(raw)
+    # ✅ نجرب أول "{" ثم أول "[" (قد يسبق الـ JSON كلام يحتوي أقواسًا)
+    starts = sorted(i for i in (text.find("{"), text.find("[")) if i != -1)
+    for start in starts:
+        span = _extract_span(text, start)
+        data = _loads(span)
+        if data is None:
+            data = _loads(repair_json(span))
+        if data is not None:
+            info["repaired"] = True
+            _count("repaired")
+            return data, info
+
+    _count("failed")
+    return None, info
+
+
+def _has_nested_objects(obj: Dict[str, Any]) -> bool:
+    for value in obj.values():
+        if isinstance(value, dict):
+            return True
+        if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+            return True
+    return False
+
+
+def extract_objects(raw: str) -> List[Dict[str, Any]]:
+    """
+    إنقاذ جزئي: يستخرج كل كائن {...} سليم بمفرده من داخل نص معطوب،
+    ويتجاهل الكائنات التي تحتوي كائنات أخرى (مثل الغلاف {"questions": [...]}).
+    """
+    if not isinstance(raw, str):
+        return []
+
+    text = strip_code_fences(raw)
+    objects = []
+    i = text.find("{")
+
+    while i != -1:
+        end, _ = _scan_balanced(text, i)
+        if end == -1:
+            # غلاف مقطوع → ننزل إلى ما بداخله
+            i = text.find("{", i + 1)
+            continue
+        obj = _loads(text[i:end + 1]) or _loads(repair_json(text[i:end + 1]))
+        if isinstance(obj, dict) and not _has_nested_objects(obj):
+            objects.append(obj)
+            i = text.find("{", end + 1)
+        else:
+            # كائن معطوب أو غلاف → ننزل إلى الكائنات التي بداخله
+            i = text.find("{", i + 1)
+
+    if objects:
+        _count("partial")
+    return objects
@@ -0,0 +1,233 @@
+import hashlib
+import io
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .config import (
+    LATEX_REPLICAS,
+    LATEX_MAX_BATCH,
+    LATEX_MAX_WAIT_MS,
+    LATEX_MAX_QUEUE,
+    LATEX_WARMUP,
+)
+from .equation_regions import load_gray, prepare_for_pix2tex
+from .executors import ExecutorOverloaded
+
+try:
+    from pix2tex.cli import LatexOCR
+except ImportError:
+    LatexOCR = None
+
+
+def load_latex_ocr_model():
+    if LatexOCR is None:
+        raise ImportError("pix2tex غير مثبت. ثبّت الحزمة pix2tex أولاً.")
+    # سيستخدم CPU افتراضياً (أو GPU إن وُجد)
+    return LatexOCR()
+
+
+def latex_from_image(model, file_bytes: bytes) -> str:
+    img = prepare_for_pix2tex(load_gray(file_bytes))
+    return model(img).strip()
+
+
+def _limit_torch_threads(replicas: int):
+    """
+    عدة نسخ في نفس العملية: نوزع أنوية المعالج عليها بدل أن تتنافس
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, replicas)))
+
+
+class LatexInferenceService:
+    """
+    خدمة pix2tex داخل نفس العملية:
+    - replicas نسخة من الموديل، كل نسخة في خيط خاص ومحمّلة مسبقًا (warm)
+    - الطلبات المتزامنة تُجمع في دفعة حتى max_batch صورة أو max_wait_ms
+    - الصور المتطابقة داخل الدفعة تُحلل مرة واحدة
+    - طابور محدود: عند الامتلاء ExecutorOverloaded (→ 503)
+
+    ملاحظة: واجهة pix2tex تقبل صورة واحدة، لذلك تُنفَّذ صور الدفعة تتابعيًا داخل النسخة.
+    """
+
+    def __init__(
+        self,
+        replicas: int = LATEX_REPLICAS,
+        max_batch: int = LATEX_MAX_BATCH,
+        max_wait_ms: float = LATEX_MAX_WAIT_MS,
+        max_queue: int = LATEX_MAX_QUEUE,
+        warmup: bool = LATEX_WARMUP,
+        model_factory: Callable[[], Any] = load_latex_ocr_model,
+    ):
+        self.replicas = max(1, replicas)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self.warmup = warmup
+        # ✅ ما يُنشئ نسخة الموديل (يمكن استبداله بموديل محلي بديل في سكربتات القياس)
+        self.model_factory = model_factory
+
+        self._queue: "queue.Queue[Tuple[bytes, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._ready = 0
+        self._started_at: Optional[float] = None
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.stats = {
+            "requests": 0,
+            "rejected": 0,
+            "batches": 0,
+            "inferences": 0,
+            "deduplicated": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+
+    # ---------- دورة الحياة ----------
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._started_at = time.monotonic()
+        _limit_torch_threads(self.replicas)
+        for i in range(self.replicas):
+            threading.Thread(target=self._replica, name=f"pix2tex-{i}", daemon=True).start()
+
+    def stop(self):
+        with self._lock:
+            self._started = False
+        for _ in range(self.replicas):
+            self._queue.put(None)
+
+    # ---------- الطلبات ----------
+
+    def submit(self, file_bytes: bytes) -> Future:
+        if not self._started:
+            self.start()
+        with self._lock:
+            if self._queue.qsize() >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise ExecutorOverloaded("pix2tex")
+            self.stats["requests"] += 1
+        future: Future = Future()
+        self._queue.put((file_bytes, future, time.monotonic()))
+        return future
+
+    def infer(self, file_bytes: bytes) -> str:
+        """
+        واجهة حاجبة (تُستدعى من خيوط المنفذ io أو من extract_rich_from_image_google)
+        """
+        return self.submit(file_bytes).result()
+
+    # ---------- النسخ ----------
+
+    def _collect(self, first) -> List[Tuple[bytes, Future, float]]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # نعيد إشارة الإيقاف لنسخة أخرى
+                break
+            batch.append(item)
+        return batch
+
+    def _replica(self):
+        try:
+            model = self.model_factory()
+            if self.warmup:
+                blank = io.BytesIO()
+                Image.new("L", (64, 32), 255).save(blank, format="PNG")
+                latex_from_image(model, blank.getvalue())
+        except Exception as e:
+            print("⚠️ تعذر تحميل pix2tex:", e)
+            model = None
+        with self._lock:
+            self._ready += 1
+
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            with self._lock:
+                self.stats["batches"] += 1
+
+            # ✅ صور متطابقة في نفس الدفعة → استدلال واحد
+            # (الطلبات الملغاة، مثل تشغيل تخميني لم نعد نحتاجه، تُتجاهل)
+            groups: Dict[str, List[Tuple[bytes, Future, float]]] = {}
+            for item in batch:
+                if not item[1].set_running_or_notify_cancel():
+                    with self._lock:
+                        self.stats["cancelled"] += 1
+                    continue
+                groups.setdefault(hashlib.sha256(item[0]).hexdigest(), []).append(item)
+
+            for items in groups.values():
+                file_bytes = items[0][0]
+                try:
+                    if model is None:
+                        raise ImportError("pix2tex غير متاح")
+                    result, error = latex_from_image(model, file_bytes), None
+                except Exception as e:
+                    result, error = None, e
+
+                now = time.monotonic()
+                with self._lock:
+                    self.stats["inferences"] += 1
+                    self.stats["deduplicated"] += len(items) - 1
+                    if error is not None:
+                        self.stats["failed"] += len(items)
+                    for _, _, queued_at in items:
+                        self._latencies.append(now - queued_at)
+
+                for _, future, _ in items:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+
+    # ---------- المقاييس ----------
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+            completed = self.stats["requests"] - self._queue.qsize()
+
+            def _pct(q: float) -> float:
+                if not latencies:
+                    return 0.0
+                return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 4)
+
+            return {
+                **self.stats,
+                "replicas": self.replicas,
+                "ready_replicas": self._ready,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": round(
+                    (self.stats["inferences"] + self.stats["deduplicated"]) / self.stats["batches"], 2
+                ) if self.stats["batches"] else 0.0,
+                "latency_p50_seconds": _pct(0.5),
+                "latency_p95_seconds": _pct(0.95),
+                "throughput_per_second": round(completed / uptime, 3) if uptime else 0.0,
+            }
+
+
+latex_service = LatexInferenceService()
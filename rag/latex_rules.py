@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple, Union
+
+# ✅ جدول قواعد تنظيف مخرجات pix2tex (تعريفي):
+# كل مرحلة = قائمة (اسم القاعدة، النمط، البديل) تُجمع في regex واحد يُترجم مرة واحدة عند الاستيراد،
+# ويُطبّق على النص بمرور واحد (re.sub واحد لكل مرحلة بدل re.sub / str.replace لكل قاعدة).
+# الترتيب داخل المرحلة = الأولوية عند تطابق أكثر من قاعدة في نفس الموضع.
+# البديل نص ثابت، أو دالة تأخذ match وترجع النص.
+
+Replacement = Union[str, Callable[["re.Match"], str]]
+Rule = Tuple[str, str, Replacement]
+
+
+_MATHBF = re.compile(r"\\mathbf\{([^}]*)\}")
+_MARKUP = r"(?:\\mathbf\{[^}]*\}|\\scriptstyle)"
+
+
+def _strip_markup(match: "re.Match") -> str:
+    # المقطع كاملاً (مع المسافات حوله) بنفس ترتيب السلسلة القديمة:
+    # × · → *، \mathbf{...} → محتواه، حذف \scriptstyle، توحيد المسافات، حذف الأقواس
+    text = re.sub(r"[×·]", "*", match.group(0))
+    text = _MATHBF.sub(r"\1", text).replace("\\scriptstyle", "")
+    return re.sub(r"\s+", " ", text).replace("{", "").replace("}", "")
+
+
+# المرحلة 1: normalize_math_expression
+NORMALIZE_RULES: List[Rule] = [
+    ("multiply_sign", r"[×·]", "*"),
+    # \mathbf{...} و \scriptstyle مع المسافات المجاورة تُعالج معًا حتى لا تبقى مسافات مزدوجة
+    ("markup", rf"\s*{_MARKUP}(?:\s|{_MARKUP})*", _strip_markup),
+    ("whitespace", r"\s+", " "),
+    ("braces", r"[{}]", ""),
+]
+
+# المرحلة 2: semantic_correct (أخطاء pix2tex الشائعة)
+# (?!\\Delta): في السلسلة القديمة \Delta يصبح a قبل باقي القواعد، فيزول حد الكلمة قبله
+SEMANTIC_RULES: List[Rule] = [
+    ("delta_command", r"\\Delta", "a"),          # دلتا بدل التسارع
+    ("delta_word", r"\bDelta\b(?!\\Delta)", "a"),
+    ("letter_o_zero", r"\bO\b(?!\\Delta)", "0"),
+    ("letter_l_one", r"\bl\b(?!\\Delta)", "1"),
+    ("times_letter", r"\b×\b", "x"),
+    ("square", r"\^2", "²"),
+    ("sqrt", r"sqrt", "√"),
+]
+
+# المرحلة 3: correct_latex_with_vision (خريطة أخطاء شائعة بين OCR و pix2tex)
+SYMBOL_MAP = {
+    "r": "F",
+    "×": "x",
+    "Δ": "a",
+    "l": "1",
+    "O": "0",
+    "ν": "v",
+    "+": "t"
+}
+SYMBOL_RULES: List[Rule] = [
+    (f"symbol_{wrong}", re.escape(wrong), right) for wrong, right in SYMBOL_MAP.items()
+]
+
+
+class CompiledStage:
+    """
+    مرحلة واحدة من الجدول: regex مجمّع بمجموعة مسماة لكل قاعدة + عداد مرات التطبيق لكل قاعدة.
+    العدادات بدون قفل (تقريبية تحت التزامن، تكفي للمقاييس).
+    """
+
+    def __init__(self, name: str, rules: List[Rule]):
+        self.name = name
+        self.rules = rules
+        self._groups = [f"r{i}" for i in range(len(rules))]
+        self._names = {group: rule[0] for group, rule in zip(self._groups, rules)}
+        self._replacements = {group: rule[2] for group, rule in zip(self._groups, rules)}
+        self.pattern = re.compile("|".join(
+            f"(?P<{group}>{pattern})" for group, (_, pattern, _) in zip(self._groups, rules)
+        ))
+        self.hits: Dict[str, int] = {rule[0]: 0 for rule in rules}
+
+    def _replace(self, match: "re.Match") -> str:
+        group = match.lastgroup
+        self.hits[self._names[group]] += 1
+        replacement = self._replacements[group]
+        return replacement(match) if callable(replacement) else replacement
+
+    def apply(self, text: str) -> str:
+        return self.pattern.sub(self._replace, text)
+
+    def reset(self):
+        for name in self.hits:
+            self.hits[name] = 0
+
+
+normalize_stage = CompiledStage("normalize", NORMALIZE_RULES)
+semantic_stage = CompiledStage("semantic", SEMANTIC_RULES)
+symbol_stage = CompiledStage("symbol", SYMBOL_RULES)
+STAGES = (normalize_stage, semantic_stage, symbol_stage)
+
+
+def rule_stats() -> Dict[str, Dict[str, int]]:
+    return {stage.name: dict(stage.hits) for stage in STAGES}
+
+
+# ============ المراحل ============
+
+def normalize_math_expression(expr: str) -> str:
+    if not expr:
+        return expr
+    return normalize_stage.apply(expr.strip()).strip()
+
+
+def semantic_correct(latex: str, vision_text: str) -> str:
+    if not latex:
+        return latex
+
+    fixed = semantic_stage.apply(latex)
+
+    # ✅ لو النص من GCV فيه صيغة أوضح، نرجحه
+    vt = vision_text.replace(" ", "")
+    fx = fixed.replace(" ", "")
+
+    if len(vt) > 3 and len(fx) > 3 and vt in fx:
+        return vt
+
+    return fixed
+
+
+_MAIN_EQUATION = re.compile(r"[A-Za-z0-9+\-*/^(). ]+=+[A-Za-z0-9+\-*/^(). ]+")
+
+
+@lru_cache(maxsize=1024)
+def extract_main_equation(text: str) -> str:
+    """
+    يحاول استخراج معادلة صريحة من نص Google Vision مثل F=ma أو 2x+3=7
+    (نفس نص Vision يُمرر لكل سطر معادلة في الصورة، لذلك النتيجة مخزنة)
+    """
+    if not text:
+        return ""
+
+    # نبحث عن أي شيء فيه =
+    match = _MAIN_EQUATION.search(text)
+
+    return match.group(0).replace(" ", "") if match else ""
+
+
+def correct_latex_with_vision(latex: str, vision_text: str) -> str:
+    """
+    يصحح رموز LaTeX بالاعتماد على المعادلة المستخرجة من Google Vision
+    """
+    if not latex or not vision_text:
+        return latex
+
+    vision_eq = extract_main_equation(vision_text)
+
+    # ✅ لو GCV أعطى معادلة أوضح نرجّحها مباشرة
+    if len(vision_eq) >= 4 and "=" in vision_eq:
+        return vision_eq.replace("*", " ")
+
+    # ✅ وإلا نطبّق خريطة التصحيح الرمزي
+    return symbol_stage.apply(latex)
+
+
+def correct_latex(raw_latex: str, vision_text: str) -> str:
+    """
+    السلسلة كاملة لمخرج pix2tex الخام: normalize → semantic → vision
+    """
+    latex_step_1 = normalize_math_expression(raw_latex)
+    latex_step_2 = semantic_correct(latex_step_1, vision_text)
+    latex_step_3 = correct_latex_with_vision(latex_step_2, vision_text)
+    return latex_step_3
@@ -0,0 +1,269 @@
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+import sympy as sp
+from sympy.parsing.sympy_parser import parse_expr
+
+from .math_step_grader import TRANSFORMATIONS, LOCAL_DICT, _normalize_step_str, _parse_equation
+
+# ✅ أوامر LaTeX البسيطة → صيغة sympy
+LATEX_REPLACEMENTS = [
+    (r"\\left|\\right", ""),
+    (r"\\[,;!: ]|\\quad|\\qquad", " "),
+    (r"\\cdot|\\times", "*"),
+    (r"\\div", "/"),
+    (r"\\pi\b", "pi"),
+    (r"\\(sin|cos|tan|log|ln|exp)\b", r"\1"),
+    (r"\\mathrm|\\mathbf|\\text|\\displaystyle|\\scriptstyle", ""),
+    (r"²", "^2"),
+    (r"³", "^3"),
+    (r"−", "-"),
+    (r"\$", ""),
+]
+_LATEX_RULES = [(re.compile(p), r) for p, r in LATEX_REPLACEMENTS]
+
+# ✅ أسماء متعددة الحروف مسموحة بعد التحويل (دوال وثوابت)؛ غيرها كلمات أو وحدات
+KNOWN_NAMES = {"sin", "cos", "tan", "log", "ln", "exp", "sqrt", "pi"}
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+NUMERIC_POINTS = 5
+NUMERIC_TOL = 1e-8
+MAX_SIMPLIFY_OPS = 200
+
+
+def _braced(s: str, start: int):
+    """
+    يرجع (المحتوى داخل {...} الذي يبدأ عند start، موضع ما بعد القوس المغلق)
+    """
+    depth = 0
+    for i in range(start, len(s)):
+        if s[i] == "{":
+            depth += 1
+        elif s[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return s[start + 1:i], i + 1
+    return s[start + 1:], len(s)
+
+
+def _expand_commands(s: str) -> str:
+    """
+    \\frac{a}{b} → ((a)/(b))، \\sqrt{a} → sqrt(a)، \\sqrt[n]{a} → (a)**(1/(n))
+    """
+    out = []
+    i = 0
+    while i < len(s):
+        if s.startswith("\\frac", i) or s.startswith("\\dfrac", i):
+            j = s.index("{", i) if "{" in s[i:] else -1
+            if j == -1:
+                break
+            num, k = _braced(s, j)
+            den, k = _braced(s, k) if k < len(s) and s[k] == "{" else ("1", k)
+            out.append(f"(({_expand_commands(num)})/({_expand_commands(den)}))")
+            i = k
+        elif s.startswith("\\sqrt", i):
+            k = i + len("\\sqrt")
+            root = None
+            if k < len(s) and s[k] == "[":
+                end = s.find("]", k)
+                root, k = s[k + 1:end], end + 1
+            if k < len(s) and s[k] == "{":
+                body, k = _braced(s, k)
+            else:
+                body, k = s[k:k + 1], k + 1
+            body = _expand_commands(body)
+            out.append(f"(({body})**(1/({root})))" if root else f"sqrt({body})")
+            i = k
+        else:
+            out.append(s[i])
+            i += 1
+    return "".join(out)
+
+
+def latex_to_sympy_str(latex: str) -> str:
+    """
+    تحويل LaTeX بسيط (كما يخرجه pix2tex) إلى نص يفهمه parse_expr
+    """
+    s = latex.strip()
+    for pattern, replacement in _LATEX_RULES:
+        s = pattern.sub(replacement, s)
+    s = _expand_commands(s)
+    s = s.replace("{", "(").replace("}", ")")
+    s = s.replace("\\", "")
+    return _normalize_step_str(s)
+
+
+def _is_pure_math(s: str) -> bool:
+    """
+    الضرب الضمني يحوّل الكلمات والوحدات إلى حاصل ضرب رموز ("6 نيوتن"، "5 kg")،
+    لذلك نقبل فقط: حروفًا لاتينية كلها من جدول الرموز (2x، ma) أو أسماء KNOWN_NAMES
+    """
+    for word in _WORD_RE.findall(s):
+        if not word.isascii():
+            return False
+        if word not in KNOWN_NAMES and not all(ch in LOCAL_DICT for ch in word):
+            return False
+    return True
+
+
+def _parse(text: str):
+    """
+    يرجع sp.Eq إن احتوى النص على "=" وإلا تعبيرًا عاديًا،
+    أو None عند الفشل أو إن لم يكن النص رياضيًا خالصًا
+    """
+    s = latex_to_sympy_str(text)
+    if not s or not _is_pure_math(s):
+        return None
+    if "=" in s:
+        parsed = _parse_equation(s)
+    else:
+        try:
+            parsed = parse_expr(s, transformations=TRANSFORMATIONS, local_dict=LOCAL_DICT)
+        except Exception:
+            return None
+    # Eq(2, 2) يُختزل إلى True مثلاً → لا يصلح للمقارنة
+    if not isinstance(parsed, (sp.Equality, sp.Expr)):
+        return None
+    return parsed
+
+
+def _numeric_zero(expr: sp.Expr) -> Optional[bool]:
+    """
+    تقييم عددي عند نقاط عشوائية:
+    True = صفر في كل النقاط، False = غير صفري بوضوح، None = تعذر التقييم
+    """
+    symbols = sorted(expr.free_symbols, key=str)
+    rng = random.Random(0)
+    evaluated = 0
+
+    for _ in range(NUMERIC_POINTS):
+        point = {sym: rng.uniform(0.5, 3.0) for sym in symbols}
+        try:
+            value = complex(expr.evalf(subs=point))
+        except Exception:
+            continue
+        if value != value:  # NaN
+            continue
+        evaluated += 1
+        if abs(value) > NUMERIC_TOL:
+            return False
+
+    return True if evaluated >= 3 else None
+
+
+def _expressions_equal(a: sp.Expr, b: sp.Expr) -> Optional[bool]:
+    # رموز مختلفة بين الطرفين ("5 m/s" مقابل "5"): غالبًا وحدات → لا حكم قاطع
+    if a.free_symbols != b.free_symbols:
+        return None
+    diff = a - b
+    numeric = _numeric_zero(diff)
+    if numeric is False:
+        return False
+    if sp.count_ops(diff) <= MAX_SIMPLIFY_OPS:
+        try:
+            if sp.simplify(diff) == 0:
+                return True
+        except Exception:
+            pass
+    return numeric
+
+
+def _solutions_equal(sa: List[sp.Expr], sb: List[sp.Expr]) -> Optional[bool]:
+    """
+    مطابقة الحلول واحدًا لواحد عدديًا (2 و 2.0، 0.5 و 1/2 متساويان).
+    None إن تعذر الحكم على أي زوج.
+    """
+    unmatched = list(sb)
+    undecided = False
+    for sol in sa:
+        for i, other in enumerate(unmatched):
+            equal = _numeric_zero(sol - other)
+            if equal:
+                del unmatched[i]
+                break
+            if equal is None:
+                undecided = True
+        else:
+            return None if undecided else False
+    if unmatched:
+        return None if undecided else False
+    return True
+
+
+def _equations_equal(a: sp.Eq, b: sp.Eq) -> Optional[bool]:
+    """
+    معادلتان متكافئتان إذا كان (lhs - rhs) لإحداهما مضاعفًا ثابتًا للأخرى،
+    أو (لمتغير واحد) إذا تطابقت مجموعتا الحلول.
+    """
+    ra = a.lhs - a.rhs
+    rb = b.lhs - b.rhs
+
+    if ra.free_symbols != rb.free_symbols:
+        return None
+    symbols = ra.free_symbols
+    if len(symbols) == 1:
+        var = next(iter(symbols))
+        try:
+            return _solutions_equal(sp.solve(ra, var), sp.solve(rb, var))
+        except Exception:
+            pass
+
+    if rb == 0:
+        return None
+    try:
+        ratio = sp.simplify(ra / rb)
+    except Exception:
+        return None
+    if ratio.free_symbols:
+        return None
+    return ratio != 0
+
+
+def undecided_verification(method: str) -> Dict[str, Any]:
+    return {"decisive": False, "equivalent": None, "method": method}
+
+
+def verify_math_answer(student_latex: str, model_answer: str) -> Dict[str, Any]:
+    """
+    يتحقق رمزيًا من تكافؤ إجابة الطالب (LaTeX) مع الإجابة النموذجية.
+
+    يرجع:
+    {
+      "decisive": True | False,     (هل الحكم قاطع دون LLM؟)
+      "equivalent": True | False | None,
+      "method": "expression" | "equation" | "solution" | "unparsed" | "error" | "timeout"
+    }
+    ("timeout" يضعه MathWorkerPool.verify_answer إن تجاوز التحقق المهلة)
+    """
+    try:
+        return _verify(student_latex, model_answer)
+    except Exception as e:
+        # مدخلات OCR غير متوقعة (مثل "x=1,5" → Tuple): لا حكم قاطع بدل خطأ 500
+        print("⚠️ تعذر التحقق الرمزي:", e)
+        return undecided_verification("error")
+
+
+def _verify(student_latex: str, model_answer: str) -> Dict[str, Any]:
+    student = _parse(student_latex or "")
+    model = _parse(model_answer or "")
+
+    if student is None or model is None:
+        return undecided_verification("unparsed")
+
+    student_is_eq = isinstance(student, sp.Equality)
+    model_is_eq = isinstance(model, sp.Equality)
+
+    if student_is_eq and model_is_eq:
+        result, method = _equations_equal(student, model), "equation"
+    elif not student_is_eq and not model_is_eq:
+        result, method = _expressions_equal(student, model), "expression"
+    else:
+        # ✅ "x = 2" مقابل "2": نقارن القيمة مع الطرف الأيمن إذا كان الأيسر متغيرًا
+        eq, expr = (student, model) if student_is_eq else (model, student)
+        if isinstance(eq.lhs, sp.Symbol) and eq.lhs not in expr.free_symbols:
+            result, method = _expressions_equal(eq.rhs, expr), "solution"
+        else:
+            result, method = None, "solution"
+
+    return {"decisive": result is not None, "equivalent": result, "method": method}
@@ -1,30 +1,33 @@
-import io
-from PIL import Image
+from concurrent.futures import Future
 
-try:
-    from pix2tex.cli import LatexOCR
-except ImportError:
-    LatexOCR = None
-
-
-_model = None
-
-
-def get_latex_ocr_model():
-    global _model
-    if _model is None:
-        if LatexOCR is None:
-            raise ImportError("pix2tex غير مثبت. ثبّت الحزمة pix2tex أولاً.")
-        # سيستخدم CPU افتراضياً (أو GPU إن وُجد)
-        _model = LatexOCR()
-    return _model
+from .latex_inference import latex_service
+from .ocr_cache import cached_ocr, ocr_cache
 
 
 def image_to_latex(file_bytes: bytes) -> str:
     """
     يحول صورة (معادلة) إلى LaTeX باستخدام pix2tex.
+    النتيجة الخام تُخزن في كاش OCR حسب محتوى الصورة،
+    والاستدلال يمر عبر خدمة pix2tex (نسخ مُحمّلة مسبقًا + دفعات).
     """
-    model = get_latex_ocr_model()
-    img = Image.open(io.BytesIO(file_bytes)).convert("L")
-    latex_str = model(img)
-    return latex_str.strip()
+    return cached_ocr(file_bytes, "latex", latex_service.infer)
+
+
+def image_to_latex_future(file_bytes: bytes) -> Future:
+    """
+    نسخة غير حاجبة: Future مكتمل فورًا إن كانت النتيجة في الكاش،
+    وإلا طلب في خدمة pix2tex (يمكن إلغاؤه بـ future.cancel() ما دام في الطابور).
+    """
+    cached = ocr_cache.get(file_bytes, "latex") if ocr_cache is not None else None
+    if cached is not None:
+        future: Future = Future()
+        future.set_result(cached)
+        return future
+
+    future = latex_service.submit(file_bytes)
+    if ocr_cache is not None:
+        def _store(fut: Future):
+            if not fut.cancelled() and fut.exception() is None:
+                ocr_cache.put(file_bytes, "latex", fut.result())
+        future.add_done_callback(_store)
+    return future
@@ -1,5 +1,10 @@
+import random
 import re
-from typing import List, Dict, Any, Optional
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 import sympy as sp
 from sympy import symbols
 from sympy.parsing.sympy_parser import (
@@ -8,6 +13,14 @@ from sympy.parsing.sympy_parser import (
     implicit_multiplication_application,
 )
 
+from .config import (
+    MATH_PARSE_CACHE_SIZE,
+    MATH_SOLVE_CACHE_SIZE,
+    MATH_REQUEST_TIMEOUT_SECONDS,
+    MATH_CLASS_TIMEOUT_SECONDS,
+    MATH_CLASS_TOP_ERRORS,
+)
+
 
 def _normalize_step_str(s: str) -> str:
     """
@@ -27,39 +40,40 @@ TRANSFORMATIONS = standard_transformations + (implicit_multiplication_applicatio
 # ✅ رموز شائعة في الرياضيات والفيزياء
 COMMON_SYMBOLS = symbols("x y z a b c v u t m F P E I V R g s")
 
+# ✅ جدول الرموز يُبنى مرة واحدة بدل كل استدعاء parse_expr
+LOCAL_DICT = {str(sym): sym for sym in COMMON_SYMBOLS}
 
-def _parse_equation(s: str) -> Optional[sp.Eq]:
+
+@lru_cache(maxsize=MATH_PARSE_CACHE_SIZE)
+def _parse_normalized(s: str) -> Optional[sp.Eq]:
     """
-    نسخة متقدمة:
-    - تدعم 2x → 2*x
-    - تدعم رموز فيزيائية
-    - تتحمل مسافات غير منتظمة
+    التحليل الفعلي لنص مُطبَّع. النتيجة مخزنة (مشتركة بين كل الطلبات)،
+    لأن نفس الخطوات تتكرر كثيرًا بين الطلاب.
     """
-
-    s = _normalize_step_str(s)
-
     if "=" not in s:
         return None
 
     left, right = s.split("=", 1)
 
     try:
-        lhs = parse_expr(
-            left,
-            transformations=TRANSFORMATIONS,
-            local_dict={str(sym): sym for sym in COMMON_SYMBOLS},
-        )
-        rhs = parse_expr(
-            right,
-            transformations=TRANSFORMATIONS,
-            local_dict={str(sym): sym for sym in COMMON_SYMBOLS},
-        )
+        lhs = parse_expr(left, transformations=TRANSFORMATIONS, local_dict=LOCAL_DICT)
+        rhs = parse_expr(right, transformations=TRANSFORMATIONS, local_dict=LOCAL_DICT)
         return sp.Eq(lhs, rhs)
     except Exception as e:
         print("Parse Error:", s, "->", e)
         return None
 
 
+def _parse_equation(s: str) -> Optional[sp.Eq]:
+    """
+    نسخة متقدمة:
+    - تدعم 2x → 2*x
+    - تدعم رموز فيزيائية
+    - تتحمل مسافات غير منتظمة
+    """
+    return _parse_normalized(_normalize_step_str(s))
+
+
 def _detect_main_symbol(steps: List[str]) -> Optional[sp.Symbol]:
     """
     يحدد المتغير الأساسي تلقائيًا من جميع الخطوات
@@ -75,6 +89,17 @@ def _detect_main_symbol(steps: List[str]) -> Optional[sp.Symbol]:
     return None
 
 
+def _main_symbol(eq: sp.Eq) -> Optional[sp.Symbol]:
+    """
+    المتغير الرئيسي من correct_answer وحده (لا من خطوات الطالب، حتى لا تؤثر مدخلاته على التصحيح):
+    الطرف الأيسر إن كان متغيرًا (v = u + a*t)، وإلا أول متغير أبجديًا (2x + 3 = 7 → x)
+    """
+    if isinstance(eq, sp.Equality) and isinstance(eq.lhs, sp.Symbol):
+        return eq.lhs
+    symbols = sorted(getattr(eq, "free_symbols", ()), key=str)
+    return symbols[0] if symbols else None
+
+
 def _solutions_for_eq(eq: sp.Eq, var: sp.Symbol) -> List[sp.Expr]:
     try:
         sols = sp.solve(eq, var)
@@ -84,15 +109,312 @@ def _solutions_for_eq(eq: sp.Eq, var: sp.Symbol) -> List[sp.Expr]:
         return []
 
 
+@lru_cache(maxsize=MATH_SOLVE_CACHE_SIZE)
+def _cached_solutions(normalized: str, var: sp.Symbol) -> Tuple[sp.Expr, ...]:
+    """
+    حلول معادلة (مفتاحها النص المُطبَّع + المتغير).
+    correct_answer نفسه يتكرر لكل طلاب الصف، فيُحل مرة واحدة فقط.
+    """
+    eq = _parse_normalized(normalized)
+    if eq is None:
+        return ()
+    return tuple(_solutions_for_eq(eq, var))
+
+
+# ✅ فحص متدرّج لصحة الخطوة: عددي (lambdify/NumPy) ← expand/cancel ← simplify
+NUMERIC_POINTS = 4
+NUMERIC_RTOL = 1e-9
+NUMERIC_ATOL = 1e-9
+
+
+@lru_cache(maxsize=MATH_SOLVE_CACHE_SIZE)
+def _lambdified(lhs: sp.Expr, rhs: sp.Expr, free: Tuple[sp.Symbol, ...]):
+    return sp.lambdify(free, [lhs, rhs], modules="numpy")
+
+
+def _numeric_equal(lhs: sp.Expr, rhs: sp.Expr) -> Optional[bool]:
+    """
+    تقييم الطرفين عدديًا عند قيم عشوائية لباقي الرموز:
+    True = متساويان ضمن التسامح، False = مختلفان بوضوح، None = تعذر التقييم (قيم مركبة/غير منتهية)
+    """
+    free = tuple(sorted(lhs.free_symbols | rhs.free_symbols, key=str))
+    rng = random.Random(0)
+    args = [np.array([rng.uniform(0.5, 3.0) for _ in range(NUMERIC_POINTS)]) for _ in free]
+
+    try:
+        with np.errstate(all="ignore"):
+            left, right = _lambdified(lhs, rhs, free)(*args)
+        left = np.broadcast_to(np.asarray(left, dtype=complex), (NUMERIC_POINTS,))
+        right = np.broadcast_to(np.asarray(right, dtype=complex), (NUMERIC_POINTS,))
+    except Exception:
+        return None
+
+    if not (np.all(np.isfinite(left)) and np.all(np.isfinite(right))):
+        return None
+    if np.any(np.abs(left.imag) > NUMERIC_ATOL) or np.any(np.abs(right.imag) > NUMERIC_ATOL):
+        return None
+
+    return bool(np.allclose(left, right, rtol=NUMERIC_RTOL, atol=NUMERIC_ATOL))
+
+
+def _sides_equal(lhs: sp.Expr, rhs: sp.Expr) -> bool:
+    """
+    هل lhs == rhs رياضيًا؟ نبدأ بالأرخص ولا نصل إلى simplify إلا عند الحاجة.
+    """
+    residual = lhs - rhs
+
+    # 0) غالبًا يختزل sympy الفرق تلقائيًا إلى رقم بعد التعويض
+    if residual.is_Number:
+        return residual == 0
+
+    # 1) عددي سريع
+    numeric = _numeric_equal(lhs, rhs)
+    if numeric is not None:
+        return numeric
+
+    # 2) أشكال قانونية أرخص من simplify
+    for canonical in (sp.expand, sp.cancel):
+        try:
+            if canonical(residual) == 0:
+                return True
+        except Exception:
+            pass
+
+    # 3) الملاذ الأخير
+    return sp.simplify(residual) == 0
+
+
+def math_cache_stats() -> Dict[str, Any]:
+    return {
+        "parse": _parse_normalized.cache_info()._asdict(),
+        "solve": _cached_solutions.cache_info()._asdict(),
+        "lambdify": _lambdified.cache_info()._asdict(),
+    }
+
+
+def prepare_reference(correct_answer: str) -> Dict[str, Any]:
+    """
+    المرحلة الأولى: فهم correct_answer، تحديد المتغير الرئيسي، وحل المعادلة الصحيحة.
+    النتيجة نصية بالكامل (srepr) حتى يمكن تمريرها بين العمليات.
+    """
+    # 1) نحاول استخراج المعادلة النهائية الصحيحة من correct_answer
+    correct_eq = _parse_equation(correct_answer)
+    if correct_eq is None:
+        return {"error": "لم أستطع فهم الصيغة الصحيحة (correct_answer) كمعادلة."}
+
+    # 2) نكتشف المتغير الرئيسي
+    main_var = _main_symbol(correct_eq)
+    if main_var is None:
+        return {"error": "لم أستطع تحديد المتغير الرئيسي في المعادلة."}
+
+    # 3) نحسب حلول المعادلة الصحيحة (من الكاش إن سبق حلها)
+    solutions = _cached_solutions(_normalize_step_str(correct_answer), main_var)
+    return {"variable": str(main_var), "solutions": [sp.srepr(sol) for sol in solutions]}
+
+
+def evaluate_step(
+    idx: int,
+    step: str,
+    variable: str,
+    solutions: List[str],
+    is_last: bool = False,
+) -> Dict[str, Any]:
+    """
+    المرحلة الثانية: فحص خطوة واحدة مقابل حلول المعادلة الصحيحة.
+    للخطوة الأخيرة نضيف "final_ok": هل تحقق كل الحلول الصحيحة؟
+    """
+    main_var = sp.Symbol(variable)
+    correct_solutions = [sp.sympify(sol) for sol in solutions]
+
+    eq = _parse_equation(step)
+    if eq is None:
+        result = {
+            "index": idx,
+            "step": step,
+            "is_valid": False,
+            "reason": "لم أتمكن من فهم هذه الخطوة كمعادلة صالحة.",
+        }
+        if is_last:
+            result["final_ok"] = False
+        return result
+
+    # نختبر: هل حلول هذه المعادلة تحتوي على الحل الصحيح؟
+    if not correct_solutions:
+        # لو ما عرفنا نحل المعادلة الصحيحة أصلاً
+        is_valid = True
+        reason = "تم قبول الخطوة (تعذر حساب الحل الصحيح للمقارنة)."
+    else:
+        try:
+            # لو أي من حلول correct_solutions غير متوافق مع هذه الخطوة → الخطأ هنا
+            consistent = True
+            for sol in correct_solutions:
+                # نعوض هذا الحل في المعادلة الحالية
+                if not _sides_equal(eq.lhs.subs(main_var, sol), eq.rhs.subs(main_var, sol)):
+                    consistent = False
+                    break
+
+            is_valid = consistent
+            reason = (
+                "خطوة صحيحة ومتوافقة مع الحل الصحيح."
+                if consistent
+                else "هذه الخطوة غير متوافقة مع الحل الصحيح (تمثل معادلة خاطئة)."
+            )
+        except Exception:
+            is_valid = False
+            reason = "تعذر التحقق من صحة هذه الخطوة."
+
+    result = {
+        "index": idx,
+        "step": step,
+        "is_valid": is_valid,
+        "reason": reason,
+    }
+
+    # التحقق من الخطوة النهائية: هل تعطي نفس الحل النهائي؟
+    if is_last:
+        final_ok = False
+        if correct_solutions:
+            try:
+                final_ok = all(
+                    eq.lhs.subs(main_var, sol) - eq.rhs.subs(main_var, sol) == 0
+                    for sol in correct_solutions
+                )
+            except Exception:
+                final_ok = False
+        result["final_ok"] = final_ok
+
+    return result
+
+
+UNDETERMINED_REASON = "تعذر الحكم على هذه الخطوة ضمن المهلة المحددة."
+
+
+def undetermined_step(idx: int, step: str) -> Dict[str, Any]:
+    return {
+        "index": idx,
+        "step": step,
+        "is_valid": None,
+        "status": "undetermined",
+        "reason": UNDETERMINED_REASON,
+    }
+
+
+def assemble_result(
+    question: str,
+    correct_answer: str,
+    variable: str,
+    step_results: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    المرحلة الثالثة: أول خطوة خاطئة + الدرجة.
+    الخطوات "undetermined" (انتهت مهلتها) لا تُحسب صحيحة ولا خاطئة.
+    """
+    step_results = [dict(r) for r in step_results]
+    final_correct = False
+    if step_results:
+        final_correct = bool(step_results[-1].pop("final_ok", False))
+        for r in step_results:
+            r.pop("final_ok", None)
+
+    first_wrong_index = next((r["index"] for r in step_results if r["is_valid"] is False), None)
+    undetermined = [r["index"] for r in step_results if r["is_valid"] is None]
+    determined = [r for r in step_results if r["is_valid"] is not None]
+
+    # حساب درجة تقريبية:
+    # - كل خطوة صحيحة تأخذ نقاط
+    # - لو الخطوة النهائية صحيحة، نزيد مكافأة
+    if not determined:
+        score = 0
+    else:
+        valid_count = sum(1 for r in determined if r["is_valid"])
+        base = (valid_count / len(determined)) * 80  # 80% للخطوات
+        bonus = 20 if final_correct else 0          # 20% للحل النهائي
+        score = round(base + bonus, 2)
+
+    result = {
+        "success": True,
+        "question": question,
+        "correct_answer": correct_answer,
+        "variable": variable,
+        "steps": step_results,
+        "first_wrong_step_index": first_wrong_index,
+        "final_correct": final_correct,
+        "score": score,
+    }
+    if undetermined:
+        result["undetermined_step_indices"] = undetermined
+    return result
+
+
+def _step_key(step: str) -> str:
+    """
+    مفتاح إزالة التكرار بين الطلاب: "2x+3=7" و "2x + 3 = 7" نفس الخطوة
+    """
+    return re.sub(r" ?([^\w ]) ?", r"\1", _normalize_step_str(step))
+
+
+def aggregate_first_errors(results: List[Dict[str, Any]], top: int = MATH_CLASS_TOP_ERRORS) -> List[Dict[str, Any]]:
+    """
+    أكثر "أول خطوة خاطئة" تكرارًا بين الطلاب (بعد تطبيع نص الخطوة)
+    :param results: [{"student_id", "result"}, ...]
+    """
+    counter: Counter = Counter()
+    students: Dict[str, List[str]] = {}
+    examples: Dict[str, str] = {}
+
+    for item in results:
+        result = item["result"]
+        idx = result.get("first_wrong_step_index")
+        if idx is None:
+            continue
+        step = result["steps"][idx]["step"]
+        key = _step_key(step)
+        counter[key] += 1
+        students.setdefault(key, []).append(item["student_id"])
+        examples.setdefault(key, step)
+
+    return [
+        {"step": examples[key], "count": count, "student_ids": students[key]}
+        for key, count in counter.most_common(top)
+    ]
+
+
 class MathStepGrader:
     """
     مصحح رياضي خطوة بخطوة:
     - يأخذ خطوات الطالب
     - يحاول أن يرى أي خطوة تبدأ فيها المعادلات تصبح غير متوافقة مع الحل الصحيح
+
+    إن مُرّر pool (MathWorkerPool) يتم الحل والفحص في عمليات منفصلة بمهلة لكل خطوة،
+    وإلا يعمل كل شيء في نفس العملية كما كان.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, pool=None):
+        self.pool = pool
+
+    def prepare(self, correct_answer: str, deadline: float) -> Optional[Dict[str, Any]]:
+        """
+        None = انتهت المهلة قبل حل المعادلة الصحيحة
+        """
+        if self.pool is not None:
+            return self.pool.prepare(correct_answer, deadline)
+        return prepare_reference(correct_answer)
+
+    def evaluate(
+        self,
+        tasks: List[Tuple[int, str, bool]],
+        reference: Dict[str, Any],
+        deadline: float,
+    ) -> List[Dict[str, Any]]:
+        """
+        :param tasks: [(index, step, is_last), ...]
+        """
+        if self.pool is not None:
+            return self.pool.evaluate_steps(tasks, reference["variable"], reference["solutions"], deadline)
+        return [
+            evaluate_step(idx, step, reference["variable"], reference["solutions"], is_last)
+            for idx, step, is_last in tasks
+        ]
 
     def grade_steps(
         self,
@@ -105,116 +427,82 @@ class MathStepGrader:
         :param student_steps: قائمة بخطوات الطالب كمعادلات، كل سطر خطوة.
         :param correct_answer: مثل 'x = 2' أو 'v = u + a*t'
         """
+        deadline = time.monotonic() + MATH_REQUEST_TIMEOUT_SECONDS
 
-        # 1) نحاول استخراج المعادلة النهائية الصحيحة من correct_answer
-        correct_eq = _parse_equation(correct_answer)
-        if correct_eq is None:
-            return {
-                "success": False,
-                "error": "لم أستطع فهم الصيغة الصحيحة (correct_answer) كمعادلة.",
-            }
-
-        # 2) نكتشف المتغير الرئيسي
-        main_var = _detect_main_symbol(student_steps + [correct_answer])
-        if main_var is None:
-            return {
-                "success": False,
-                "error": "لم أستطع تحديد المتغير الرئيسي في المعادلة.",
-            }
-
-        # 3) نحسب حلول المعادلة الصحيحة
-        correct_solutions = _solutions_for_eq(correct_eq, main_var)
-
-        step_results = []
-        first_wrong_index = None
-
-        for idx, step in enumerate(student_steps):
-            eq = _parse_equation(step)
-            if eq is None:
-                step_results.append(
-                    {
-                        "index": idx,
-                        "step": step,
-                        "is_valid": False,
-                        "reason": "لم أتمكن من فهم هذه الخطوة كمعادلة صالحة.",
-                    }
-                )
-                if first_wrong_index is None:
-                    first_wrong_index = idx
-                continue
-
-            # نختبر: هل حلول هذه المعادلة تحتوي على الحل الصحيح؟
-            if not correct_solutions:
-                # لو ما عرفنا نحل المعادلة الصحيحة أصلاً
-                is_valid = True
-                reason = "تم قبول الخطوة (تعذر حساب الحل الصحيح للمقارنة)."
-            else:
-                try:
-                    step_solutions = _solutions_for_eq(eq, main_var)
-                    # لو أي من حلول correct_solutions غير متوافق مع هذه الخطوة → الخطأ هنا
-                    consistent = True
-                    for sol in correct_solutions:
-                        # نعوض هذا الحل في المعادلة الحالية
-                        if not sp.simplify(eq.lhs.subs(main_var, sol) - eq.rhs.subs(main_var, sol)) == 0:
-                            consistent = False
-                            break
-
-                    is_valid = consistent
-                    reason = (
-                        "خطوة صحيحة ومتوافقة مع الحل الصحيح."
-                        if consistent
-                        else "هذه الخطوة غير متوافقة مع الحل الصحيح (تمثل معادلة خاطئة)."
-                    )
-                except Exception:
-                    is_valid = False
-                    reason = "تعذر التحقق من صحة هذه الخطوة."
-
-            if not is_valid and first_wrong_index is None:
-                first_wrong_index = idx
-
-            step_results.append(
-                {
-                    "index": idx,
-                    "step": step,
-                    "is_valid": is_valid,
-                    "reason": reason,
-                }
-            )
+        reference = self.prepare(correct_answer, deadline)
+        if reference is None:
+            steps = [undetermined_step(idx, step) for idx, step in enumerate(student_steps)]
+            return assemble_result(question, correct_answer, None, steps)
+        if "error" in reference:
+            return {"success": False, "error": reference["error"]}
 
-        # 4) التحقق من الخطوة النهائية: هل تعطي نفس الحل النهائي؟
-        final_correct = False
-        if student_steps:
-            last_eq = _parse_equation(student_steps[-1])
-            if last_eq is not None and correct_solutions:
-                # نتحقق أن كل حل صحيح يحقق معادلة الطالب الأخيرة
-                try:
-                    ok_all = True
-                    for sol in correct_solutions:
-                        if last_eq.lhs.subs(main_var, sol) - last_eq.rhs.subs(main_var, sol) != 0:
-                            ok_all = False
-                            break
-                    final_correct = ok_all
-                except Exception:
-                    final_correct = False
-
-        # 5) حساب درجة تقريبية:
-        # - كل خطوة صحيحة تأخذ نقاط
-        # - لو الخطوة النهائية صحيحة، نزيد مكافأة
-        if not step_results:
-            score = 0
-        else:
-            valid_count = sum(1 for r in step_results if r["is_valid"])
-            base = (valid_count / len(step_results)) * 80  # 80% للخطوات
-            bonus = 20 if final_correct else 0            # 20% للحل النهائي
-            score = round(base + bonus, 2)
+        last = len(student_steps) - 1
+        tasks = [(idx, step, idx == last) for idx, step in enumerate(student_steps)]
+        step_results = self.evaluate(tasks, reference, deadline)
+        return assemble_result(question, correct_answer, reference["variable"], step_results)
+
+    def grade_class(
+        self,
+        question: str,
+        correct_answer: str,
+        submissions: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        تصحيح حلول صف كامل لنفس المسألة:
+        - حل correct_answer مرة واحدة (المتغير الرئيسي منه وحده، كما في grade_steps)
+        - كل خطوة مكررة بين الطلاب تُفحص مرة واحدة
+        - الخطوات الفريدة تُفحص بالتوازي (على عمال الـ pool)
 
+        :param submissions: [{"student_id": "...", "student_steps": [...]}, ...]
+        """
+        deadline = time.monotonic() + MATH_CLASS_TIMEOUT_SECONDS
+        all_steps = [step for sub in submissions for step in sub["student_steps"]]
+
+        reference = self.prepare(correct_answer, deadline)
+        if reference is not None and "error" in reference:
+            return {"success": False, "error": reference["error"]}
+
+        # ✅ (مفتاح الخطوة، هل هي الأخيرة؟) → تُفحص مرة واحدة
+        unique: Dict[Tuple[str, bool], int] = {}
+        tasks: List[Tuple[int, str, bool]] = []
+        for sub in submissions:
+            last = len(sub["student_steps"]) - 1
+            for idx, step in enumerate(sub["student_steps"]):
+                key = (_step_key(step), idx == last)
+                if key not in unique:
+                    unique[key] = len(tasks)
+                    tasks.append((len(tasks), step, idx == last))
+
+        if reference is None:
+            evaluated = [undetermined_step(i, step) for i, step, _ in tasks]
+        else:
+            evaluated = self.evaluate(tasks, reference, deadline)
+        variable = reference["variable"] if reference else None
+
+        results = []
+        for sub in submissions:
+            last = len(sub["student_steps"]) - 1
+            step_results = []
+            for idx, step in enumerate(sub["student_steps"]):
+                shared = evaluated[unique[(_step_key(step), idx == last)]]
+                step_results.append({**shared, "index": idx, "step": step})
+            results.append({
+                "student_id": sub["student_id"],
+                "result": assemble_result(question, correct_answer, variable, step_results),
+            })
+
+        scores = [r["result"]["score"] for r in results]
         return {
             "success": True,
             "question": question,
             "correct_answer": correct_answer,
-            "variable": str(main_var),
-            "steps": step_results,
-            "first_wrong_step_index": first_wrong_index,
-            "final_correct": final_correct,
-            "score": score,
+            "variable": variable,
+            "num_students": len(results),
+            "unique_steps": len(tasks),
+            "total_steps": len(all_steps),
+            "average_score": round(sum(scores) / len(scores), 2) if scores else 0,
+            "fully_correct": sum(1 for r in results if r["result"]["first_wrong_step_index"] is None
+                                 and r["result"]["final_correct"]),
+            "common_first_errors": aggregate_first_errors(results),
+            "results": results,
         }
@@ -0,0 +1,142 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    MATH_SESSION_IDLE_TTL_SECONDS,
+    MATH_SESSION_MAX,
+    MATH_REQUEST_TIMEOUT_SECONDS,
+)
+from .math_step_grader import assemble_result, undetermined_step
+
+
+class MathStepSessionStore:
+    """
+    جلسات تحقق فوري من الخطوات أثناء كتابة الطالب:
+    - عند الإنشاء: يُحدَّد المتغير الرئيسي وتُحل المعادلة الصحيحة مرة واحدة
+    - كل سطر جديد يُفحص وحده (لا نعيد فحص الخطوات السابقة)
+    - الجلسة تُحذف بعد idle_ttl ثانية بدون استخدام، أو عند تجاوز max_sessions (الأقدم أولاً)
+    """
+
+    def __init__(
+        self,
+        grader,
+        idle_ttl: float = MATH_SESSION_IDLE_TTL_SECONDS,
+        max_sessions: int = MATH_SESSION_MAX,
+    ):
+        self.grader = grader
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        """
+        يُستدعى داخل القفل: حذف الجلسات الخاملة ثم الأقدم إن زاد العدد
+        """
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session["last_used"] < self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def _get(self, session_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is None or session["owner"] != owner:
+                return None
+            session["last_used"] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _summary(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        result = assemble_result(
+            session["question"],
+            session["correct_answer"],
+            session["reference"]["variable"],
+            session["steps"],
+        )
+        result["session_id"] = session["id"]
+        return result
+
+    def _check(self, session: Dict[str, Any], step: str) -> Dict[str, Any]:
+        """
+        فحص سطر واحد جديد. نعامله كخطوة أخيرة حتى نعرف هل وصل الطالب للحل.
+        """
+        idx = len(session["steps"])
+        deadline = time.monotonic() + MATH_REQUEST_TIMEOUT_SECONDS
+        results = self.grader.evaluate([(idx, step, True)], session["reference"], deadline)
+        result = results[0] if results else undetermined_step(idx, step)
+        session["steps"].append(result)
+        return result
+
+    def create(
+        self,
+        owner: str,
+        question: str,
+        correct_answer: str,
+        student_steps: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        إنشاء جلسة. student_steps (اختياري) = أسطر كتبها الطالب قبل فتح الجلسة.
+        """
+        student_steps = student_steps or []
+        deadline = time.monotonic() + MATH_REQUEST_TIMEOUT_SECONDS
+        reference = self.grader.prepare(correct_answer, deadline)
+        if reference is None:
+            return {"success": False, "error": "انتهت المهلة قبل حل المعادلة الصحيحة."}
+        if "error" in reference:
+            return {"success": False, "error": reference["error"]}
+
+        session = {
+            "id": str(uuid.uuid4()),
+            "owner": owner,
+            "question": question,
+            "correct_answer": correct_answer,
+            "reference": reference,
+            "steps": [],
+            "lock": threading.Lock(),
+            "last_used": time.monotonic(),
+        }
+        for step in student_steps:
+            self._check(session, step)
+
+        with self._lock:
+            self._sessions[session["id"]] = session
+            self._evict()
+
+        return self._summary(session)
+
+    def append_step(self, session_id: str, owner: str, step: str) -> Optional[Dict[str, Any]]:
+        """
+        فحص السطر الجديد فقط. يرجع None إن لم توجد الجلسة (انتهت أو ليست لهذا الطالب).
+        """
+        session = self._get(session_id, owner)
+        if session is None:
+            return None
+
+        with session["lock"]:
+            step_result = self._check(session, step)
+            summary = self._summary(session)
+
+        step_result = {k: v for k, v in step_result.items() if k != "final_ok"}
+        return {"step_result": step_result, **summary}
+
+    def get(self, session_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        session = self._get(session_id, owner)
+        if session is None:
+            return None
+        with session["lock"]:
+            return self._summary(session)
+
+    def close(self, session_id: str, owner: str) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session["owner"] != owner:
+                return False
+            del self._sessions[session_id]
+            return True
@@ -0,0 +1,282 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    MATH_WORKERS,
+    MATH_STEP_TIMEOUT_SECONDS,
+    MATH_WORKER_MEMORY_MB,
+    MATH_WORKER_MAX_TASKS,
+)
+from .math_step_grader import prepare_reference, evaluate_step, undetermined_step
+from .math_answer_verifier import verify_math_answer, undecided_verification
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# ✅ الدوال المسموح تشغيلها داخل العامل
+TASKS = {
+    "prepare": prepare_reference,
+    "step": evaluate_step,
+    "verify": verify_math_answer,
+}
+
+
+class MathTaskTimeout(Exception):
+    pass
+
+
+class MathWorkerError(Exception):
+    pass
+
+
+def _limit_memory(memory_mb: int):
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print("⚠️ تعذر ضبط حد الذاكرة لعامل sympy:", e)
+
+
+def _worker_main(conn, memory_mb: int):
+    """
+    حلقة العامل: يستقبل (اسم المهمة، المعاملات) ويرجع ("ok", النتيجة) أو ("error", الرسالة).
+    None = إيقاف.
+    """
+    _limit_memory(memory_mb)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+
+        name, args = msg
+        try:
+            conn.send(("ok", TASKS[name](*args)))
+        except MemoryError:
+            conn.send(("error", "memory limit exceeded"))
+            break
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        try:
+            return self.conn.poll(timeout) and self.conn.recv()[0] == "ready"
+        except (EOFError, OSError):
+            return False
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(1)
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+
+class MathWorkerPool:
+    """
+    مجموعة عمليات (spawn) لتشغيل sympy بعيدًا عن خيوط الخادم:
+    - مهلة لكل خطوة ومهلة إجمالية لكل طلب؛ العامل الذي يتجاوز المهلة يُقتل ويُستبدل
+    - حد ذاكرة لكل عامل (RLIMIT_AS)
+    - إعادة تدوير العامل بعد max_tasks مهمة
+    الخطوات التي تنتهي مهلتها تُرجع "undetermined" بدل تعليق الطلب.
+    """
+
+    def __init__(
+        self,
+        size: int = MATH_WORKERS,
+        step_timeout: float = MATH_STEP_TIMEOUT_SECONDS,
+        memory_mb: int = MATH_WORKER_MEMORY_MB,
+        max_tasks: int = MATH_WORKER_MAX_TASKS,
+    ):
+        self.size = max(1, size)
+        self.step_timeout = step_timeout
+        self.memory_mb = memory_mb
+        self.max_tasks = max(1, max_tasks)
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {"tasks": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+
+    # ---------- دورة حياة العمال ----------
+
+    def _spawn(self):
+        """
+        يشغّل عاملًا جديدًا في الخلفية، ولا يدخل قائمة الانتظار إلا بعد تحميل sympy
+        """
+        def _boot():
+            worker = _Worker(self._ctx, self.memory_mb)
+            with self._lock:
+                if not self._started:
+                    worker.close()
+                    return
+                self._workers.add(worker)
+            if worker.wait_ready(60):
+                self._idle.put(worker)
+            else:
+                print("⚠️ فشل تشغيل عامل sympy")
+                self._discard(worker, "crashes")
+
+        threading.Thread(target=_boot, daemon=True).start()
+
+    def _discard(self, worker: _Worker, reason: str):
+        with self._lock:
+            self._workers.discard(worker)
+            self.stats[reason] += 1
+            started = self._started
+        worker.kill()
+        if started:
+            self._spawn()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._spawn()
+
+    def stop(self):
+        with self._lock:
+            self._started = False
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.close()
+
+    # ---------- تنفيذ مهمة ----------
+
+    def _run(self, name: str, args: tuple, timeout: float) -> Any:
+        if not self._started:
+            self.start()
+
+        started_at = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=max(0.0, timeout))
+        except queue.Empty:
+            raise MathTaskTimeout(name)
+        remaining = timeout - (time.monotonic() - started_at)
+
+        with self._lock:
+            self.stats["tasks"] += 1
+
+        try:
+            worker.conn.send((name, args))
+            if not worker.conn.poll(max(0.0, remaining)):
+                self._discard(worker, "timeouts")
+                raise MathTaskTimeout(name)
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            self._discard(worker, "crashes")
+            raise MathWorkerError(f"{name}: worker died")
+
+        worker.tasks += 1
+        if status != "ok" and payload == "memory limit exceeded":
+            self._discard(worker, "crashes")
+        elif worker.tasks >= self.max_tasks:
+            self._discard(worker, "recycled")
+        else:
+            self._idle.put(worker)
+
+        if status != "ok":
+            raise MathWorkerError(f"{name}: {payload}")
+        return payload
+
+    # ---------- مراحل التصحيح ----------
+
+    def _timeout(self, deadline: float) -> float:
+        return min(self.step_timeout, deadline - time.monotonic())
+
+    def prepare(self, correct_answer: str, deadline: float) -> Optional[Dict[str, Any]]:
+        """
+        حل correct_answer في عامل. None = انتهت المهلة أو مات العامل.
+        """
+        try:
+            return self._run("prepare", (correct_answer,), self._timeout(deadline))
+        except (MathTaskTimeout, MathWorkerError) as e:
+            print("⚠️ تعذر تجهيز الحل المرجعي:", e)
+            return None
+
+    def evaluate_steps(
+        self,
+        tasks: List[Tuple[int, str, bool]],
+        variable: str,
+        solutions: List[str],
+        deadline: float,
+    ) -> List[Dict[str, Any]]:
+        """
+        فحص الخطوات بالتوازي على العمال، لكل خطوة مهلتها ضمن مهلة الطلب.
+        الخطوة التي تنتهي مهلتها تُرجع "undetermined".
+        """
+        def _evaluate(task: Tuple[int, str, bool]) -> Dict[str, Any]:
+            idx, step, is_last = task
+            try:
+                return self._run("step", (idx, step, variable, solutions, is_last), self._timeout(deadline))
+            except (MathTaskTimeout, MathWorkerError) as e:
+                print("⚠️ خطوة بدون حكم:", e)
+                return undetermined_step(idx, step)
+
+        if not tasks:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(tasks))) as pool:
+            return list(pool.map(_evaluate, tasks))
+
+    def verify_answer(
+        self, student_latex: str, model_answer: str, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        verify_math_answer في عامل بمهلة (sp.solve / simplify قد لا ينتهيان لمدخلات مرضية).
+        انتهاء المهلة ("timeout") أو خطأ / موت العامل ("error") = حكم غير قاطع → LLM.
+        """
+        try:
+            return self._run("verify", (student_latex, model_answer), timeout or self.step_timeout)
+        except MathTaskTimeout as e:
+            print("⚠️ تحقق رمزي بدون حكم (مهلة):", e)
+            return undecided_verification("timeout")
+        except MathWorkerError as e:
+            print("⚠️ تحقق رمزي بدون حكم:", e)
+            return undecided_verification("error")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "workers": len(self._workers),
+                "idle": self._idle.qsize(),
+            }
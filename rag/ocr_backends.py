@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    OCR_BACKEND,
+    OCR_FIXTURES_DIR,
+    OCR_LATENCY_MS,
+    OCR_LATENCY_JITTER_MS,
+)
+
+# ✅ كل محرك يُرجع نفس الشكل:
+# {"text": النص الكامل, "words": [{"text", "box": [x0, y0, x1, y1]}, ...]}
+
+
+class OCRBackend(ABC):
+    """
+    واجهة محرك OCR للنص. file_processor لا يعرف أي محرك يستخدم.
+    """
+
+    name = "base"
+
+    @property
+    def cache_tag(self) -> str:
+        """
+        هوية المحرك في مفتاح كاش OCR: نتائج محرك آخر لا تُرجع من الكاش
+        """
+        return self.name
+
+    @abstractmethod
+    def annotate(self, file_bytes: bytes) -> Dict[str, Any]:
+        ...
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class GoogleVisionBackend(OCRBackend):
+    """
+    Google Vision (text_detection). العميل يُنشأ عند أول طلب وليس عند الاستيراد،
+    حتى يمكن استيراد مسار OCR كاملاً بدون مفاتيح أو شبكة.
+    """
+
+    name = "google"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google.cloud import vision
+                self._vision = vision
+                self._client = vision.ImageAnnotatorClient()
+            return self._client
+
+    def annotate(self, file_bytes: bytes) -> Dict[str, Any]:
+        client = self._get_client()
+        image = self._vision.Image(content=file_bytes)
+
+        response = client.text_detection(image=image)
+        if response.error.message:
+            raise RuntimeError(response.error.message)
+
+        texts = response.text_annotations
+        if not texts:
+            return {"text": "", "words": []}
+
+        words = []
+        for ann in texts[1:]:
+            xs = [v.x for v in ann.bounding_poly.vertices]
+            ys = [v.y for v in ann.bounding_poly.vertices]
+            words.append({"text": ann.description, "box": [min(xs), min(ys), max(xs), max(ys)]})
+
+        # ✅ أول عنصر يحتوي النص الكامل
+        return {"text": texts[0].description.strip(), "words": words}
+
+
+class FixtureOCRBackend(OCRBackend):
+    """
+    محرك محلي بدون شبكة: النتيجة محفوظة مسبقًا لكل صورة حسب sha256 لمحتواها
+    - من ملفات directory/<sha256>.json بنفس شكل نتيجة Vision
+    - أو مسجلة في الذاكرة عبر add() (مثلاً صور مولدة في سكربت قياس)
+    صورة بلا نتيجة محفوظة: نتيجة فارغة، أو KeyError إن كان strict.
+    """
+
+    name = "fixture"
+
+    def __init__(self, directory: Optional[str] = OCR_FIXTURES_DIR, strict: bool = False):
+        self.directory = directory
+        self.strict = strict
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def add(self, file_bytes: bytes, text: str, words: Optional[List[Dict[str, Any]]] = None, persist: bool = False):
+        key = hashlib.sha256(file_bytes).hexdigest()
+        result = {"text": text, "words": words or []}
+        with self._lock:
+            self._fixtures[key] = result
+        if persist and self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{key}.json"), "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._fixtures:
+                return self._fixtures[key]
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        with self._lock:
+            self._fixtures[key] = result
+        return result
+
+    def annotate(self, file_bytes: bytes) -> Dict[str, Any]:
+        key = hashlib.sha256(file_bytes).hexdigest()
+        result = self._load(key)
+        with self._lock:
+            self.stats["hits" if result is not None else "misses"] += 1
+        if result is None:
+            if self.strict:
+                raise KeyError(f"No OCR fixture for image {key}")
+            return {"text": "", "words": []}
+        return {"text": result.get("text", ""), "words": list(result.get("words", []))}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, **self.stats, "fixtures": len(self._fixtures)}
+
+
+class LatencyInjectingBackend(OCRBackend):
+    """
+    يغلف أي محرك ويضيف تأخيرًا لكل طلب (latency_ms ± jitter_ms)،
+    لقياس أداء المسار كاملاً محليًا بزمن شبكة قريب من Google Vision.
+    """
+
+    def __init__(self, inner: OCRBackend, latency_ms: float = OCR_LATENCY_MS, jitter_ms: float = OCR_LATENCY_JITTER_MS):
+        self.inner = inner
+        self.latency_ms = max(0.0, latency_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self.name = f"{inner.name}+latency"
+
+    @property
+    def cache_tag(self) -> str:
+        # التأخير لا يغير النتيجة
+        return self.inner.cache_tag
+
+    def annotate(self, file_bytes: bytes) -> Dict[str, Any]:
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return self.inner.annotate(file_bytes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.inner.snapshot(),
+            "backend": self.name,
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+        }
+
+
+def build_ocr_backend(
+    name: str = OCR_BACKEND,
+    latency_ms: float = OCR_LATENCY_MS,
+    jitter_ms: float = OCR_LATENCY_JITTER_MS,
+) -> OCRBackend:
+    name = (name or "google").lower().strip()
+    if name == "google":
+        backend: OCRBackend = GoogleVisionBackend()
+    elif name == "fixture":
+        backend = FixtureOCRBackend()
+    else:
+        raise ValueError(f"Unknown OCR backend: {name}")
+
+    if latency_ms > 0 or jitter_ms > 0:
+        backend = LatencyInjectingBackend(backend, latency_ms, jitter_ms)
+    return backend
+
+
+_backend: Optional[OCRBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_ocr_backend() -> OCRBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = build_ocr_backend()
+        return _backend
+
+
+def set_ocr_backend(backend: OCRBackend):
+    """
+    تبديل المحرك أثناء التشغيل (سكربتات القياس / التشغيل المحلي)
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,293 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .config import (
+    OCR_CACHE_ENABLED,
+    OCR_CACHE_DIR,
+    OCR_CACHE_MEMORY_ITEMS,
+    OCR_CACHE_DISK_ITEMS,
+    OCR_CACHE_PHASH_ENABLED,
+    OCR_CACHE_PHASH_MAX_DISTANCE,
+    OCR_CACHE_VERSION,
+    PIX2TEX_MAX_WIDTH,
+    PIX2TEX_MAX_HEIGHT,
+)
+from .ocr_backends import get_ocr_backend
+
+# ✅ الحقول المخزنة لكل صورة (كل حقل مستقل: قد يوجد نص Vision بدون LaTeX)
+# "vision" = نص Google Vision الخام، "vision_words" = كلمات Vision مع مربعاتها (JSON)،
+# "latex" = مخرج pix2tex الخام قبل التصحيحات
+FIELDS = ("vision", "vision_words", "latex")
+
+
+def cache_namespace() -> str:
+    """
+    ما أنتج النتيجة: محرك OCR الحالي + إعدادات pix2tex + رقم نسخة الكاش
+    """
+    return f"{get_ocr_backend().cache_tag}|pix2tex:{PIX2TEX_MAX_WIDTH}x{PIX2TEX_MAX_HEIGHT}|v{OCR_CACHE_VERSION}"
+
+
+def cache_key(file_bytes: bytes, namespace: str) -> str:
+    h = hashlib.sha256(file_bytes)
+    h.update(b"\0" + namespace.encode("utf-8"))
+    return h.hexdigest()
+
+
+def dhash(file_bytes: bytes, size: int = 8) -> Optional[int]:
+    """
+    بصمة إدراكية (difference hash) بطول size*size بت:
+    تبقى شبه ثابتة مع إعادة الضغط أو تغيير الدقة.
+    """
+    try:
+        img = Image.open(io.BytesIO(file_bytes))
+        img.draft("L", (size * 8, size * 8))  # فك ضغط JPEG مصغّر (أسرع بكثير)
+        img = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    except Exception:
+        return None
+
+    pixels = list(img.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return bits
+
+
+class OCRCache:
+    """
+    كاش نتائج OCR حسب محتوى الصورة (sha256 للبايتات + cache_namespace()):
+    - طبقة ذاكرة LRU (memory_items صورة)
+    - طبقة قرص: ملف JSON لكل صورة، تُحذف الأقدم استخدامًا بعد disk_items
+    - اختياريًا: بصمة dHash لمطابقة الصور شبه المتطابقة (نفس الورقة مصورة مرتين)
+    """
+
+    def __init__(
+        self,
+        directory: str = OCR_CACHE_DIR,
+        memory_items: int = OCR_CACHE_MEMORY_ITEMS,
+        disk_items: int = OCR_CACHE_DISK_ITEMS,
+        phash_enabled: bool = OCR_CACHE_PHASH_ENABLED,
+        phash_max_distance: int = OCR_CACHE_PHASH_MAX_DISTANCE,
+    ):
+        self.directory = directory
+        self.memory_items = max(1, memory_items)
+        self.disk_items = max(1, disk_items)
+        self.phash_enabled = phash_enabled
+        self.phash_max_distance = phash_max_distance
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._disk: "OrderedDict[str, None]" = OrderedDict()  # ترتيب آخر استخدام
+        self._phashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # ✅ قراءة/كتابة الملفات خارج _lock؛ هذا القفل يرتب الكتابات فقط
+        self._write_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "phash_hits": 0, "misses": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    # ---------- القرص ----------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), name[:-5]))
+            except OSError:
+                continue
+
+        for _, key in sorted(entries):
+            self._disk[key] = None
+
+        if self.phash_enabled:
+            for key in self._disk:
+                entry = self._read(key)
+                if entry and entry.get("phash") is not None:
+                    self._phashes[key] = int(entry["phash"])
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write(self, key: str, entry: Dict[str, Any]):
+        tmp = self._path(key) + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print("⚠️ تعذر حفظ نتيجة OCR في الكاش:", e)
+
+    def _evict_disk(self) -> List[str]:
+        """
+        يُستدعى داخل القفل؛ يرجع المفاتيح المحذوفة لتُحذف ملفاتها بعد تحرير القفل
+        """
+        evicted = []
+        while len(self._disk) > self.disk_items:
+            key, _ = self._disk.popitem(last=False)
+            self._phashes.pop(key, None)
+            evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # ---------- القراءة/الكتابة ----------
+
+    def _entry(self, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        ذاكرة ← قرص. يُستدعى خارج القفل (القراءة من القرص لا تحجز الكاش).
+        يرجع (النتيجة، هل وُجدت في الذاكرة).
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry, True
+            if key not in self._disk:
+                return None, False
+
+        entry = self._read(key)
+
+        with self._lock:
+            if entry is None:
+                self._disk.pop(key, None)
+                return None, False
+            # put_fields قد تكون سبقتنا بنسخة أحدث
+            newer = self._memory.get(key)
+            if newer is not None:
+                return newer, True
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, entry)
+
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry, False
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _nearest(self, phash: int) -> Optional[str]:
+        best, best_distance = None, self.phash_max_distance + 1
+        for key, other in self._phashes.items():
+            distance = bin(phash ^ other).count("1")
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return best
+
+    def get(self, file_bytes: bytes, field: str) -> Optional[str]:
+        namespace = cache_namespace()
+        key = cache_key(file_bytes, namespace)
+        entry, in_memory = self._entry(key)
+        if entry is not None and entry.get(field) is not None:
+            with self._lock:
+                self.stats["memory_hits" if in_memory else "disk_hits"] += 1
+            return entry[field]
+
+        if self.phash_enabled:
+            phash = dhash(file_bytes)
+            if phash is not None:
+                with self._lock:
+                    near = self._nearest(phash)
+                entry = self._entry(near)[0] if near else None
+                if entry is not None and entry.get("namespace") == namespace and entry.get(field) is not None:
+                    with self._lock:
+                        self.stats["phash_hits"] += 1
+                    return entry[field]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, file_bytes: bytes, field: str, value: str):
+        self.put_fields(file_bytes, {field: value})
+
+    def put_fields(self, file_bytes: bytes, values: Dict[str, str]):
+        """
+        عدة حقول لنفس الصورة بكتابة واحدة على القرص
+        """
+        unknown = set(values) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown OCR cache field: {', '.join(sorted(unknown))}")
+
+        namespace = cache_namespace()
+        key = cache_key(file_bytes, namespace)
+        phash = dhash(file_bytes) if self.phash_enabled else None
+        previous, _ = self._entry(key)
+
+        with self._lock:
+            # ✅ الدمج داخل القفل: Vision و pix2tex قد يكتبان حقولهما لنفس الصورة في نفس الوقت
+            entry = dict(self._memory.get(key) or previous or {})
+            entry.update(values)
+            entry["namespace"] = namespace
+            if phash is not None:
+                entry["phash"] = phash
+                self._phashes[key] = phash
+            self._remember(key, entry)
+            self._disk[key] = None
+            self._disk.move_to_end(key)
+            evicted = self._evict_disk()
+
+        with self._write_lock:
+            # أحدث نسخة في الذاكرة (قد تكون كتابة أخرى دمجت حقولاً بعدنا)
+            with self._lock:
+                latest = self._memory.get(key, entry)
+            self._write(key, latest)
+            self._remove_files(evicted)
+
+    def get_or_compute(self, file_bytes: bytes, field: str, compute: Callable[[bytes], str]) -> str:
+        """
+        يرجع النتيجة من الكاش، أو يستدعي compute ويخزن نتيجته.
+        الأخطاء لا تُخزَّن (تُرفع كما هي).
+        """
+        value = self.get(file_bytes, field)
+        if value is not None:
+            return value
+        value = compute(file_bytes)
+        if value is not None:
+            self.put(file_bytes, field, value)
+        return value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "memory_items": len(self._memory), "disk_items": len(self._disk)}
+
+
+ocr_cache = OCRCache() if OCR_CACHE_ENABLED else None
+
+
+def cached_ocr(file_bytes: bytes, field: str, compute: Callable[[bytes], str]) -> str:
+    """
+    نقطة الدخول لـ file_processor و math_ocr (تعمل بدون كاش إن كان معطلاً)
+    """
+    if ocr_cache is None:
+        return compute(file_bytes)
+    return ocr_cache.get_or_compute(file_bytes, field, compute)
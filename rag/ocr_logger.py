@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .config import (
+    OCR_LOG_ENABLED,
+    OCR_LOG_BATCH_SIZE,
+    OCR_LOG_FLUSH_SECONDS,
+    OCR_LOG_MAX_PENDING,
+    OCR_LOG_MAX_TEXT_CHARS,
+)
+
+
+class OCRLogWriter:
+    """
+    كتابة سجلات OCR في الخلفية (write-behind):
+    - log() لا يلمس قاعدة البيانات: يضيف السجل لطابور في الذاكرة ويعود فورًا
+    - خيط واحد يكتب دفعة (bulk insert) كل flush_interval ثانية، أو فور اكتمال batch_size سجل
+    - الطابور محدود بـ max_pending: ما زاد يُهمل ويُعد في stats["dropped"]
+    - دفعة فشلت كتابتها لا يُعاد إرسالها (حتى لا يتراكم الطابور أثناء تعطل القاعدة)
+
+    session_factory و model يُمرران من main.py (SessionLocal و OCRLog)
+    حتى لا تعتمد حزمة rag على db.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Any],
+        model,
+        batch_size: int = OCR_LOG_BATCH_SIZE,
+        flush_interval: float = OCR_LOG_FLUSH_SECONDS,
+        max_pending: int = OCR_LOG_MAX_PENDING,
+        enabled: bool = OCR_LOG_ENABLED,
+    ):
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.05, flush_interval)
+        self.max_pending = max(1, max_pending)
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            "logged": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "last_flush_seconds": 0.0,
+        }
+
+    # ---------- واجهة الاستخدام ----------
+
+    def log(
+        self,
+        source_type: str,
+        raw_text: Optional[str] = None,
+        pix2tex_latex: Optional[str] = None,
+        latex: Optional[str] = None,
+        image_hash: Optional[str] = None,
+        timings: Optional[Dict[str, Any]] = None,
+        region_texts: Optional[List[Optional[str]]] = None,
+    ) -> bool:
+        """
+        region_texts: نص Vision لكل سطر من pix2tex_latex (لإعادة تطبيق قواعد التصحيح لاحقًا سطرًا سطرًا)
+        يرجع False إن أُهمل السجل (الطابور ممتلئ أو السجل معطل)
+        """
+        if not self.enabled:
+            return False
+        row = {
+            "source_type": source_type,
+            "raw_text": raw_text[:OCR_LOG_MAX_TEXT_CHARS] if raw_text else raw_text,
+            "pix2tex_latex": pix2tex_latex,
+            "latex": latex,
+            "image_hash": image_hash,
+            "timings": timings,
+            "region_texts": region_texts,
+            "created_at": datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self._pending.append(row)
+            self.stats["logged"] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def log_rich(self, rich: Dict[str, Any], source_type: str, image_hash: Optional[str] = None) -> bool:
+        """
+        سجل من نتيجة extract_rich_from_image_google مباشرة
+        """
+        return self.log(
+            source_type=source_type,
+            raw_text=rich.get("text"),
+            pix2tex_latex=rich.get("pix2tex_latex"),
+            latex=rich.get("latex"),
+            image_hash=image_hash,
+            timings=rich.get("timings"),
+            region_texts=rich.get("region_texts"),
+        )
+
+    # ---------- الكتابة ----------
+
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            count = min(self.batch_size, len(self._pending))
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        session = self.session_factory()
+        try:
+            session.bulk_insert_mappings(self.model, rows)
+            session.commit()
+            ok = True
+        except Exception as e:
+            session.rollback()
+            print("⚠️ تعذر كتابة سجلات OCR:", e)
+            ok = False
+        finally:
+            session.close()
+
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["last_flush_seconds"] = round(time.perf_counter() - started, 4)
+            if ok:
+                self.stats["written"] += len(rows)
+            else:
+                self.stats["failed_batches"] += 1
+                self.stats["dropped"] += len(rows)
+
+    def flush(self):
+        """
+        كتابة كل ما في الطابور الآن (يُستدعى عند الإيقاف)
+        """
+        while True:
+            rows = self._take()
+            if not rows:
+                return
+            self._write(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # دفعة كاملة أو انتهت المهلة: نكتب ما تجمع (دفعات متتالية إن تراكم أكثر)
+            while True:
+                rows = self._take()
+                if not rows:
+                    break
+                self._write(rows)
+                if len(rows) < self.batch_size:
+                    break
+
+    # ---------- دورة الحياة ----------
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ocr-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "enabled": self.enabled, "pending": len(self._pending)}
@@ -0,0 +1,149 @@
+import os
+import tempfile
+from collections import deque
+from typing import Deque, Iterator, List, Optional, Tuple, Union
+
+import pdfplumber
+
+from .config import PDF_MAX_PAGES, PDF_PAGES_PER_TASK, PDF_MAX_INFLIGHT_TASKS
+from .executors import cpu_executor
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+
+# ============ داخل عمليات المنفذ cpu ============
+
+def _pdfium_pages(path: str, indices: List[int]) -> List[Tuple[int, str]]:
+    """
+    طبقة النص الخام عبر pdfium: أسرع بكثير من pdfplumber لكن بدون ترتيب تخطيط الصفحة
+    """
+    pdf = pdfium.PdfDocument(path)
+    try:
+        results = []
+        for i in indices:
+            page = pdf[i]
+            textpage = page.get_textpage()
+            results.append((i, textpage.get_text_range().strip()))
+            textpage.close()
+            page.close()
+        return results
+    finally:
+        pdf.close()
+
+
+def extract_pages(path: str, indices: List[int]) -> List[Tuple[int, str]]:
+    """
+    مهمة واحدة = عدة صفحات متتالية (فتح الملف مرة لكل مهمة وليس لكل صفحة).
+    الصفحة التي يفشل فيها pdfplumber تُقرأ من طبقة النص الخام.
+    """
+    results = []
+    failed = []
+    try:
+        with pdfplumber.open(path) as pdf:
+            for i in indices:
+                try:
+                    results.append((i, (pdf.pages[i].extract_text() or "").strip()))
+                except Exception as e:
+                    print(f"pdfplumber page {i + 1} error:", e)
+                    failed.append(i)
+    except Exception as e:
+        print("pdfplumber error:", e)
+        failed = [i for i in indices if i not in {r[0] for r in results}]
+
+    if failed and pdfium is not None:
+        results.extend(_pdfium_pages(path, failed))
+    return sorted(results)
+
+
+def count_pages(path: str) -> int:
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+# ============ في العملية الرئيسية ============
+
+def _page_indices(total: int, first_page: int, last_page: Optional[int], max_pages: int) -> List[int]:
+    start = max(1, first_page) - 1
+    end = total if last_page is None else min(total, last_page)
+    return list(range(start, end))[:max(0, max_pages)]
+
+
+def iter_pdf_pages(
+    source: Union[bytes, str],
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    max_pages: int = PDF_MAX_PAGES,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+    max_inflight: int = PDF_MAX_INFLIGHT_TASKS,
+) -> Iterator[Tuple[int, str]]:
+    """
+    يُرجع (رقم الصفحة يبدأ من 1، النص) بالترتيب، صفحةً صفحة:
+    - المهام تُوزع على المنفذ cpu (عمليات منفصلة) بنافذة منزلقة من max_inflight مهمة
+    - إن توقف المستهلك مبكرًا (وصل لما يكفيه) تُلغى المهام المتبقية ولا تُقرأ بقية الصفحات
+    source: بايتات الملف، أو مسار ملف على القرص (ملف مرفوع، يُستخدم مباشرة بدون نسخ)
+    """
+    # الملف على القرص بدل تمرير البايتات كاملة لكل مهمة
+    owned = not isinstance(source, str)
+    path = source if not owned else None
+    inflight: Deque = deque()
+    try:
+        if owned:
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            path = tmp.name
+            tmp.write(source)
+            tmp.close()
+
+        indices = _page_indices(count_pages(path), first_page, last_page, max_pages)
+        chunks = [indices[i:i + pages_per_task] for i in range(0, len(indices), max(1, pages_per_task))]
+        pending = deque(chunks)
+
+        while pending or inflight:
+            while pending and len(inflight) < max(1, max_inflight):
+                inflight.append(cpu_executor.submit(extract_pages, path, pending.popleft()))
+            for i, text in inflight.popleft().result():
+                yield i + 1, text
+    finally:
+        for future in inflight:
+            future.cancel()
+        for future in inflight:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        if owned and path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def extract_text_from_pdf(
+    source: Union[bytes, str],
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    max_pages: int = PDF_MAX_PAGES,
+    max_chars: Optional[int] = None,
+) -> str:
+    """
+    نص الـ PDF ضمن نطاق الصفحات، مع التوقف بعد max_chars حرف إن حُدد
+    """
+    parts = []
+    total = 0
+    for _, text in iter_pdf_pages(source, first_page, last_page, max_pages):
+        if not text:
+            continue
+        parts.append(text)
+        total += len(text)
+        if max_chars is not None and total >= max_chars:
+            break
+    return "\n".join(parts).strip()
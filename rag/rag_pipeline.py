@@ -1,5 +1,7 @@
 from .chroma_db import ChromaKnowledgeBase
 from .groq_client import GroqClient
+from .config import UPLOAD_INDEX_TOP_K, UPLOAD_INDEX_MIN_CHARS, UPLOAD_QUERY_CHARS
+from .upload_index import UploadIndex
 
 SYSTEM_PROMPT = "أنت مدرس افتراضي ذكي تعتمد فقط على السياق."
 
@@ -7,6 +9,7 @@ class RAGPipeline:
     def __init__(self):
         self.db = ChromaKnowledgeBase()
         self.llm = GroqClient()
+        self.uploads = UploadIndex(self.db.embedding_model)
 
     def answer(self, question, subject, grade):
         contexts = self.db.query(question, subject, grade)
@@ -14,3 +17,43 @@ class RAGPipeline:
         prompt = f"سؤال: {question}\n\nسياق:\n{context}"
         answer = self.llm.generate(SYSTEM_PROMPT, prompt)
         return answer, [{"text": doc, "metadata": meta} for doc, meta in contexts]
+
+    def get_document(self, file_key):
+        """
+        المستند المفهرس لهذا المفتاح أو None. يُمرر كما هو إلى answer_document
+        (فحص ثم استخدام منفصلان قد يفصل بينهما حذف المستند من الفهرس).
+        """
+        return self.uploads.get(file_key)
+
+    def answer_document(self, file_key, text, subject, grade, question=None, doc=None):
+        """
+        سؤال عن ملف مرفوع طويل: المنهج وفهرس الملف المؤقت يُبحث فيهما بنفس متجه الاستعلام،
+        وتُرسل المقاطع الأقرب فقط (حجم الـ prompt ثابت مهما طال الملف).
+        text يمكن أن يكون None إن مُرّر doc (من get_document).
+        """
+        if doc is None:
+            if text is None:
+                raise ValueError("answer_document: text is required when doc is not given")
+            if not question and len(text) <= UPLOAD_INDEX_MIN_CHARS:
+                return self.answer(text, subject, grade)
+            doc = self.uploads.get_or_build(file_key, text)
+
+        query = question or (doc["chunks"][0][:UPLOAD_QUERY_CHARS] if doc["chunks"] else "")
+        if not query:
+            return self.answer(text or "", subject, grade)
+
+        emb = self.db.embedding_model.embed_query(query)
+        passages = self.uploads.search(doc, emb, UPLOAD_INDEX_TOP_K)
+        contexts = self.db.query(query, subject, grade, embedding=emb)
+
+        excerpts = "\n\n".join(chunk for _, chunk, _ in passages)
+        context = "\n".join([doc_text for doc_text, _ in contexts])
+        prompt = f"سؤال: {query}\n\nمقاطع من ملف الطالب:\n{excerpts}\n\nسياق:\n{context}"
+        answer = self.llm.generate(SYSTEM_PROMPT, prompt)
+
+        sources = [
+            {"text": chunk, "metadata": {"source": "upload", "chunk": i, "score": round(score, 4)}}
+            for i, chunk, score in passages
+        ]
+        sources += [{"text": doc_text, "metadata": meta} for doc_text, meta in contexts]
+        return answer, sources
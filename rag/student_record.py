@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from datetime import datetime
 
 RECORD_FILE = "student_records.json"
@@ -8,6 +9,8 @@ RECORD_FILE = "student_records.json"
 class StudentRecordManager:
     def __init__(self):
         self.file_path = RECORD_FILE
+        # ✅ التصحيح المتأخر يكتب من خيوط الخلفية → نحمي القراءة/الكتابة
+        self._lock = threading.RLock()
         if not os.path.exists(self.file_path):
             with open(self.file_path, "w", encoding="utf-8") as f:
                 json.dump({}, f, ensure_ascii=False, indent=2)
@@ -21,6 +24,10 @@ class StudentRecordManager:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
     def add_exam_result(self, student_id: str, exam_result: dict):
+        with self._lock:
+            self._add_exam_result(student_id, exam_result)
+
+    def _add_exam_result(self, student_id: str, exam_result: dict):
         data = self._load()
 
         if student_id not in data:
@@ -31,17 +38,50 @@ class StudentRecordManager:
             }
 
         exam_record = {
+            "exam_id": exam_result.get("exam_id"),
             "timestamp": datetime.utcnow().isoformat(),
             "subject": exam_result.get("subject"),
             "grade": exam_result.get("grade"),
             "num_questions": exam_result.get("num_questions"),
             "total_score": exam_result.get("total_score"),
-            "questions": exam_result.get("questions")
+            "questions": exam_result.get("questions"),
+            "pending_question_ids": exam_result.get("pending_question_ids", []),
         }
 
         data[student_id]["exams"].append(exam_record)
         self._save(data)
 
+    def complete_pending_question(self, student_id: str, exam_id: str, question_id: int, grading_result: dict):
+        """
+        يكمل نتيجة سؤال كان "pending" وقت التسليم (انتهى تصحيحه بعد المهلة)،
+        ثم يعيد حساب الدرجة الكلية للامتحان.
+        """
+        with self._lock:
+            data = self._load()
+            record = data.get(student_id)
+            if not record:
+                return
+
+            exam = next((e for e in record["exams"] if e.get("exam_id") == exam_id), None)
+            if exam is None:
+                return
+
+            for q in exam.get("questions") or []:
+                if q.get("question_id") == question_id and q.get("status") == "pending":
+                    q["score"] = grading_result.get("score", 0)
+                    q["is_correct"] = grading_result.get("is_correct", False)
+                    q["feedback"] = grading_result.get("feedback", "")
+                    q["status"] = "graded"
+
+            pending = [qid for qid in exam.get("pending_question_ids", []) if qid != question_id]
+            exam["pending_question_ids"] = pending
+
+            scores = [q.get("score", 0) for q in exam.get("questions") or []]
+            if scores:
+                exam["total_score"] = sum(scores) / len(scores)
+
+            self._save(data)
+
     def get_student_record(self, student_id: str):
         data = self._load()
         return data.get(student_id)
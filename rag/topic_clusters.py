@@ -0,0 +1,137 @@
+import json
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import TOPIC_CLUSTERS_FILE, TOPIC_CLUSTER_COUNT, TOPIC_CLUSTER_REPRESENTATIVES
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = 50, seed: int = 0):
+    """
+    k-means بسيط (تهيئة k-means++) على متجهات الـ embeddings.
+    يرجع (centroids, labels).
+    """
+    n = len(vectors)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # ✅ تهيئة k-means++: نختار مراكز متباعدة
+    centroids = [vectors[rng.integers(n)]]
+    for _ in range(1, k):
+        dists = np.min(
+            [np.sum((vectors - c) ** 2, axis=1) for c in centroids], axis=0
+        )
+        total = dists.sum()
+        if total <= 0:
+            break
+        centroids.append(vectors[rng.choice(n, p=dists / total)])
+    centroids = np.array(centroids)
+
+    sq_norms = np.sum(vectors ** 2, axis=1)[:, None]
+    labels = None
+    for _ in range(iterations):
+        # ||x - c||² = ||x||² - 2x·c + ||c||² (بدون مصفوفة n×k×d في الذاكرة)
+        dists = sq_norms - 2 * vectors @ centroids.T + np.sum(centroids ** 2, axis=1)[None, :]
+        new_labels = dists.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for j in range(len(centroids)):
+            members = vectors[labels == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+
+    return centroids, labels
+
+
+def build_topic_clusters(
+    texts: List[str],
+    embeddings,
+    k: int = TOPIC_CLUSTER_COUNT,
+    representatives: int = TOPIC_CLUSTER_REPRESENTATIVES,
+) -> List[Dict[str, Any]]:
+    """
+    يجمع مقاطع مجموعة واحدة (subject_grade) في عناقيد مواضيع،
+    ويحفظ لكل عنقود مركزه وأقرب المقاطع إليه (المقاطع الممثِّلة).
+    """
+    if not texts:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=float)
+    centroids, labels = kmeans(vectors, k)
+
+    clusters = []
+    for j, centroid in enumerate(centroids):
+        idx = np.where(labels == j)[0]
+        if len(idx) == 0:
+            continue
+        dists = np.sum((vectors[idx] - centroid) ** 2, axis=1)
+        closest = idx[np.argsort(dists)[:representatives]]
+        clusters.append({
+            "id": j,
+            "size": int(len(idx)),
+            "centroid": centroid.tolist(),
+            "representatives": [texts[i] for i in closest],
+        })
+
+    return clusters
+
+
+class TopicClusterStore:
+    """
+    قراءة/كتابة ملف العناقيد (topic_clusters.json) بجانب Chroma.
+    يُعاد تحميل الملف تلقائيًا إذا أُعيد بناء الفهرس أثناء تشغيل الـ API.
+    """
+
+    def __init__(self, path: str = TOPIC_CLUSTERS_FILE):
+        self.path = path
+        self._data: Dict[str, List[Dict[str, Any]]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            self._data = json.load(f)
+        self._mtime = mtime
+
+    def save_collection(self, collection_name: str, clusters: List[Dict[str, Any]]):
+        with self._lock:
+            self._load_if_changed()
+            self._data[collection_name] = clusters
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            self._mtime = os.path.getmtime(self.path)
+
+    def get(self, subject: str, grade: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load_if_changed()
+            return self._data.get(f"{subject}_{grade}", [])
+
+    def sample(self, subject: str, grade: str, n: int) -> List[Dict[str, Any]]:
+        """
+        يختار n عناقيد متنوعة (أبعد نقطة عن المختار سابقًا)، بنقطة بداية عشوائية.
+        إن كان n أكبر من عدد العناقيد تتكرر العناقيد بالدور.
+        """
+        clusters = self.get(subject, grade)
+        if not clusters or n <= 0:
+            return []
+
+        centroids = np.array([c["centroid"] for c in clusters], dtype=float)
+        order = [random.randrange(len(clusters))]
+        min_dists = np.sum((centroids - centroids[order[0]]) ** 2, axis=1)
+
+        while len(order) < min(n, len(clusters)):
+            nxt = int(np.argmax(min_dists))
+            order.append(nxt)
+            min_dists = np.minimum(min_dists, np.sum((centroids - centroids[nxt]) ** 2, axis=1))
+
+        return [clusters[order[i % len(order)]] for i in range(n)]
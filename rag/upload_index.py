@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    UPLOAD_INDEX_TTL_SECONDS,
+    UPLOAD_INDEX_MAX_DOCS,
+    UPLOAD_CHUNK_CHARS,
+    UPLOAD_CHUNK_OVERLAP,
+)
+
+
+def chunk_text(text: str, chunk_chars: int = UPLOAD_CHUNK_CHARS, overlap: int = UPLOAD_CHUNK_OVERLAP) -> List[str]:
+    """
+    تقسيم نص الملف إلى مقاطع بطول chunk_chars تقريبًا:
+    الفقرات تُجمع معًا، والفقرة الأطول من المقطع تُقص مع تداخل overlap حرف.
+    """
+    chunk_chars = max(1, chunk_chars)
+    overlap = min(max(0, overlap), chunk_chars // 2)
+
+    pieces: List[str] = []
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_chars:
+            pieces.append(paragraph)
+            continue
+        step = chunk_chars - overlap
+        for start in range(0, len(paragraph), step):
+            pieces.append(paragraph[start:start + chunk_chars])
+            if start + chunk_chars >= len(paragraph):
+                break
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > chunk_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def document_key(sha256: str, first_page: int = 1, last_page: Optional[int] = None, truncated: bool = False) -> str:
+    """
+    مفتاح الملف في الفهرس: نفس الملف بنطاق صفحات مختلف (أو نص مقصوص بحد أحرف) نص مختلف
+    """
+    return f"{sha256}:{first_page}:{last_page}:{int(truncated)}"
+
+
+class UploadIndex:
+    """
+    فهرس متجهات مؤقت في الذاكرة للملفات المرفوعة (مفتاحه document_key: بصمة المحتوى + نطاق الصفحات):
+    - الملف يُقسم ويُحوَّل لمتجهات مرة واحدة، ورفعه مجددًا لا يعيد الحساب
+    - البحث تشابه جيب التمام (cosine) على مصفوفة numpy
+    - الملف يُحذف بعد ttl ثانية بدون استخدام، أو عند تجاوز max_docs (الأقدم أولاً)
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        ttl: float = UPLOAD_INDEX_TTL_SECONDS,
+        max_docs: int = UPLOAD_INDEX_MAX_DOCS,
+    ):
+        self.embedding_model = embedding_model
+        self.ttl = ttl
+        self.max_docs = max(1, max_docs)
+        self._docs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0, "chunks_embedded": 0}
+
+    def _evict(self):
+        """
+        يُستدعى داخل القفل
+        """
+        now = time.monotonic()
+        while self._docs:
+            key, doc = next(iter(self._docs.items()))
+            if now - doc["last_used"] < self.ttl and len(self._docs) <= self.max_docs:
+                break
+            del self._docs[key]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict()
+            doc = self._docs.get(key)
+            if doc is None:
+                return None
+            doc["last_used"] = time.monotonic()
+            self._docs.move_to_end(key)
+            self.stats["hits"] += 1
+            return doc
+
+    def build(self, key: str, text: str) -> Dict[str, Any]:
+        """
+        يُستدعى خارج القفل (التحويل لمتجهات بطيء). إن بُني نفس الملف بالتوازي تبقى نسخة واحدة.
+        نص فارغ لا يُخزن (حتى لا يُرجع مفتاح الملف مستندًا فارغًا في الطلبات التالية).
+        """
+        chunks = chunk_text(text or "")
+        if not chunks:
+            return {"chunks": [], "vectors": np.zeros((0, 0), dtype=np.float32), "chars": 0,
+                    "last_used": time.monotonic()}
+
+        vectors = np.asarray(self.embedding_model.embed_texts(chunks), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        doc = {"chunks": chunks, "vectors": vectors, "chars": len(text), "last_used": time.monotonic()}
+        with self._lock:
+            self.stats["builds"] += 1
+            self.stats["chunks_embedded"] += len(chunks)
+            self._docs[key] = doc
+            self._docs.move_to_end(key)
+            self._evict()
+        return doc
+
+    def get_or_build(self, key: str, text: str) -> Dict[str, Any]:
+        return self.get(key) or self.build(key, text)
+
+    @staticmethod
+    def search(doc: Dict[str, Any], query_embedding, k: int) -> List[Tuple[int, str, float]]:
+        """
+        أقرب k مقاطع: [(رقم المقطع، النص، التشابه), ...] بترتيبها في الملف
+        """
+        vectors = doc["vectors"]
+        if not doc["chunks"] or k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = vectors @ (query / norm if norm else query)
+        top = np.argsort(-scores)[:k]
+        return [(int(i), doc["chunks"][i], float(scores[i])) for i in sorted(top)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "documents": len(self._docs)}
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from .config import (
+    UPLOAD_READ_CHUNK_BYTES,
+    UPLOAD_SPOOL_DIR,
+    UPLOAD_MAX_IMAGE_BYTES,
+    UPLOAD_MAX_PDF_BYTES,
+    UPLOAD_MAX_IMAGE_PIXELS,
+    UPLOAD_FORM_OVERHEAD_BYTES,
+)
+
+IMAGE_TYPES = ("png", "jpeg", "webp")
+PDF_TYPES = ("pdf",)
+
+# نحتاج أول 12 بايت فقط لتحديد النوع
+SNIFF_BYTES = 12
+
+
+class UploadRejected(Exception):
+    """
+    ملف مرفوض قبل المعالجة → main.py يحولها إلى status_code (413 / 415 / 400)
+    """
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def detect_type(head: bytes) -> Optional[str]:
+    """
+    نوع الملف من أول بايتات المحتوى (magic bytes) وليس من اسم الملف
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    return None
+
+
+def _too_large(limit: int) -> str:
+    return f"الملف أكبر من الحد المسموح ({limit / (1024 * 1024):.1f} MB)."
+
+
+def _default_max_bytes(kind: str) -> int:
+    return UPLOAD_MAX_PDF_BYTES if kind in PDF_TYPES else UPLOAD_MAX_IMAGE_BYTES
+
+
+def max_upload_bytes(allowed: Tuple[str, ...] = IMAGE_TYPES + PDF_TYPES) -> int:
+    """
+    أكبر حجم مسموح لأي نوع من الأنواع المقبولة في المسار
+    """
+    return max(_default_max_bytes(kind) for kind in allowed)
+
+
+class UploadBodyLimit:
+    """
+    ASGI middleware: حد حجم جسم الطلب لمسارات رفع الملفات، قبل أن يقرأ FastAPI النموذج
+    (request.form() يقرأ الجسم كاملاً إلى ملف مؤقت قبل استدعاء المسار).
+    - Content-Length أكبر من الحد → 413 فورًا بدون قراءة الجسم
+    - بدون Content-Length (chunked) → البايتات تُعد أثناء القراءة ويتوقف الطلب فور تجاوز الحد (413)
+    limits: {المسار: حد الملف بالبايت}، ويُضاف overhead لترويسات multipart وباقي الحقول.
+    """
+
+    def __init__(self, app, limits: Dict[str, int], overhead: int = UPLOAD_FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.limits = {path: limit + max(0, overhead) for path, limit in limits.items()}
+        self.messages = {path: _too_large(limit) for path, limit in limits.items()}
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path") if scope["type"] == "http" else None
+        limit = self.limits.get(path)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        message = self.messages[path]
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await JSONResponse(status_code=413, content={"detail": message})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            event = await receive()
+            if event["type"] == "http.request":
+                received += len(event.get("body", b""))
+                if received > limit:
+                    # HTTPException تمر عبر قراءة النموذج في FastAPI كما هي → 413
+                    raise HTTPException(413, message)
+            return event
+
+        await self.app(scope, limited_receive, send)
+
+
+class ReceivedUpload:
+    """
+    ملف مرفوع بعد الفحص، فوق UploadFile نفسه (الملف المؤقت الذي كتبه Starlette) بدون نسخه:
+    - read_bytes(): المحتوى كاملاً (للصور، وحجمها محدود)
+    - path(): مسار ملف على القرص لـ PDF (عمليات استخراج الصفحات تفتحه بالمسار)؛
+      ملف Starlette المؤقت بلا اسم، لذلك يُنسخ مرة واحدة هنا فقط عند الطلب
+    يجب استدعاء close() (أو استخدام with) لحذف نسخة path() إن وُجدت.
+    """
+
+    def __init__(self, file, kind: str, size: int, sha256: str):
+        self.filename = getattr(file, "filename", "") or ""
+        self.kind = kind
+        self.size = size
+        self.sha256 = sha256
+        self._file = file.file
+        self._path: Optional[str] = None
+
+    @property
+    def is_image(self) -> bool:
+        return self.kind in IMAGE_TYPES
+
+    def read_bytes(self) -> bytes:
+        self._file.seek(0)
+        return self._file.read()
+
+    def path(self) -> str:
+        if self._path is None:
+            fd, path = tempfile.mkstemp(prefix="upload-", dir=UPLOAD_SPOOL_DIR)
+            self._path = path
+            self._file.seek(0)
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(self._file, out, UPLOAD_READ_CHUNK_BYTES)
+        return self._path
+
+    def image_size(self) -> Tuple[int, int]:
+        """
+        أبعاد الصورة من الترويسة فقط (بدون فك الضغط)
+        """
+        self._file.seek(0)
+        try:
+            with Image.open(self._file) as img:
+                return img.size
+        finally:
+            self._file.seek(0)
+
+    def close(self):
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def receive_upload(
+    file,
+    allowed: Tuple[str, ...] = IMAGE_TYPES + PDF_TYPES,
+    max_bytes: Optional[int] = None,
+    max_pixels: int = UPLOAD_MAX_IMAGE_PIXELS,
+    unsupported_message: str = "Unsupported file type",
+) -> ReceivedUpload:
+    """
+    يفحص UploadFile مباشرة (حجم الجسم محدود مسبقًا بـ UploadBodyLimit قبل قراءة النموذج):
+    - النوع يُحدد من أول بايتات المحتوى، والنوع غير المسموح يُرفض قبل قراءة الباقي (415)
+    - البصمة sha256 والحجم يُحسبان بقراءة الملف على دفعات، ويُرفض فور تجاوز الحد (413)
+    - أبعاد الصور تُفحص من الترويسة قبل أي فك ضغط (413)
+    max_bytes=None → الحد الافتراضي حسب النوع (صورة / PDF).
+    """
+    # ✅ إن كان الحجم معروفًا مسبقًا نرفض بدون قراءة أي شيء
+    limit = max_bytes if max_bytes is not None else max_upload_bytes(allowed)
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > limit:
+        raise UploadRejected(413, _too_large(limit))
+
+    await file.seek(0)
+    head = await file.read(SNIFF_BYTES)
+    if not head:
+        raise UploadRejected(400, "الملف فارغ.")
+    kind = detect_type(head)
+    if kind not in allowed:
+        raise UploadRejected(415, unsupported_message)
+    if max_bytes is None:
+        limit = _default_max_bytes(kind)
+
+    hasher = hashlib.sha256(head)
+    size = len(head)
+    while True:
+        chunk = await file.read(UPLOAD_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        size += len(chunk)
+        if size > limit:
+            raise UploadRejected(413, _too_large(limit))
+    await file.seek(0)
+
+    upload = ReceivedUpload(file, kind, size, hasher.hexdigest())
+    if upload.is_image:
+        try:
+            width, height = upload.image_size()
+        except Exception:
+            raise UploadRejected(400, "تعذر قراءة الصورة.")
+        if width * height > max_pixels:
+            raise UploadRejected(413, f"أبعاد الصورة كبيرة جدًا ({width}x{height}).")
+    return upload
@@ -0,0 +1,97 @@
+"""
+إعادة تطبيق قواعد تنظيف LaTeX (rag/latex_rules) على سجلات OCR القديمة بعد تعديل القواعد:
+latex = correct_latex(سطر pix2tex, نص Vision لمنطقته) لكل سطر، وتحديث الصفوف التي تغيرت فقط (على دفعات).
+
+فقط صفوف source_type = "image" (صور المعادلات "math_image" لم تُصحح أصلاً).
+صف من عدة أسطر بدون region_texts (سجلات قديمة) لا يُعاد كتابته: نص كل منطقة غير معروف.
+
+التشغيل:
+    python reprocess_ocr_logs.py --dry-run
+    python reprocess_ocr_logs.py --batch-size 2000
+"""
+import argparse
+import time
+from typing import List, Optional
+
+from db.database import SessionLocal
+from db.models.ocr_logs import OCRLog
+from rag.latex_rules import correct_latex, rule_stats
+
+
+def reprocess_row(
+    pix2tex_latex: str, raw_text: Optional[str], region_texts: Optional[List[Optional[str]]] = None
+) -> Optional[str]:
+    """
+    نفس تصحيح extract_rich_from_image_google لكل سطر: نص منطقته، أو نص Vision الكامل إن لم يكن لها نص.
+    ValueError إن تعذر معرفة نص كل سطر (عدة أسطر بدون region_texts، أو عدد غير مطابق).
+    """
+    lines = pix2tex_latex.split("\n")
+    if region_texts is None:
+        if len(lines) > 1:
+            raise ValueError("multi-line row without region_texts")
+        region_texts = [None]
+    if len(region_texts) != len(lines):
+        raise ValueError("region_texts does not match pix2tex lines")
+
+    corrected = [correct_latex(line, region or raw_text or "") for line, region in zip(lines, region_texts)]
+    return "\n".join(line for line in corrected if line) or None
+
+
+def reprocess(batch_size: int = 1000, dry_run: bool = False, limit: int = 0):
+    started = time.perf_counter()
+    scanned = changed = skipped = 0
+    last_id = 0
+    session = SessionLocal()
+    try:
+        while True:
+            # ✅ ترقيم حسب id (بدون OFFSET) حتى لا يبطأ مع حجم الجدول
+            rows = (
+                session.query(OCRLog.id, OCRLog.pix2tex_latex, OCRLog.raw_text, OCRLog.region_texts, OCRLog.latex)
+                .filter(
+                    OCRLog.id > last_id,
+                    OCRLog.source_type == "image",
+                    OCRLog.pix2tex_latex.isnot(None),
+                )
+                .order_by(OCRLog.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                try:
+                    latex = reprocess_row(row.pix2tex_latex, row.raw_text, row.region_texts)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if latex != row.latex:
+                    updates.append({"id": row.id, "latex": latex})
+            scanned += len(rows)
+            changed += len(updates)
+
+            if updates and not dry_run:
+                session.bulk_update_mappings(OCRLog, updates)
+                session.commit()
+
+            print(f"… {scanned} rows scanned, {changed} changed, {skipped} skipped")
+            if limit and scanned >= limit:
+                break
+    finally:
+        session.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{'(dry run) ' if dry_run else ''}{scanned} rows, {changed} changed, {skipped} skipped in {elapsed:.1f}s")
+    for stage, hits in rule_stats().items():
+        print(f"  {stage}: {hits}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run LaTeX cleanup rules over ocr_logs")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    parser.add_argument("--limit", type=int, default=0)
+    args = parser.parse_args()
+    reprocess(batch_size=args.batch_size, dry_run=args.dry_run, limit=args.limit)